@@ -22,6 +22,7 @@ from aiohttp import web
 # noinspection PyUnresolvedReferences
 from halpybot import commands
 from halpybot import config
+from halpybot.packages.announcer import webhooks
 from halpybot.packages.ircclient import configure_client
 from halpybot.server import APIConnector
 
@@ -124,8 +125,16 @@ async def main():
         ),
         loop=loop,
     )
-    while True:
-        await asyncio.sleep(3600)
+    # Run until told to stop, then close down cleanly and let the queued
+    # Discord notifications go out
+    stopping = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    await stopping.wait()
+    logger.info("Shutting down")
+    await client.shutdown()
+    await webhooks.shutdown()
+    client.announcer.outbox.close()
+    await runner.cleanup()
 
 
 # Global Entry Point
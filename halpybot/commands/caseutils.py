@@ -8,6 +8,7 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
 import re
 from typing import List, Optional
 from attr.converters import to_bool
@@ -20,7 +21,7 @@ from ..packages.exceptions import (
     EDSMConnectionError,
     CaseAlreadyExists,
 )
-from ..packages.seals import whois
+from ..packages.seals import whois, whois_many
 from ..packages.utils import (
     sys_cleaner,
     gather_case,
@@ -44,40 +45,51 @@ from ..packages.checks import Drilled, Pup, needs_permission, in_channel, Admin
 from ..packages.case import update_single_elem_case_prep, get_case
 
 
+async def _seal_vhost(ctx: Context, seal: str) -> Optional[str]:
+    """Get the vhost-role of a possible Seal, or "notUser" if they aren't online"""
+    # AttributeError is thrown if a user does not exist. Accept and move on.
+    try:
+        chat_whois = await User.get_info(ctx.bot, seal)
+        return User.process_vhost(chat_whois.hostname)
+    except (AttributeError, NoUserFound):
+        return "notUser"
+
+
 async def add_responder(ctx: Context, args: List[str], case: Case, resp_type: str):
     """Add a Responder to a given Case"""
     # Clean out the list, only pass "full" args.
     del args[0]
     args = [x.strip(" ") for x in args]
     args = [ele for ele in args if ele.strip()]
+    seals = [seal[:-1] if seal.endswith((",", ":")) else seal for seal in args]
 
-    # Current Responders:
-    responders = getattr(case, resp_type)
-    # Loop through the list, checking each to see if they are actually a user.
-    for seal in args:
-        if seal.endswith(",") or seal.endswith(":"):
-            seal = seal[:-1]
-        user_level = 1
-        # AttributeError is thrown if a user does not exist. Accept and move on.
-        try:
-            chat_whois = await User.get_info(ctx.bot, str(seal))
-            vhost = User.process_vhost(chat_whois.hostname)
-        except (AttributeError, NoUserFound):
-            vhost = "notUser"
-        # There is no hard set "not a seal" vhost level.
+    # Check all of them at once to see if they are actually a user.
+    vhosts = await asyncio.gather(*(_seal_vhost(ctx, seal) for seal in seals))
+    # There is no hard set "not a seal" vhost level.
+    identified = [seal for seal, vhost in zip(seals, vhosts) if vhost is not None]
+    for seal, vhost in zip(seals, vhosts):
         if vhost is None:
-            user_level = 0
-        if user_level == 0:
             await ctx.reply(
                 f"{ctx.sender}: {str(seal)} is not identified as a trained seal. Have them check their "
                 f"IRC setup?"
             )
-        else:
-            val_seal: Seal = await whois(ctx.bot.engine, str(seal))
-            if val_seal not in responders:
+    val_seals = await whois_many(ctx.bot.engine, identified)
+    for seal in identified:
+        if val_seals[seal] is None:
+            await ctx.reply(
+                f"{ctx.sender}: {str(seal)} could not be looked up as a trained seal. "
+                f"Please try adding them again."
+            )
+    async with ctx.bot.board.lock(case.board_id):
+        # Current Responders, as they are now that nobody else can change them
+        current = ctx.bot.board.return_rescue(case.board_id)
+        responders = list(getattr(current, resp_type))
+        for seal in identified:
+            val_seal: Optional[Seal] = val_seals[seal]
+            if val_seal is not None and val_seal not in responders:
                 responders.append(val_seal)
-    res_kwarg = {resp_type: responders}
-    await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
+        res_kwarg = {resp_type: responders}
+        await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
 
 
 async def rem_responder(ctx: Context, args: List[str], case: Case, resp_type: str):
@@ -86,22 +98,19 @@ async def rem_responder(ctx: Context, args: List[str], case: Case, resp_type: st
     del args[0]
     args = [x.strip(" ") for x in args]
     args = [ele for ele in args if ele.strip()]
+    seals = [seal[:-1] if seal.endswith((",", ":")) else seal for seal in args]
 
-    # Current Responders:
-    responders = getattr(case, resp_type)
-    # Loop through the list, checking each to see if they are actually a user.
-    for seal in args:
-        if seal.endswith(",") or seal.endswith(":"):
-            seal = seal[:-1]
-        # AttributeError is thrown if a user does not exist. Accept and move on.
-        try:
-            val_seal: Seal = await whois(ctx.bot.engine, str(seal))
-        except ValueError:
-            continue
-        if val_seal in responders:
-            responders.remove(val_seal)
-    res_kwarg = {resp_type: responders}
-    await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
+    val_seals = await whois_many(ctx.bot.engine, seals)
+    async with ctx.bot.board.lock(case.board_id):
+        # Current Responders, as they are now that nobody else can change them
+        current = ctx.bot.board.return_rescue(case.board_id)
+        responders = list(getattr(current, resp_type))
+        # Seals that aren't registered can't be responding. Accept and move on.
+        for val_seal in val_seals.values():
+            if val_seal is not None and val_seal in responders:
+                responders.remove(val_seal)
+        res_kwarg = {resp_type: responders}
+        await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
 
 
 # FACT WRAPPERS
@@ -142,7 +151,6 @@ async def cmd_welcome(ctx: Context, args: List[str]):
             await ctx.bot.facts.fact_formatted(fact=("welcome", "en"), arguments=args)
         )
         return await ctx.reply(f"Attn {ctx.sender}: Case for {args[0]} not found!")
-    spatches = case.dispatchers
     try:
         spatch: Seal = await whois(ctx.bot.engine, ctx.sender)
     except ValueError as disp_no_exist:
@@ -150,10 +158,12 @@ async def cmd_welcome(ctx: Context, args: List[str]):
             "Error! Dispatcher doesn't seem to exist in the database. Unable to comply."
         )
         raise ValueError from disp_no_exist
-    if spatch not in spatches:
-        spatches.append(spatch)
-    res_kwarg = {"welcomed": True, "dispatchers": spatches}
-    await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
+    async with ctx.bot.board.lock(case.board_id):
+        spatches = list(ctx.bot.board.return_rescue(case.board_id).dispatchers)
+        if spatch not in spatches:
+            spatches.append(spatch)
+        res_kwarg = {"welcomed": True, "dispatchers": spatches}
+        await ctx.bot.board.mod_case(case_id=case.board_id, **res_kwarg)
     args = [case.irc_nick]
     return await ctx.reply(
         await ctx.bot.facts.fact_formatted(fact=("welcome", "en"), arguments=args)
@@ -222,13 +232,23 @@ async def cmd_remdisp(ctx: Context, args: List[str], case: Case):
 
 
 # BOARD AND CASE LISTING
+# Filters of !listboard, by platform or case type
+_BOARD_FILTERS = {
+    **{
+        platform.name.casefold().replace("_horizons", ""): {"platform": platform}
+        for platform in Platform
+    },
+    **{case_type.name.casefold(): {"case_type": case_type} for case_type in CaseType},
+}
+
+
 @Commands.command("listboard")
 @needs_permission(Drilled)
 async def cmd_listboard(ctx: Context, args: List[str]):
     """
     Send a user the key details of every case on the board in DMs
 
-    Usage: !listboard [Platform or Case Type]
+    Usage: !listboard [Platform, Case Type or mine]
     Aliases: n/a
     """
     # Get the Case Board
@@ -237,28 +257,18 @@ async def cmd_listboard(ctx: Context, args: List[str]):
         return await ctx.redirect("The case board is empty!")
     # Process Args (If Exist)
     list_filter = args[0].casefold() if args else None
-    hskf_by_type = {
-        CaseType.SEAL: "Seal",
-        CaseType.BLACK: "Seal",
-        CaseType.BLUE: "Seal",
-        CaseType.FISH: "Fisher",
-    }
-    count = 0
+    if list_filter == "mine":
+        cases = ctx.bot.board.query(seal=ctx.sender)
+    elif list_filter in _BOARD_FILTERS:
+        cases = ctx.bot.board.query(**_BOARD_FILTERS[list_filter])
+    elif list_filter:
+        cases = []
+    else:
+        cases = ctx.bot.board.query()
+    count = len(cases)
     message = "Here's the current case board:\n\n"
-    for case in caseboard.values():
-        if list_filter and list_filter not in (
-            case.platform.name.casefold().replace("_horizons", ""),
-            case.case_type.name.casefold(),
-        ):
-            continue
-        hskf = hskf_by_type.get(case.case_type, "Unknown")
-        long_ago = now(tz="utc").diff(case.updated_time).in_words()
-        plt = case.platform.name.replace("_", " ")
-        message += (
-            f"Case {case.board_id}: Client: {case.client_name}, Platform: {plt}, "
-            f"Type: {hskf}, Status: {case.status.name}, Updated: {long_ago} ago.\n"
-        )
-        count += 1
+    for case in cases:
+        message += f"{case.summary()}\n"
 
     message += f"\n{len(caseboard)} Cases on the Board."
     if list_filter:
@@ -679,7 +689,7 @@ async def cmd_notes(ctx: Context, args: List[str], case: Case):
     new_notes = (
         f"{' '.join(args[1:])} - {ctx.sender} ({now(tz='UTC').to_time_string()})"
     )
-    case.case_notes.append(new_notes)
+    await ctx.bot.board.add_note(case.board_id, ctx.sender, new_notes)
     return await ctx.reply(f"Notes for case {case.board_id} updated.")
 
 
@@ -721,7 +731,7 @@ async def cmd_delnote(ctx: Context, args: List[str], case: Case):
     except (ValueError, IndexError):
         return await ctx.reply("Invalid Note Index provided!")
     await ctx.reply(f"Removing line {target_line!r}")
-    del case.case_notes[del_index]
+    await ctx.bot.board.delete_note(case.board_id, ctx.sender, del_index)
     return await ctx.reply(f"Notes for case {case.board_id} updated.")
 
 
@@ -746,8 +756,11 @@ async def cmd_editnote(ctx: Context, args: List[str], case: Case):
         return await ctx.reply("Invalid Note Index provided!")
     await ctx.reply(f"Editing line {target_line!r} to the provided text.")
 
-    case.case_notes[note_index] = (
-        f"{' '.join(args[2:])} - {ctx.sender} ({now(tz='UTC')})"
+    await ctx.bot.board.edit_note(
+        case.board_id,
+        ctx.sender,
+        note_index,
+        f"{' '.join(args[2:])} - {ctx.sender} ({now(tz='UTC')})",
     )
     return await ctx.reply(f"Notes for case {case.board_id} updated.")
 
@@ -776,7 +789,7 @@ async def cmd_remcase(ctx: Context, args: List[str], case: Case):
             f"from the board at {now(tz='UTC').to_time_string()}"
         )
     logger.warning(new_notes)
-    case.case_notes.append(new_notes)
+    await ctx.bot.board.add_note(case.board_id, ctx.sender, new_notes)
     await ctx.bot.board.del_case(case=case)
     return await ctx.reply(
         f"Administratively removed case {case.board_id} from the board."
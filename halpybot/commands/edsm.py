@@ -27,6 +27,7 @@ from ..packages.utils import (
     cmdr_exceptions,
     dist_exceptions,
     coords_exceptions,
+    cache_response,
 )
 from ..packages.command import Commands
 from ..packages.models import Context, Case, Points, Point
@@ -103,6 +104,7 @@ async def differentiate(ctx: Context, args: List[str]) -> Points:
 
 @Commands.command("lookup", "syslookup")
 @sys_exceptions
+@cache_response()
 async def cmd_systemlookup(ctx: Context, cleaned_sys, cache_override):
     """
     Check EDSM for the existence of a system.
@@ -134,6 +136,7 @@ async def cmd_cmdrlocate(ctx: Context, cmdr, cache_override):
 
 @Commands.command("distance", "dist")
 @dist_exceptions
+@cache_response(board_sensitive=True)
 async def cmd_distlookup(ctx: Context, args: List[str], cache_override):
     """
     Check EDSM for the distance between two known points.
@@ -166,6 +169,7 @@ async def cmd_distlookup(ctx: Context, args: List[str], cache_override):
 
 @Commands.command("landmark")
 @sys_exceptions
+@cache_response()
 async def cmd_landmarklookup(ctx: Context, cleaned_sys, cache_override):
     """
     Calculate the closest landmark system to a known EDSM system.
@@ -193,6 +197,7 @@ async def cmd_landmarklookup(ctx: Context, cleaned_sys, cache_override):
 
 @Commands.command("dssa")
 @sys_exceptions
+@cache_response()
 async def cmd_dssalookup(ctx: Context, cleaned_sys, cache_override):
     """
     Calculate the closest DSSA Carrier to a known EDSM system.
@@ -231,6 +236,7 @@ async def cmd_coordslookup(ctx, xcoord, ycoord, zcoord):
 
 @Commands.command("diversion")
 @sys_exceptions
+@cache_response()
 async def cmd_diversionlookup(ctx: Context, cleaned_sys, cache_override):
     """
     Calculate the 5 closest FDEV-placed structures with repair capability to a known EDSM location.
@@ -187,6 +187,26 @@ async def cmd_listfacts(ctx: Context, args: List[str]):
     )
 
 
+@Commands.command("factsearch")
+async def cmd_factsearch(ctx: Context, args: List[str]):
+    """
+    Find facts by their text
+
+    Usage: !factsearch [text]
+    Aliases: n/a
+    """
+    if not args:
+        return await ctx.reply(get_help_text(ctx.bot.commandsfile, "factsearch"))
+    query = " ".join(args)
+    results = ctx.bot.facts.search(query)
+    if not results:
+        return await ctx.redirect(f"No facts found matching '{query}'.")
+    return await ctx.redirect(
+        f"Facts matching '{query}':\n"
+        f"{', '.join(name if lang == 'en' else f'{name}-{lang}' for name, lang in results)}"
+    )
+
+
 @Commands.command("editfact", "updatefact")
 @needs_permission(Admin)
 @needs_database
@@ -210,8 +230,7 @@ async def cmd_editfact(ctx: Context, args: List[str]):
         message = " ".join(args[1:])
         message = strip_non_ascii(message)
         message = str(message[0])
-        await ctx.bot.facts.delete_fact(ctx.bot.engine, name, lang)
-        await ctx.bot.facts.add_fact(ctx.bot.engine, name, lang, message, ctx.sender)
+        await ctx.bot.facts.edit_fact(ctx.bot.engine, name, lang, message, ctx.sender)
         return await ctx.reply("Fact successfully edited.")
     except NoDatabaseConnection:
         logger.exception("No database connection! Fact not edited. ")
@@ -20,9 +20,9 @@ from ..packages.models import Context, User
 from ..packages.announcer import send_webhook
 
 
-async def send_message(message_content: str, sender: str, embeds):
+async def send_message(message_content: str, sender: str, embeds, case: bool = False):
     """
-    Send a message to Discord
+    Send a message to Discord, case notifications ahead of everything else
     """
     cn_message = {
         "content": message_content,
@@ -35,6 +35,7 @@ async def send_message(message_content: str, sender: str, embeds):
         hook_id=config.discord_notifications.webhook_id,
         hook_token=config.discord_notifications.webhook_token.get_secret_value(),
         body=cn_message,
+        case=case,
     )
 
 
@@ -75,30 +76,28 @@ async def cmd_manual_case(ctx: Context, args: List[str]):
         return await ctx.reply("Discord module not enabled. Notification not sent.")
     message_content = f"New Incoming Case - {config.discord_notifications.case_notify}"
     sender = "HalpyBOT"
-    embeds = (
-        [
-            {
-                "title": "New Manual Case!",
-                "type": "rich",
-                "timestamp": f"{pendulum.now(tz='utc').strftime('%Y-%m-%dT%H:%M:%S.000Z')}",
-                "color": 16093727,
-                "footer": {
-                    "text": f"{ctx.sender}",
-                    "icon_url": "https://hullseals.space/images/emblem_mid.png",
+    embeds = [
+        {
+            "title": "New Manual Case!",
+            "type": "rich",
+            "timestamp": f"{pendulum.now(tz='utc').strftime('%Y-%m-%dT%H:%M:%S.000Z')}",
+            "color": 16093727,
+            "footer": {
+                "text": f"{ctx.sender}",
+                "icon_url": "https://hullseals.space/images/emblem_mid.png",
+            },
+            "fields": [
+                {"name": "IRC Name:", "value": str(args[0]), "inline": False},
+                {
+                    "name": "Case Info:",
+                    "value": " ".join(args[1:]),
+                    "inline": False,
                 },
-                "fields": [
-                    {"name": "IRC Name:", "value": str(args[0]), "inline": False},
-                    {
-                        "name": "Case Info:",
-                        "value": " ".join(args[1:]),
-                        "inline": False,
-                    },
-                ],
-            }
-        ],
-    )
+            ],
+        }
+    ]
     try:
-        await send_message(message_content, sender, embeds)
+        await send_message(message_content, sender, embeds, case=True)
     except WebhookSendError:
         logger.exception("Webhook could not be sent.")
         await ctx.reply(
@@ -20,6 +20,7 @@ from pydantic import (
     AnyHttpUrl,
     FilePath,
     constr,
+    confloat,
 )
 
 
@@ -76,6 +77,27 @@ class ApiConnector(BaseModel):
     key_check_constant: SecretStr
 
 
+class CommandExecution(BaseModel):
+    """Command Executor Config"""
+
+    max_concurrent: int = 8
+    max_pending: int = 5
+
+
+class RateLimit(BaseModel):
+    """Command Rate Limit Config"""
+
+    enabled: bool = False
+    exempt_rescue_channels: bool = True
+    user_burst: int = 5
+    user_rate: float = 0.5  # tokens per second
+    channel_burst: int = 15
+    channel_rate: float = 2.0
+    command_burst: int = 20
+    command_rate: float = 2.0
+    suggestion_interval: confloat(gt=0) = 60.0  # seconds between suggestions to a user
+
+
 class Channels(BaseModel):
     """Channel List Config"""
 
@@ -89,6 +111,9 @@ class Database(BaseModel):
     connection_string: MysqlDsn
     database: str = "pydle"
     timeout: int = 10
+    workers: int = 4
+    heartbeat: int = 60  # seconds
+    seal_ttl: int = 300  # seconds a Seal lookup is reused
 
 
 class ForcedJoin(BaseModel):
@@ -111,6 +136,7 @@ class Edsm(BaseModel):
     maximum_landmark_distance: int = 10_000
     time_cached: int = 300
     uri: AnyHttpUrl = "https://www.edsm.net"
+    enrichment_deadline: float = 15.0  # seconds announcements wait for EDSM details
 
     @property
     def system_endpoint(self) -> str:
@@ -149,6 +175,8 @@ class DiscordNotifications(BaseModel):
     webhook_token: Optional[SecretStr] = None
     case_notify: Optional[constr(regex=r"<@&(\d+)>")] = None
     trained_role: Optional[constr(regex=r"<@&(\d+)>")] = None
+    queue_size: int = 20  # other notifications waiting per webhook, cases never wait
+    max_attempts: int = 3  # posts of other notifications before they are given up
 
 
 class Notify(BaseModel):
@@ -176,10 +204,34 @@ class Notify(BaseModel):
         )
 
 
+class Announcements(BaseModel):
+    """Announcement Delivery Config"""
+
+    # Queue of announcements waiting for IRC, None to keep it in memory only
+    outbox: Optional[str] = "data/announcer/outbox.journal"
+    idempotency_ttl: float = 86400  # seconds an idempotency key is remembered
+    retry_interval: float = 1.0  # seconds, doubled after every failed delivery
+    max_retry_interval: float = 60.0
+
+
+class CaseBoard(BaseModel):
+    """Case Board Persistence and Reminder Config"""
+
+    # Write-ahead log of the board, None to keep the board in memory only
+    journal: Optional[str] = "data/board/board.journal"
+    compact_after: int = 500  # records
+    sync_interval: float = 0.05  # seconds
+    welcome_reminder: float = 300  # seconds an unwelcomed case waits for a reminder
+    o2_warning: float = 60  # seconds of O2 left when a code black is warned about
+    stale_after: float = 1800  # seconds without changes before a case is nudged
+
+
 class Facts(BaseModel):
     """Fact Table Location Config"""
 
     table: str = "facts"
+    # Copy of the fact table kept for cold starts, gzipped if it ends in .gz
+    snapshot: Optional[str] = "data/facts/facts_snapshot.json.gz"
 
 
 class ManualCase(BaseModel):
@@ -250,6 +302,8 @@ class HalpyConfig(BaseSettings):
     irc: Irc
     api_connector: ApiConnector
     channels: Channels
+    command_execution: CommandExecution = CommandExecution()
+    rate_limit: RateLimit = RateLimit()
     database: Optional[Database] = None
     forced_join: ForcedJoin
     offline_mode: OfflineMode = OfflineMode()
@@ -258,6 +312,8 @@ class HalpyConfig(BaseSettings):
     discord_notifications: DiscordNotifications = DiscordNotifications()
     notify: Notify = Notify()
     facts: Facts = Facts()
+    board: CaseBoard = CaseBoard()
+    announcer: Announcements = Announcements()
     manual_case: ManualCase = ManualCase()
     system_monitoring: SystemMonitoring = SystemMonitoring()
     user_agent: UserAgent
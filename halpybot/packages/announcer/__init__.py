@@ -11,15 +11,21 @@ See license.md
 from .announcer import (
     Announcer,
     Announcement,
+    AnnouncementTemplate,
     get_edsm_data,
     AnnouncerArgs,
 )
-from .dc_webhook import send_webhook
+from .dc_webhook import send_webhook, WebhookDispatcher, webhooks
+from .outbox import Outbox
 
 __all__ = [
     "Announcer",
     "Announcement",
+    "AnnouncementTemplate",
     "get_edsm_data",
     "AnnouncerArgs",
     "send_webhook",
+    "WebhookDispatcher",
+    "webhooks",
+    "Outbox",
 ]
@@ -10,14 +10,28 @@ See license.md
 """
 
 from __future__ import annotations
+import asyncio
 import json
 from pathlib import Path
-from typing import List, Dict, Optional, TYPE_CHECKING, TypedDict, Union
+from string import Formatter
+from typing import (
+    Any,
+    FrozenSet,
+    List,
+    Dict,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+    TypedDict,
+    Union,
+)
 from loguru import logger
-from attrs import define
+from attrs import define, field
+from halpybot import config
 from ..case import create_case
 from ..exceptions import (
-    NoNearbyEDSM,
     NoResultsEDSM,
     EDSMLookupError,
     KFCoordsError,
@@ -28,11 +42,12 @@ from ..utils import (
     sys_cleaner,
 )
 from ..edsm import (
-    checklandmarks,
+    Surroundings,
     get_nearby_system,
-    checkdssa,
+    surroundings,
 )
 from ..models import Platform, Case
+from .outbox import Outbox
 
 if TYPE_CHECKING:
     from ..ircclient import HalpyBOT
@@ -81,54 +96,75 @@ async def get_edsm_data(
         )
     sys_name = args["System"]
     try:
-        landmark, distance, direction = await checklandmarks(sys_name)
-        # What we have is good, however, to make things look nice we need to flip the direction Drebin Style
-        direction = cardinal_flip[direction]
-        return (
-            f"{distance} LY {direction} of {landmark}"
-            if generalized
-            else f"\nSystem exists in EDSM, {distance} LY {direction} of {landmark}."
-        )
-    except NoNearbyEDSM:
-        dssa, distance, direction = await checkdssa(sys_name)
-        return (
-            "No major landmark found within 10,000 LY of the provided system."
-            if generalized
-            else f"\nNo major landmark found within 10,000 LY of {sys_name}."
-            f"\nThe closest DSSA Carrier is in {dssa}, {distance} LY {direction} of {sys_name}."
-        )
-    except NoResultsEDSM:
-        found_sys, close_sys = await get_nearby_system(sys_name)
-        if found_sys:
-            try:
-                landmark, distance, direction = await checklandmarks(close_sys)
+        # Name correction is only worth the extra requests if EDSM doesn't know the system
+        located = await surroundings(sys_name)
+        if located is None:
+            found_sys, close_sys = await get_nearby_system(sys_name)
+            if not found_sys:
                 return (
-                    f"System Cleaner found a matching EDSM system {distance} LY {direction} of "
-                    f"{landmark}."
+                    "\nDistance to landmark or DSSA unknown. Check case details with Dispatch."
                     if generalized
-                    else f"\n{sys_name} could not be found in EDSM. "
-                    f"System closest in name found in "
-                    f"EDSM was {close_sys}\n{close_sys} is {distance} LY {direction} of {landmark}. "
-                )
-            except NoNearbyEDSM:
-                dssa, distance, direction = await checkdssa(close_sys)
-                return (
-                    f"Corrected system calculated to be {distance} LY {direction} of {dssa}."
-                    if generalized
-                    else f"\nThe closest DSSA Carrier is "
-                    f"in {dssa}, {distance} LY {direction} of {close_sys}. "
+                    else "\nSystem Not Found in EDSM.\n"
+                    "Please check system name with client."
                 )
+            located = await surroundings(close_sys)
+            if located is None:
+                raise NoResultsEDSM(f"{close_sys} could not be located in EDSM.")
+            return _corrected_details(sys_name, located, generalized)
+    except EDSMLookupError:
+        return "\nUnable to query EDSM."
+    landmark, carrier = located.landmark, located.carrier
+    if landmark.within(config.edsm.maximum_landmark_distance):
+        # Make things look nice by flipping the direction Drebin Style
+        direction = cardinal_flip[landmark.direction]
         return (
-            "\nDistance to landmark or DSSA unknown. Check case details with Dispatch."
+            f"{landmark.distance} LY {direction} of {landmark.name}"
             if generalized
-            else "\nSystem Not Found in EDSM.\n" "Please check system name with client."
+            else f"\nSystem exists in EDSM, {landmark.distance} LY {direction} of "
+            f"{landmark.name}."
         )
-    except EDSMLookupError:
-        return "\nUnable to query EDSM."
+    return (
+        "No major landmark found within 10,000 LY of the provided system."
+        if generalized
+        else f"\nNo major landmark found within 10,000 LY of {sys_name}."
+        f"\nThe closest DSSA Carrier is in {carrier.name}, {carrier.distance} LY "
+        f"{carrier.direction} of {sys_name}."
+    )
+
+
+def _corrected_details(
+    sys_name: str, located: Surroundings, generalized: bool = False
+) -> str:
+    """Format the EDSM info of the system a misspelled one was corrected to"""
+    landmark, carrier = located.landmark, located.carrier
+    if landmark.within(config.edsm.maximum_landmark_distance):
+        direction = cardinal_flip[landmark.direction]
+        return (
+            f"System Cleaner found a matching EDSM system {landmark.distance} LY "
+            f"{direction} of {landmark.name}."
+            if generalized
+            else f"\n{sys_name} could not be found in EDSM. "
+            f"System closest in name found in EDSM was {located.name}\n"
+            f"{located.name} is {landmark.distance} LY {direction} of {landmark.name}. "
+        )
+    return (
+        f"Corrected system calculated to be {carrier.distance} LY "
+        f"{carrier.direction} of {carrier.name}."
+        if generalized
+        else f"\nThe closest DSSA Carrier is in {carrier.name}, {carrier.distance} LY "
+        f"{carrier.direction} of {located.name}. "
+    )
 
 
 class Announcer:
-    """The Announcer - Send Messages to All Points"""
+    """The Announcer - Send Messages to All Points
+
+    Announcements are queued in the outbox as soon as they are formatted, and
+    delivered from there once IRC takes them. Where the announcement asks for
+    EDSM details, those are looked up afterwards, under
+    `edsm.enrichment_deadline`, and queued as a follow-up tagged with the case,
+    so neither EDSM nor IRC being slow or down holds up a new case.
+    """
 
     PPWK_CONST = "PPWK"
 
@@ -139,6 +175,13 @@ class Announcer:
         TODO: This should be converted into a attrs.define dataclass in the future.
         """
         self._announcements = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._outbox = Outbox(
+            config.announcer.outbox,
+            key_ttl=config.announcer.idempotency_ttl,
+            retry_interval=config.announcer.retry_interval,
+            max_retry_interval=config.announcer.max_retry_interval,
+        )
         # Load data
         data_path = Path("data/announcer/announcer.json")
         with data_path.open(encoding="UTF-8") as ann_file:
@@ -158,28 +201,58 @@ class Announcer:
             )
             self._announcements[ann_type["ID"]] = ann
 
-    async def announce(self, announcement: str, args: Dict, client: HalpyBOT):
+    @property
+    def outbox(self) -> Outbox:
+        """Queue of announcement messages waiting for IRC"""
+        return self._outbox
+
+    def start(self, client: HalpyBOT):
+        """Deliver the queued announcements, e.g. once the bot (re)connected
+
+        Args:
+            client: The IRC Bot instance, used to send messages.
+
+        """
+        self._outbox.start(client)
+
+    async def announce(
+        self,
+        announcement: str,
+        args: Dict,
+        client: HalpyBOT,
+        key: Optional[str] = None,
+    ) -> bool:
         """Announce a new case
 
         Args:
             announcement: The type of announcement to make
             args: Arguments for the case announcement
             client: The IRC Bot instance, used to send messages.
+            key: Idempotency key of the request. An announcement with the
+                same key as an earlier one is not made again.
 
         Returns:
-            Nothing
+            (bool): True if the announcement was queued, False if it repeated
+                an earlier one
 
         Raises:
             AnnouncementError: Case could not be announced for any reason
 
         """
         ann = self._announcements[announcement]
+        if key is not None and not self._outbox.claim(key):
+            logger.info("Ignoring repeated announcement {key}", key=key)
+            return False
         # noinspection PyBroadException
         # We want to catch everything
         try:
             formatted = await ann.format(args, client)
-            for channel in ann.channels:
-                await client.message(channel, formatted)
+            self._outbox.start(client)
+            self._outbox.put(((channel, formatted) for channel in ann.channels), key)
+            if ann.edsm:
+                task = asyncio.create_task(self._enrich(ann, dict(args)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
         except CaseAlreadyExists as aee:
             logger.exception("Case Already Exists Matching")
             raise CaseAlreadyExists from aee
@@ -189,15 +262,58 @@ class Announcer:
         except Exception as announcement_exception:
             logger.exception("An announcement exception occurred!")
             raise AnnouncementError(Exception) from announcement_exception
+        finally:
+            if key is not None:
+                self._outbox.release(key)
         if announcement == self.PPWK_CONST:
             cmdr: str = args.get("CMDR")
             if not cmdr:
-                return
+                return True
             try:
                 case: Case = client.board.return_rescue(cmdr.casefold())
             except KeyError:
-                return  # Case Must Not Have Been From Board.
+                return True  # Case Must Not Have Been From Board.
             await client.board.del_case(case)
+        return True
+
+    async def _enrich(self, ann: Announcement, args: AnnouncerArgs):
+        """Follow up an announcement with the EDSM details of the system
+
+        Args:
+            ann: The announcement that was made
+            args: Arguments the announcement was formatted with
+
+        """
+        if args.get("Board_ID"):
+            tag = f"Case {args['Board_ID']}"
+        else:
+            tag = f"CMDR {args.get('CMDR')}"
+        try:
+            details = await asyncio.wait_for(
+                get_edsm_data(args), timeout=config.edsm.enrichment_deadline
+            )
+        except ValueError:
+            details = (
+                "Attention Dispatch, please confirm clients system before proceeding."
+            )
+        except asyncio.TimeoutError:
+            logger.warning("EDSM details for {tag} timed out", tag=tag)
+            details = (
+                "EDSM did not respond in time. Please check system name with client."
+            )
+        # noinspection PyBroadException
+        # The announcement is out already, a failing follow-up must stay quiet
+        except Exception:
+            logger.exception("Unable to look up the EDSM details for {tag}", tag=tag)
+            return
+        followup = f"{details.strip()} ({tag})"
+        self._outbox.put((channel, followup) for channel in ann.channels)
+
+    async def drain(self):
+        """Wait until every pending EDSM follow-up and queued message has been sent"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._outbox.drain()
 
 
 class AnnouncerArgs(TypedDict):
@@ -219,6 +335,90 @@ class AnnouncerArgs(TypedDict):
     Oxygen: Optional[str]
 
 
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+
+class AnnouncementTemplate:
+    """Announcement content, parsed into literal text and placeholders once
+
+    Every placeholder must name a field of `AnnouncerArgs`, so a typo in the
+    announcer config is caught when the announcements are loaded, and rendering
+    only has to stitch the announcement together in a single pass.
+
+    """
+
+    __slots__ = ("_parts", "_fields")
+
+    def __init__(self, content: str, name: str = "announcement"):
+        """Compile an announcement template
+
+        Args:
+            content (str): The announcement, in `str.format` syntax
+            name (str): Announcement the template belongs to, for error messages
+
+        Raises:
+            AnnouncementError: The template is malformed, or has a placeholder
+                that isn't a field of `AnnouncerArgs`
+
+        """
+        known = AnnouncerArgs.__annotations__.keys()
+        parts: List[Tuple[str, Optional[str], Optional[str], str]] = []
+        try:
+            parsed = list(Formatter().parse(content))
+        except ValueError as bad_format:
+            raise AnnouncementError(
+                f"Malformed template for {name}: {bad_format}"
+            ) from bad_format
+        for literal, placeholder, spec, conversion in parsed:
+            if placeholder is not None:
+                if placeholder not in known:
+                    raise AnnouncementError(
+                        f"Unknown placeholder {{{placeholder}}} in {name}"
+                    )
+                if "{" in (spec or ""):
+                    raise AnnouncementError(
+                        f"Nested placeholder in {{{placeholder}}} of {name}"
+                    )
+            parts.append((literal, placeholder, conversion, spec or ""))
+        self._parts = tuple(parts)
+        self._fields = frozenset(
+            placeholder for _, placeholder, _, _ in parts if placeholder is not None
+        )
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Names of the arguments the template uses"""
+        return self._fields
+
+    def render(self, args: Mapping[str, Any]) -> str:
+        """Fill in the template
+
+        Args:
+            args (dict): Arguments for the announcement
+
+        Returns:
+            (str): The announcement
+
+        Raises:
+            AnnouncementError: An argument the template uses is missing
+
+        """
+        missing = self._fields.difference(args)
+        if missing:
+            raise AnnouncementError(
+                f"Missing announcement arguments: {', '.join(sorted(missing))}"
+            )
+        pieces: List[str] = []
+        for literal, placeholder, conversion, spec in self._parts:
+            pieces.append(literal)
+            if placeholder is not None:
+                value = args[placeholder]
+                if conversion:
+                    value = _CONVERSIONS[conversion](value)
+                pieces.append(format(value, spec))
+        return "".join(pieces)
+
+
 @define
 class Announcement:
     """Create a new announceable object
@@ -232,6 +432,9 @@ class Announcement:
             an EDSM system query on. none if Null.
         content (list of str): lines to be sent in the announcement
         type (str): The Type of announcement (Case, Action, or Other)
+
+    Raises:
+        AnnouncementError: The content is not a valid announcement template
     """
 
     case_type: str
@@ -241,11 +444,16 @@ class Announcement:
     content: List[str]
     edsm: Optional[int] = None
     type: Optional[str] = None
+    template: AnnouncementTemplate = field(init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        self.template = AnnouncementTemplate("".join(self.content), self.case_type)
 
     async def format(self, args: AnnouncerArgs, client: HalpyBOT) -> str:
         """Format announcement in a ready-to-be-sent format
 
-        This includes the result of the EDSM query if specified in the config
+        The EDSM details are not included, those are sent by the Announcer once
+        the announcement is out.
 
         Args:
             *args: List of parameters to be formatted into the announcement
@@ -255,7 +463,7 @@ class Announcement:
             (str): Fully formatted announcement
 
         Raises:
-            IndexError: an invalid number of parameters was provided
+            AnnouncementError: a parameter used by the announcement is missing
 
         """
         # Cleanup the system, if exists
@@ -278,13 +486,7 @@ class Announcement:
                 raise
 
         # Finally, format and return
-        formatted_content = "".join(self.content)
-        announcement = formatted_content.format(**args)
-        if self.edsm:
-            try:
-                announcement += await get_edsm_data(args)
-            except ValueError:
-                announcement += "\nAttention Dispatch, please confirm clients system before proceeding."
+        announcement = self.template.render(args)
         if args.get("Board_ID"):
             case = client.board.return_rescue(args["Board_ID"])
             if case.irc_nick != case.client_name:
@@ -9,18 +9,306 @@ See license.md
 
 """
 
-from typing import Dict, Union, Optional
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Union
 import aiohttp
 from loguru import logger
 
-from halpybot import DEFAULT_USER_AGENT
+from halpybot import DEFAULT_USER_AGENT, config
 from halpybot.packages.exceptions import WebhookSendError
 
+Body = Dict[str, Any]
+
+# Discord's limits on a single webhook message
+_MAX_CONTENT = 2000
+_MAX_EMBEDS = 10
+
+
+class _Delivery:
+    """A webhook payload waiting to be posted"""
+
+    __slots__ = ("body", "case", "future", "attempts")
+
+    def __init__(self, body: Body, case: bool, future: asyncio.Future):
+        self.body = body
+        self.case = case
+        self.future = future
+        self.attempts = 0
+
+
+class _Webhook:
+    """Queues and rate limit state of a single webhook"""
+
+    __slots__ = ("cases", "others", "remaining", "reset_at", "worker")
+
+    def __init__(self):
+        self.cases: Deque[_Delivery] = deque()
+        self.others: Deque[_Delivery] = deque()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.worker: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.cases or self.others)
+
+    def requeue(self, batch: List[_Delivery]):
+        """Put a batch back at the front of the queues, in its original order"""
+        for delivery in reversed(batch):
+            (self.cases if delivery.case else self.others).appendleft(delivery)
+
+
+def _coalescible(first: Body, other: Body) -> bool:
+    """Check if two payloads can be posted as one message"""
+    keys = ("username", "avatar_url", "tts")
+    return all(first.get(key) == other.get(key) for key in keys)
+
+
+def _merge(batch: List[_Delivery]) -> Body:
+    """Combine the payloads of a batch into a single message"""
+    body = dict(batch[0].body)
+    contents = [d.body.get("content") for d in batch if d.body.get("content")]
+    embeds = [embed for d in batch for embed in d.body.get("embeds") or ()]
+    body["content"] = "\n".join(contents)
+    body["embeds"] = embeds
+    return body
+
+
+class WebhookDispatcher:
+    """Post Discord webhooks over a shared session, within Discord's rate limits
+
+    Every webhook has its own queue and worker, so a throttled webhook never
+    holds up another one. Case notifications are queued ahead of everything
+    else, are never turned away, and are retried until Discord takes them,
+    although their senders are told of the failure after
+    `discord_notifications.max_attempts` failed posts. Other payloads are
+    limited to `discord_notifications.queue_size` waiting messages per webhook,
+    and are given up on after `discord_notifications.max_attempts` failed posts. Payloads that pile up
+    while the webhook is busy are coalesced into as few messages as Discord's
+    content and embed limits allow. The rate limit headers of every response
+    are kept, so the worker waits for a bucket to refill instead of running into
+    a 429, and does as told by `retry_after` when one comes back anyway.
+
+    """
+
+    def __init__(
+        self,
+        queue_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        retry_interval: float = 1.0,
+    ):
+        """Create a new dispatcher
+
+        Args:
+            queue_size (int): Other payloads a webhook can have waiting, taken
+                from the config if None
+            max_attempts (int): Posts of other payloads before they are given up,
+                taken from the config if None
+            retry_interval (float): Seconds before a failed post is retried,
+                doubled after every failure
+
+        """
+        self._queue_size = queue_size
+        self._max_attempts = max_attempts
+        self._retry_interval = retry_interval
+        self._webhooks: Dict[str, _Webhook] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def queue_size(self) -> int:
+        """Other payloads a webhook can have waiting"""
+        if self._queue_size is not None:
+            return self._queue_size
+        return config.discord_notifications.queue_size
+
+    @property
+    def max_attempts(self) -> int:
+        """Posts of other payloads before they are given up"""
+        if self._max_attempts is not None:
+            return self._max_attempts
+        return config.discord_notifications.max_attempts
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The session shared by all webhooks, opened on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"User-Agent": DEFAULT_USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._session
+
+    async def send(self, url: str, body: Body, case: bool = False):
+        """Queue a payload, and wait until Discord took it
+
+        Args:
+            url (str): URL of the webhook
+            body (Dict): JSON body for the request, see Discord API documentation
+            case (bool): True for case notifications, which go ahead of other
+                payloads and are never dropped
+
+        Raises:
+            WebhookSendError: The payload was turned away, or could not be posted
+
+        """
+        webhook = self._webhooks.setdefault(url, _Webhook())
+        if not case and len(webhook.others) >= self.queue_size:
+            raise WebhookSendError("Too many webhooks waiting to be sent")
+        delivery = _Delivery(body, case, asyncio.get_running_loop().create_future())
+        (webhook.cases if case else webhook.others).append(delivery)
+        if webhook.worker is None or webhook.worker.done():
+            webhook.worker = asyncio.create_task(self._work(url, webhook))
+        await asyncio.shield(delivery.future)
+
+    @staticmethod
+    def _take_batch(webhook: _Webhook) -> List[_Delivery]:
+        """Take the next payload, and the ones it can be coalesced with
+
+        Case notifications are only ever coalesced with each other, so a bad
+        payload of another kind can't get one rejected.
+
+        """
+        queue = webhook.cases or webhook.others
+        batch = [queue.popleft()]
+        first = batch[0].body
+        content = len(first.get("content") or "")
+        embeds = len(first.get("embeds") or ())
+        while queue and _coalescible(first, queue[0].body):
+            body = queue[0].body
+            more_content = len(body.get("content") or "")
+            more_embeds = len(body.get("embeds") or ())
+            if (
+                content + more_content + 1 > _MAX_CONTENT
+                or embeds + more_embeds > _MAX_EMBEDS
+            ):
+                break
+            content += more_content + 1
+            embeds += more_embeds
+            batch.append(queue.popleft())
+        return batch
+
+    async def _work(self, url: str, webhook: _Webhook):
+        """Post the queued payloads of a webhook until there are none left"""
+        loop = asyncio.get_running_loop()
+        delay = self._retry_interval
+        while webhook:
+            if webhook.remaining == 0 and loop.time() < webhook.reset_at:
+                await asyncio.sleep(webhook.reset_at - loop.time())
+            batch = self._take_batch(webhook)
+            body = _merge(batch) if len(batch) > 1 else batch[0].body
+            # noinspection PyBroadException
+            # Whatever goes wrong, the senders waiting on this batch must hear of it
+            try:
+                status = await self._post(url, body, webhook)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                logger.warning("Unable to send webhook: {ex!r}", ex=ex)
+                status = None
+            except Exception:
+                logger.exception("Unable to send webhook")
+                self._fail(batch, "Unable to send webhook")
+                continue
+            if status == 429:
+                # Rate limited after all, try again once the bucket is refilled
+                webhook.requeue(batch)
+                continue
+            if status is not None and status < 400:
+                delay = self._retry_interval
+                for delivery in batch:
+                    if not delivery.future.done():
+                        delivery.future.set_result(None)
+                continue
+            if status is not None and status < 500:
+                logger.error(
+                    "Discord rejected a webhook with status {status}", status=status
+                )
+                self._fail(batch, f"Discord rejected the webhook: {status}")
+                continue
+            # Connection trouble or a server error, worth another try
+            retry = []
+            for delivery in batch:
+                delivery.attempts += 1
+                if delivery.attempts < self.max_attempts:
+                    retry.append(delivery)
+                    continue
+                # The sender hears of it either way, but cases are still posted
+                # as soon as Discord is back
+                self._fail([delivery], "Unable to send webhook")
+                if delivery.case:
+                    retry.append(delivery)
+            webhook.requeue(retry)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    @staticmethod
+    def _fail(batch: List[_Delivery], reason: str):
+        """Tell the senders of a batch it won't be posted"""
+        for delivery in batch:
+            if not delivery.future.done():
+                delivery.future.set_exception(WebhookSendError(reason))
+
+    async def _post(self, url: str, body: Body, webhook: _Webhook) -> int:
+        """Post a payload, and keep the rate limit state Discord sent back
+
+        Returns:
+            (int): The response status
+
+        """
+        loop = asyncio.get_running_loop()
+        async with self._get_session().post(url, json=body) as response:
+            headers = response.headers
+            if "X-RateLimit-Remaining" in headers:
+                webhook.remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset-After" in headers:
+                webhook.reset_at = loop.time() + float(
+                    headers["X-RateLimit-Reset-After"]
+                )
+            if response.status != 429:
+                return response.status
+            try:
+                retry_after = float((await response.json())["retry_after"])
+            except (aiohttp.ContentTypeError, KeyError, TypeError, ValueError):
+                retry_after = float(headers.get("Retry-After", 1))
+            webhook.remaining = 0
+            webhook.reset_at = loop.time() + retry_after
+            return response.status
+
+    async def drain(self):
+        """Wait until every queued payload has been dealt with"""
+        workers = [
+            webhook.worker
+            for webhook in self._webhooks.values()
+            if webhook.worker is not None
+        ]
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def shutdown(self, timeout: float = 10.0):
+        """Give the queued payloads a last chance, and close the shared session
+
+        Args:
+            timeout (float): Seconds to wait for the queues to empty
+
+        """
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping the webhooks still queued at shutdown")
+        await self.close()
+
+    async def close(self):
+        """Close the shared session"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+webhooks = WebhookDispatcher()
+
 
 async def send_webhook(
     hook_id: Optional[int],
     hook_token: str,
     body: Dict[str, Union[str, Dict[str, Union[str, bool, int]]]],
+    case: bool = False,
 ):
     """Send a webhook payload to Discord
 
@@ -28,6 +316,8 @@ async def send_webhook(
         hook_id (int): ID for the webhook as registered with Discord
         hook_token (str): Webhook token
         body (Dict): JSON body for the request, see Discord API documentation
+        case (bool): True for case notifications, which are never dropped or
+            held up behind other payloads
 
     Returns:
         Nothing
@@ -37,12 +327,9 @@ async def send_webhook(
 
     """
     try:
-        async with aiohttp.ClientSession(
-            headers={"User-Agent": DEFAULT_USER_AGENT}
-        ) as session:
-            await session.post(
-                f"https://discord.com/api/webhooks/{hook_id}/{hook_token}", json=body
-            )
-    except aiohttp.ClientError as ex:
+        await webhooks.send(
+            f"https://discord.com/api/webhooks/{hook_id}/{hook_token}", body, case
+        )
+    except WebhookSendError:
         logger.exception("Unable to send webhook")
-        raise WebhookSendError from ex
+        raise
@@ -0,0 +1,340 @@
+"""
+outbox.py - Durable delivery queue for announcements
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import tempfile
+from collections import deque
+from time import time
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+from loguru import logger
+from ..board import replace_durably
+
+if TYPE_CHECKING:
+    from ..ircclient import HalpyBOT
+
+
+class Outbox:
+    """Announcement messages waiting to be delivered to IRC
+
+    Messages are written to disk before they are queued, and only dropped once
+    IRC took them, so nothing is lost to a disconnect or a restart. A single
+    worker delivers them in order while the bot is connected, and backs off
+    while sends are failing. The outbox also remembers the idempotency keys of
+    the announcements it accepted, so a repeated request isn't announced twice.
+
+    Like the board journal, the outbox is an append-only log. Records are handed
+    to the OS right away and fsync calls are batched, and once enough records
+    have been written the log is compacted in a worker thread.
+
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        key_ttl: float = 86400,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+        compact_after: int = 200,
+        sync_interval: float = 0.05,
+    ):
+        """Create a new outbox
+
+        Args:
+            path (str): File the outbox is kept in, None to keep it in memory only
+            key_ttl (float): Seconds idempotency keys are remembered for
+            retry_interval (float): Seconds before a failed delivery is retried
+            max_retry_interval (float): Longest wait between retries
+            compact_after (int): Records written before the log is compacted
+            sync_interval (float): Seconds records are gathered before an fsync
+
+        """
+        self._path = path
+        self._key_ttl = key_ttl
+        self._retry_interval = retry_interval
+        self._max_retry_interval = max_retry_interval
+        self._compact_after = compact_after
+        self._sync_interval = sync_interval
+        self._pending: Deque[Dict[str, str]] = deque()
+        self._keys: Dict[str, float] = {}
+        self._claimed: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._file = None
+        self._records = 0
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._compaction: Optional[asyncio.Task] = None
+        # Records written while a compaction runs, carried over to the new log
+        self._carried: List[str] = []
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _load(self):
+        """Restore the messages and keys left over from the last run"""
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        records: List[str] = []
+        try:
+            with open(self._path, encoding="UTF-8") as outbox:
+                records = outbox.read().splitlines()
+        except FileNotFoundError:
+            pass
+        for line in records:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning("Ignoring incomplete announcement outbox record")
+                break
+            if record["op"] == "sent":
+                if self._pending:
+                    self._pending.popleft()
+                continue
+            self._pending.extend(record.get("messages", ()))
+            if record.get("key") is not None:
+                self._keys[record["key"]] = record["at"]
+        if self._pending:
+            logger.info(
+                "{count} undelivered announcement messages restored",
+                count=len(self._pending),
+            )
+        # Start off with a compacted log, which also drops any incomplete record
+        self._file = open(self._path, "a", encoding="UTF-8")
+        if records:
+            replace_durably(self._write_compacted(self._state()), self._path)
+            self._reopen()
+
+    def _state(self) -> List[Dict]:
+        """Records that restore the current outbox, dropping expired keys"""
+        expired = time() - self._key_ttl
+        self._keys = {key: at for key, at in self._keys.items() if at > expired}
+        state: List[Dict] = [
+            {"op": "put", "key": key, "at": at} for key, at in self._keys.items()
+        ]
+        if self._pending:
+            state.append({"op": "put", "messages": list(self._pending)})
+        return state
+
+    def _write_compacted(self, state: List[Dict]) -> str:
+        """Write a compacted log next to the current one
+
+        Returns:
+            (str): Path of the new log, synced but not in place yet
+
+        """
+        directory = os.path.dirname(self._path) or "."
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, delete=False, encoding="UTF-8"
+        ) as tmpfile:
+            tmpfile.writelines(json.dumps(record) + "\n" for record in state)
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        return tmpfile.name
+
+    @staticmethod
+    def _append_synced(path: str, lines: List[str]):
+        """Add records to a log that isn't in use yet"""
+        with open(path, "a", encoding="UTF-8") as log:
+            log.writelines(lines)
+            log.flush()
+            os.fsync(log.fileno())
+
+    def _reopen(self):
+        """Continue writing to the log that was just put in place"""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        self._file.close()
+        self._file = open(self._path, "a", encoding="UTF-8")
+        self._records = 0
+
+    def _write(self, record: Dict):
+        """Write a record to the log, and make sure an fsync follows shortly"""
+        if self._file is None:
+            return
+        line = json.dumps(record) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        self._records += 1
+        if self._compaction is not None:
+            self._carried.append(line)
+        if self._sync_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._sync()
+        self._sync_handle = loop.call_later(self._sync_interval, self._sync)
+
+    def _sync(self):
+        """Flush the log to disk"""
+        self._sync_handle = None
+        if self._file is not None and not self._file.closed:
+            os.fsync(self._file.fileno())
+
+    async def _compact(self):
+        """Compact the log in a worker thread, without losing newer records"""
+        self._carried = []
+        tmpname = await asyncio.to_thread(self._write_compacted, self._state())
+        # Whatever was written in the meantime goes after the compacted records
+        while self._carried:
+            carried, self._carried = self._carried, []
+            await asyncio.to_thread(self._append_synced, tmpname, carried)
+        if self._file is None or self._file.closed:
+            os.unlink(tmpname)
+            return
+        replace_durably(tmpname, self._path)
+        self._reopen()
+
+    def _maybe_compact(self):
+        """Start a compaction in the background once enough records were written"""
+        if self._records < self._compact_after or self._compaction is not None:
+            return
+        self._compaction = asyncio.create_task(self._compact())
+        self._compaction.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, task: asyncio.Task):
+        """Pick up after a background compaction"""
+        self._compaction = None
+        self._carried = []
+        if not task.cancelled() and task.exception() is not None:
+            # The old log still holds everything, so the next delivery tries again
+            logger.opt(exception=task.exception()).error(
+                "Unable to compact the announcement outbox"
+            )
+
+    def claim(self, key: str) -> bool:
+        """Reserve an idempotency key for an announcement
+
+        Args:
+            key (str): Idempotency key sent with the announcement
+
+        Returns:
+            (bool): True if the announcement should be made, False if one with
+                the same key was already made or is being made right now
+
+        """
+        accepted = self._keys.get(key)
+        if key in self._claimed or (
+            accepted is not None and accepted > time() - self._key_ttl
+        ):
+            return False
+        self._claimed.add(key)
+        return True
+
+    def release(self, key: str):
+        """Give up a key whose announcement failed, so it can be retried"""
+        self._claimed.discard(key)
+
+    def put(self, messages: Iterable[Tuple[str, str]], key: Optional[str] = None):
+        """Queue messages for delivery
+
+        Args:
+            messages (iterable): Pairs of the channel or user a message is for,
+                and the message
+            key (str): Idempotency key of the announcement, remembered in the
+                same write that puts the messages on disk
+
+        """
+        messages = [
+            {"target": target, "message": message} for target, message in messages
+        ]
+        record = {"op": "put", "messages": messages}
+        if key is not None:
+            record.update(key=key, at=time())
+            self._keys[key] = record["at"]
+            self._claimed.discard(key)
+        self._pending.extend(messages)
+        self._write(record)
+        if self._idle is not None:
+            self._idle.clear()
+        self.wake()
+
+    def wake(self):
+        """Have the worker try delivering right away, e.g. after a reconnect"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, client: HalpyBOT):
+        """Start delivering queued messages, if that hasn't happened yet
+
+        Args:
+            client (HalpyBOT): The bot the messages are sent with
+
+        """
+        if self._task is not None and not self._task.done():
+            self.wake()
+            return
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._task = asyncio.create_task(self._deliver(client))
+
+    def stop(self):
+        """Stop delivering, leaving whatever is still queued for the next start"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def close(self):
+        """Stop delivering, and flush the log to disk and close it"""
+        self.stop()
+        if self._file is None or self._file.closed:
+            return
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+        self._sync()
+        self._file.close()
+
+    async def _deliver(self, client: HalpyBOT):
+        """Deliver queued messages in order, for as long as the bot runs"""
+        delay = self._retry_interval
+        while True:
+            if not self._pending:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._idle.clear()
+            if client.connected:
+                message = self._pending[0]
+                # noinspection PyBroadException
+                # Whatever went wrong, the message stays queued for the next try
+                try:
+                    await client.message(message["target"], message["message"])
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Unable to deliver announcement, retrying")
+                else:
+                    self._pending.popleft()
+                    self._write({"op": "sent"})
+                    self._maybe_compact()
+                    delay = self._retry_interval
+                    continue
+            # Wait for the connection to come back, or for a reconnect to wake us
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self._max_retry_interval)
+
+    async def drain(self):
+        """Wait until every queued message has been delivered and compacted away"""
+        if self._idle is not None:
+            while self._pending:
+                await self._idle.wait()
+        if self._compaction is not None:
+            await asyncio.gather(self._compaction, return_exceptions=True)
@@ -9,5 +9,23 @@ See license.md
 """
 
 from .board import Board
+from .scheduler import DeadlineScheduler
+from .journal import (
+    BoardJournal,
+    case_to_record,
+    case_from_record,
+    event_to_record,
+    event_from_record,
+    replace_durably,
+)
 
-__all__ = ["Board"]
+__all__ = [
+    "Board",
+    "BoardJournal",
+    "DeadlineScheduler",
+    "case_to_record",
+    "replace_durably",
+    "case_from_record",
+    "event_to_record",
+    "event_from_record",
+]
@@ -21,30 +21,160 @@ See license.md
 
 from __future__ import annotations
 
-import enum
+import asyncio
 import typing
 import functools
 import itertools
 from asyncio import Lock
+from types import MappingProxyType
 from attrs import evolve
 from pendulum import now, DateTime
 from ..exceptions import CaseAlreadyExists
-from ..models import Case, Platform, CaseType
+from ..models import Case, CaseEvent, Platform, CaseType, Status, NOTES
+from .journal import BoardJournal, event_to_record
+
+
+_INDEXED = ("status", "platform", "case_type", "welcomed", "seal")
+
+
+def _index_values(case: Case) -> typing.Iterator[typing.Tuple[str, typing.Iterable]]:
+    """Get the values a case is indexed under, per indexed attribute"""
+    yield "status", (case.status,)
+    yield "platform", (case.platform,)
+    yield "case_type", (case.case_type,)
+    yield "welcomed", (case.welcomed,)
+    yield "seal", {
+        seal.name.casefold()
+        for seal in itertools.chain(case.dispatchers, case.responders)
+    }
+
+
+def _frozen(value: typing.Any) -> typing.Any:
+    """Copy lists that end up in the case history, as they may be changed in place"""
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+Watcher = typing.Callable[
+    [str, Case, typing.Optional[typing.List[CaseEvent]]], typing.Any
+]
+
+
+class CaseLock:
+    """Lock serializing the changes to a single case
+
+    The task holding the lock can take it again, so a command can hold it over
+    a read-modify-write while the board methods it calls take it as well.
+
+    """
+
+    __slots__ = ("_lock", "_owner", "_depth", "_waiting")
+
+    def __init__(self):
+        self._lock = Lock()
+        self._owner: typing.Optional[asyncio.Task] = None
+        self._depth = 0
+        self._waiting = 0
+
+    def locked(self) -> bool:
+        """Whether a task is holding the lock"""
+        return self._lock.locked()
+
+    def in_use(self) -> bool:
+        """Whether a task is holding or waiting for the lock"""
+        return self._lock.locked() or bool(self._waiting)
+
+    async def __aenter__(self):
+        task = asyncio.current_task()
+        if self._owner is not task:
+            self._waiting += 1
+            try:
+                await self._lock.acquire()
+            finally:
+                self._waiting -= 1
+            self._owner = task
+        self._depth += 1
+
+    async def __aexit__(self, *_):
+        self._depth -= 1
+        if not self._depth:
+            self._owner = None
+            self._lock.release()
 
 
 class Board:
     """
     Internal Case Board - Tracking Cases Cleanly
+
+    The cases are kept in a dict that is copied on every change, so readers
+    get a snapshot of the board that never changes under them, without locking.
+    Changes to a case are serialized by its own lock.
     """
 
-    def __init__(self, id_range):
-        """Initalize the Board"""
+    def __init__(self, id_range, journal: typing.Optional[BoardJournal] = None):
+        """Initalize the Board
+
+        Args:
+            id_range (int): Case IDs are handed out below this number
+            journal (BoardJournal): Log board changes are written to. If given,
+                the board is restored from it.
+
+        """
         self._cases_by_id: typing.Dict[int, Case] = {}
         self._case_alias_name: typing.Dict[str, int] = {}
+        self._case_irc_nick: typing.Dict[str, int] = {}
+        # Board IDs by attribute value, dicts are used as ordered sets
+        self._attribute_index: typing.Dict[
+            str, typing.Dict[typing.Any, typing.Dict[int, None]]
+        ] = {attribute: {} for attribute in _INDEXED}
+        self._indexed_under: typing.Dict[
+            int, typing.List[typing.Tuple[str, typing.Iterable]]
+        ] = {}
         self._next_case_counter = itertools.count(start=1)
         self._last_case_time = None
         self._modlock = Lock()
+        self._case_locks: typing.Dict[int, CaseLock] = {}
         self._id_range: int = id_range
+        self._journal = journal
+        self._watchers: typing.List[Watcher] = []
+        if journal is not None:
+            self._cases_by_id = journal.load()
+            for case in self._cases_by_id.values():
+                self._index_case(case)
+            if self._cases_by_id:
+                self._last_case_time = max(
+                    case.creation_time for case in self._cases_by_id.values()
+                )
+
+    def _record(
+        self,
+        operation: str,
+        case: Case,
+        events: typing.Optional[typing.List[CaseEvent]] = None,
+    ):
+        """Write a change to the journal, if the board has one, and pass it on"""
+        if self._journal is not None:
+            self._journal.record(operation, case, self._cases_by_id, events)
+        for watcher in self._watchers:
+            watcher(operation, case, events)
+
+    def watch(self, watcher: Watcher):
+        """Get told about every change to the board
+
+        Args:
+            watcher (Callable): Called with the board method that changed a
+                case, the case as it is after the change and, for changes to
+                an existing case, the events added to its history
+
+        """
+        self._watchers.append(watcher)
+
+    async def close(self):
+        """Finish writing the journal, if the board has one, and close it"""
+        if self._journal is not None:
+            await self._journal.drain()
+            self._journal.close()
 
     @property
     def _open_rescue_id(self) -> int:
@@ -62,9 +192,30 @@ class Board:
         return next_id
 
     @property
-    def by_id(self) -> typing.Dict[int, Case]:
-        """Returns the cases_by_id dict"""
-        return self._cases_by_id
+    def by_id(self) -> typing.Mapping[int, Case]:
+        """Read-only snapshot of the cases on the board, by board ID"""
+        return MappingProxyType(self._cases_by_id)
+
+    def lock(self, case_id: int) -> CaseLock:
+        """Get the lock serializing the changes to a case
+
+        Args:
+            case_id (int): Board ID of the case
+
+        Returns:
+            (CaseLock): Lock to be held with `async with`
+
+        """
+        lock = self._case_locks.get(case_id)
+        if lock is None:
+            lock = self._case_locks[case_id] = CaseLock()
+        return lock
+
+    def _put_case(self, case: Case):
+        """Publish a new version of a case in a new copy of the board"""
+        cases = dict(self._cases_by_id)
+        cases[case.board_id] = case
+        self._cases_by_id = cases
 
     @property
     def time_last_case(self) -> typing.Optional[DateTime]:
@@ -75,6 +226,98 @@ class Board:
         """Update the last case time index"""
         self._last_case_time = now(tz="utc")
 
+    def _index_case(self, case: Case):
+        """Add a case to the secondary indexes"""
+        self._case_alias_name[case.client_name.casefold()] = case.board_id
+        if case.irc_nick:
+            self._case_irc_nick[case.irc_nick.casefold()] = case.board_id
+        # Lists on a case can be changed in place, so remember what it was indexed under
+        indexed = self._indexed_under[case.board_id] = list(_index_values(case))
+        for attribute, values in indexed:
+            index = self._attribute_index[attribute]
+            for value in values:
+                index.setdefault(value, {})[case.board_id] = None
+
+    def _unindex_case(self, case: Case):
+        """Remove a case from the secondary indexes"""
+        if self._case_alias_name.get(case.client_name.casefold()) == case.board_id:
+            del self._case_alias_name[case.client_name.casefold()]
+        if (
+            case.irc_nick
+            and self._case_irc_nick.get(case.irc_nick.casefold()) == case.board_id
+        ):
+            del self._case_irc_nick[case.irc_nick.casefold()]
+        for attribute, values in self._indexed_under.pop(case.board_id, ()):
+            index = self._attribute_index[attribute]
+            for value in values:
+                board_ids = index.get(value)
+                if board_ids is not None:
+                    board_ids.pop(case.board_id, None)
+                    if not board_ids:
+                        del index[value]
+
+    def query(
+        self,
+        status: typing.Optional[Status] = None,
+        platform: typing.Optional[Platform] = None,
+        case_type: typing.Optional[CaseType] = None,
+        welcomed: typing.Optional[bool] = None,
+        seal: typing.Optional[str] = None,
+    ) -> typing.List[Case]:
+        """Find the cases matching all given attributes
+
+        Only the cases in the smallest matching index are looked at, so a query
+        costs about as much as the number of cases it returns.
+
+        Args:
+            status (Status): Status of the case
+            platform (Platform): Platform of the client
+            case_type (CaseType): Type of the case
+            welcomed (bool): Whether the client has been welcomed
+            seal (str): Name of a Seal dispatching or responding to the case
+
+        Returns:
+            (list): The matching cases, ordered by board ID. Every case on the
+                board if no attributes are given.
+
+        """
+        criteria = {
+            "status": status,
+            "platform": platform,
+            "case_type": case_type,
+            "welcomed": welcomed,
+            "seal": seal.casefold() if seal is not None else None,
+        }
+        matches = [
+            self._attribute_index[attribute].get(value, {})
+            for attribute, value in criteria.items()
+            if value is not None
+        ]
+        if not matches:
+            return [self._cases_by_id[key] for key in sorted(self._cases_by_id)]
+        matches.sort(key=len)
+        smallest, others = matches[0], matches[1:]
+        return [
+            self._cases_by_id[key]
+            for key in sorted(smallest)
+            if all(key in board_ids for board_ids in others)
+        ]
+
+    def find_client(self, nick: str) -> typing.Optional[Case]:
+        """Find the Case belonging to an IRC user, by IRC nickname or Client Name
+
+        Args:
+            nick (str): The IRC nickname being looked up
+
+        Returns:
+            (`Case` or None): The matching Case, None if the user has no Case
+        """
+        nick = nick.casefold()
+        board_id = self._case_irc_nick.get(nick, self._case_alias_name.get(nick))
+        if board_id is None:
+            return None
+        return self._cases_by_id[board_id]
+
     def return_rescue(self, key: typing.Union[str, int]) -> Case:
         """Find a Case given the Client Name or Case ID"""
         if isinstance(key, str):
@@ -107,8 +350,9 @@ class Board:
             if case.client_name.casefold() in self._case_alias_name:
                 raise CaseAlreadyExists("Case with Client Name Already Exists")
 
-            self._cases_by_id[new_id] = case
-            self._case_alias_name[client.casefold()] = new_id
+            self._put_case(case)
+            self._index_case(case)
+            self._record("add_case", case)
             return case
 
     @functools.wraps(evolve)
@@ -117,61 +361,152 @@ class Board:
     ):
         """
         Modify an existing case
-        """
-        # Gather the Case Information
-        case: Case = self.return_rescue(case_id)
-        curr_time = now(tz="UTC")
-        current_case_notes = case.case_notes
 
-        # Prep the new notes
-        if action:
+        Every changed field is added to the case history. If an action is given,
+        the changes are added to the notes as well.
+        """
+        case_id = self.return_rescue(case_id).board_id
+        async with self.lock(case_id):
+            # Gather the Case Information
+            case: Case = self.return_rescue(case_id)
+            curr_time = now(tz="UTC")
+            events = []
             for key, item in kwargs.items():
                 oldkey = getattr(case, key)
-                if getattr(case, key) == item:
+                if action and oldkey == item:
                     raise ValueError(f"{action} is already set to {item}.")
-                # Translate Enums into Human-Notes
-                if isinstance(item, enum.Enum):
-                    item = item.name.replace("_", " ")
-                    oldkey = getattr(case, key).name.replace("_", " ")
-                notes = f"{action} set to {item} from {oldkey} by {sender} at {curr_time.to_time_string()}"
-                current_case_notes.append(notes)
-
-        # Update the Case
-        new_case = evolve(
-            self._cases_by_id[case_id],
-            updated_time=curr_time,
-            case_notes=current_case_notes,
-            **kwargs,
+                events.append(
+                    CaseEvent(
+                        curr_time, sender, key, _frozen(oldkey), _frozen(item), action
+                    )
+                )
+
+            # Update the Case
+            new_case = evolve(
+                case,
+                updated_time=curr_time,
+                history=case.history.extend(events),
+                **kwargs,
+            )
+            self._unindex_case(case)
+            self._put_case(new_case)
+            self._index_case(new_case)
+            self._record("mod_case", new_case, events)
+
+    async def _note_event(
+        self,
+        case_id: int,
+        make_event: typing.Callable[[], CaseEvent],
+    ):
+        """Add a change to the notes of a case to its history"""
+        async with self.lock(case_id):
+            case: Case = self.return_rescue(case_id)
+            event = make_event()
+            new_case = evolve(case, history=case.history.extend([event]))
+            self._put_case(new_case)
+            self._record("mod_case", new_case, [event])
+
+    def _note_event_at(
+        self, case_id: int, sender: str, index: int, note: typing.Optional[str]
+    ) -> CaseEvent:
+        """Make the event that changes a note, holding its position and old text
+
+        Raises:
+            IndexError: The case has no note at that index
+
+        """
+        notes = self.return_rescue(case_id).case_notes
+        index = range(len(notes))[index]
+        return CaseEvent(
+            now(tz="UTC"), sender, NOTES, old=notes[index], new=note, index=index
+        )
+
+    async def add_note(self, case_id: int, sender: str, note: str):
+        """Add a line to the notes of a case
+
+        Args:
+            case_id (int): Board ID of the case
+            sender (str): User adding the note
+            note (str): The new note
+
+        """
+        await self._note_event(
+            case_id, lambda: CaseEvent(now(tz="UTC"), sender, NOTES, new=note)
+        )
+
+    async def edit_note(self, case_id: int, sender: str, index: int, note: str):
+        """Replace a line of the notes of a case
+
+        Args:
+            case_id (int): Board ID of the case
+            sender (str): User editing the note
+            index (int): Index of the note, starting at 0
+            note (str): The new note
+
+        """
+        await self._note_event(
+            case_id, lambda: self._note_event_at(case_id, sender, index, note)
+        )
+
+    async def delete_note(self, case_id: int, sender: str, index: int):
+        """Remove a line from the notes of a case
+
+        Args:
+            case_id (int): Board ID of the case
+            sender (str): User removing the note
+            index (int): Index of the note, starting at 0
+
+        Raises:
+            IndexError: The case has no note at that index
+
+        """
+        await self._note_event(
+            case_id, lambda: self._note_event_at(case_id, sender, index, None)
         )
-        self._cases_by_id[case_id] = new_case
+
+    def timeline(self, case_id: int) -> typing.List[typing.Dict[str, typing.Any]]:
+        """Export the history of a case
+
+        Args:
+            case_id (int): Board ID of the case
+
+        Returns:
+            (list): Every change to the case as a JSON-compatible dict, oldest first
+
+        """
+        return [event_to_record(event) for event in self.return_rescue(case_id).history]
 
     async def del_case(self, case: Case):
         """Delete a Case from the Board"""
         if not isinstance(case, Case):
             raise TypeError
         board_id = case.board_id
-        client = case.client_name
-        async with self._modlock:
-            del self._cases_by_id[board_id]
-            del self._case_alias_name[client.casefold()]
+        async with self.lock(board_id):
+            cases = dict(self._cases_by_id)
+            case = cases.pop(board_id)
+            self._cases_by_id = cases
+            self._unindex_case(case)
+            self._record("del_case", case)
+        # Drop the lock with the case, unless another task still needs it
+        lock = self._case_locks.get(board_id)
+        if lock is not None and not lock.in_use():
+            del self._case_locks[board_id]
 
     async def rename_case(self, new_name: str, case: Case, sender: str):
         """Rename an actively referenced case"""
         # Make Sure we have a Case
         if not isinstance(case, Case):
             raise TypeError
-        # Gather old info
         board_id = case.board_id
-        old_name = case.client_name
-        # Test Old Info
-        if new_name.casefold() in self._case_alias_name:
-            raise CaseAlreadyExists
-        if old_name.casefold() == new_name.casefold():
-            raise AssertionError(f"Case Rename Failed. Names Match: {old_name!r}")
-        # Update and Continue
-        name_kwarg = {"client_name": new_name}
-        action = "Client Name"
-        await self.mod_case(board_id, action, sender, **name_kwarg)
-        async with self._modlock:
-            del self._case_alias_name[old_name.casefold()]
-            self._case_alias_name[new_name.casefold()] = board_id
+        async with self.lock(board_id):
+            # Gather old info, the case may have changed while waiting for the lock
+            old_name = self.return_rescue(board_id).client_name
+            # Test Old Info
+            if old_name.casefold() == new_name.casefold():
+                raise AssertionError(f"Case Rename Failed. Names Match: {old_name!r}")
+            if new_name.casefold() in self._case_alias_name:
+                raise CaseAlreadyExists
+            # Update and Continue
+            name_kwarg = {"client_name": new_name}
+            action = "Client Name"
+            await self.mod_case(board_id, action, sender, **name_kwarg)
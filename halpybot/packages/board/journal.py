@@ -0,0 +1,452 @@
+"""
+journal.py - Write-ahead log of the Case Board
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import tempfile
+from enum import Enum
+from typing import Any, Dict, List, Optional
+import pendulum
+from attrs import asdict, evolve, has
+from loguru import logger
+from ..models import (
+    Case,
+    CaseEvent,
+    CaseHistory,
+    CaseType,
+    KFCoords,
+    KFType,
+    NOTES,
+    Platform,
+    Seal,
+    Status,
+)
+
+_ENUMS = {
+    "platform": Platform,
+    "status": Status,
+    "case_type": CaseType,
+    "kftype": KFType,
+}
+
+
+def _serialize(_, __, value: Any) -> Any:
+    """Turn the values of a Case into JSON-compatible ones"""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, pendulum.DateTime):
+        return value.isoformat()
+    return value
+
+
+def _encode(value: Any) -> Any:
+    """Turn a single case value into a JSON-compatible one"""
+    if has(type(value)):
+        return asdict(value, value_serializer=_serialize)
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return _serialize(None, None, value)
+
+
+def case_to_record(case: Case) -> Dict[str, Any]:
+    """Turn a Case into a JSON-compatible dict
+
+    Args:
+        case (Case): The Case to be stored
+
+    Returns:
+        (dict): The Case, with enums stored by name and times as ISO-8601 strings
+
+    """
+    record = asdict(
+        case,
+        filter=lambda attribute, _: attribute.name not in ("history", "_rendered"),
+        value_serializer=_serialize,
+    )
+    record["history"] = [event_to_record(event) for event in case.history]
+    return record
+
+
+def event_to_record(event: CaseEvent) -> Dict[str, Any]:
+    """Turn a case event into a JSON-compatible dict
+
+    Args:
+        event (CaseEvent): The event to be stored
+
+    Returns:
+        (dict): The event, with its values stored like `case_to_record` does
+
+    """
+    return {
+        "time": event.time.isoformat(),
+        "actor": event.actor,
+        "field": event.field,
+        "old": _encode(event.old),
+        "new": _encode(event.new),
+        "label": event.label,
+        "index": event.index,
+    }
+
+
+def _seal_from_record(record: Optional[Dict[str, Any]]) -> Optional[Seal]:
+    """Rebuild a Seal stored by `case_to_record`"""
+    if record is None:
+        return None
+    cmdrs = record["cmdrs"]
+    if cmdrs is not None:
+        cmdrs = [(name, Platform[platform]) for name, platform in cmdrs]
+    return Seal(**{**record, "cmdrs": cmdrs})
+
+
+def _decode(key: str, value: Any) -> Any:
+    """Rebuild a single case value stored by `case_to_record`"""
+    if value is None or key == NOTES:
+        return value
+    if key in _ENUMS:
+        return _ENUMS[key][value]
+    if key in ("creation_time", "updated_time"):
+        return pendulum.parse(value)
+    if key in ("dispatchers", "responders"):
+        return [_seal_from_record(seal) for seal in value]
+    if key == "closed_to":
+        return _seal_from_record(value)
+    if key == "pcoords":
+        return KFCoords(**value)
+    return value
+
+
+def event_from_record(record: Dict[str, Any]) -> CaseEvent:
+    """Rebuild a case event stored by `event_to_record`
+
+    Args:
+        record (dict): The stored event
+
+    Returns:
+        (CaseEvent): The event, as it was when it was stored
+
+    """
+    field, old, new = record["field"], record["old"], record["new"]
+    index = record.get("index")
+    if field in ("dispatchers", "responders"):
+        old, new = (tuple(_decode(field, value)) for value in (old, new))
+    elif field == NOTES and "index" not in record and isinstance(old, int):
+        # Older records kept the index of a changed note as its old value
+        index, old = old, None
+    else:
+        old, new = _decode(field, old), _decode(field, new)
+    return CaseEvent(
+        pendulum.parse(record["time"]),
+        record["actor"],
+        field,
+        old,
+        new,
+        record["label"],
+        index,
+    )
+
+
+def case_from_record(record: Dict[str, Any]) -> Case:
+    """Rebuild a Case stored by `case_to_record`
+
+    Args:
+        record (dict): The stored Case
+
+    Returns:
+        (Case): The Case, as it was when it was stored
+
+    """
+    record = {key: _decode(key, value) for key, value in record.items()}
+    record["history"] = CaseHistory(
+        event_from_record(event) for event in record.get("history", ())
+    )
+    return Case(**record)
+
+
+def apply_events(case: Case, events: List[CaseEvent]) -> Case:
+    """Replay changes on a Case
+
+    Args:
+        case (Case): The Case before the changes
+        events (list): The changes, oldest first
+
+    Returns:
+        (Case): The Case after the changes
+
+    """
+    changes: Dict[str, Any] = {"history": case.history.extend(events)}
+    for event in events:
+        if event.field != NOTES:
+            new = event.new
+            changes[event.field] = list(new) if isinstance(new, tuple) else new
+            changes["updated_time"] = event.time
+    return evolve(case, **changes)
+
+
+def replace_durably(source: str, target: str):
+    """Move a file that was written and synced into place, and sync the rename"""
+    os.replace(source, target)
+    directory = os.open(os.path.dirname(target) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class BoardJournal:
+    """Append-only log of Case Board mutations, with compacted snapshots
+
+    New cases are written to the log in full, and changes to existing ones as
+    the events added to their history, so replaying the log on top of the last
+    snapshot restores the board. Records
+    are handed to the OS right away, so they survive the process being killed,
+    while fsync calls are batched to keep mutations fast. Once enough records
+    have been written, the board is snapshotted in the background and the log
+    starts over. Every record is numbered, and the snapshot remembers the last
+    record it covers, so records the snapshot already holds are never replayed.
+
+    """
+
+    def __init__(
+        self, path: str, compact_after: int = 500, sync_interval: float = 0.05
+    ):
+        """Create a new journal
+
+        Args:
+            path (str): Path of the log. The snapshot is stored next to it.
+            compact_after (int): Records written before the log is compacted
+            sync_interval (float): Seconds mutations are gathered before an fsync
+
+        """
+        self._path = path
+        self._snapshot_path = f"{path}.snapshot"
+        self._compact_after = compact_after
+        self._sync_interval = sync_interval
+        self._records = 0
+        self._seq = 0
+        self._file = None
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._compaction: Optional[asyncio.Task] = None
+        # Records written while a compaction runs, carried over to the new log
+        self._carried: List[str] = []
+
+    @property
+    def path(self) -> str:
+        """Path of the log"""
+        return self._path
+
+    def load(self) -> Dict[int, Case]:
+        """Restore the board from the last snapshot and the log after it
+
+        A record that was only partially written when the bot went down is
+        ignored, as are changes to cases the snapshot and log don't know of.
+
+        Returns:
+            (dict): Cases by board ID
+
+        """
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        cases: Dict[int, Case] = {}
+        try:
+            with open(self._snapshot_path, encoding="UTF-8") as snapshot:
+                stored = json.load(snapshot)
+            for record in stored["cases"]:
+                case = case_from_record(record)
+                cases[case.board_id] = case
+            self._seq = stored.get("seq", 0)
+        except FileNotFoundError:
+            pass
+        records: List[str] = []
+        try:
+            with open(self._path, encoding="UTF-8") as journal:
+                records = journal.read().splitlines()
+        except FileNotFoundError:
+            pass
+        for line in records:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning("Ignoring incomplete board journal record")
+                break
+            seq = record.get("seq")
+            if seq is not None:
+                if seq <= self._seq:
+                    continue
+                self._seq = seq
+            if record["op"] == "del_case":
+                cases.pop(record["board_id"], None)
+            elif record["op"] == "mod_case":
+                case = cases.get(record["board_id"])
+                if case is None:
+                    logger.warning(
+                        "Ignoring board journal changes to unknown case {board_id}",
+                        board_id=record["board_id"],
+                    )
+                    continue
+                events = [event_from_record(event) for event in record["events"]]
+                cases[record["board_id"]] = apply_events(case, events)
+            else:
+                case = case_from_record(record["case"])
+                cases[case.board_id] = case
+        # Start off with a fresh snapshot, which also drops any incomplete record
+        self._file = open(self._path, "a", encoding="UTF-8")
+        if records:
+            self.compact(cases)
+        return cases
+
+    def record(
+        self,
+        operation: str,
+        case: Case,
+        cases: Dict[int, Case],
+        events: Optional[List[CaseEvent]] = None,
+    ):
+        """Write a board mutation to the log
+
+        Args:
+            operation (str): Board method that changed the Case
+            case (Case): The Case as it is after the mutation
+            cases (dict): The whole board after the mutation, used for compaction.
+                It must not be changed afterwards.
+            events (list): The changes made to an existing Case
+
+        """
+        if self._file is None:
+            raise RuntimeError("Board journal written to before it was loaded")
+        self._seq += 1
+        if operation == "del_case":
+            record = {"op": operation, "board_id": case.board_id}
+        elif events is not None:
+            record = {
+                "op": operation,
+                "board_id": case.board_id,
+                "events": [event_to_record(event) for event in events],
+            }
+        else:
+            record = {"op": operation, "case": case_to_record(case)}
+        record["seq"] = self._seq
+        line = json.dumps(record, default=str) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        self._records += 1
+        if self._compaction is not None:
+            self._carried.append(line)
+        elif self._records >= self._compact_after:
+            self._start_compaction(cases)
+        self._schedule_sync()
+
+    def _schedule_sync(self):
+        """Make sure an fsync of the log follows shortly"""
+        if self._sync_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._sync()
+        self._sync_handle = loop.call_later(self._sync_interval, self._sync)
+
+    def _sync(self):
+        """Flush the log to disk"""
+        self._sync_handle = None
+        if self._file is not None and not self._file.closed:
+            os.fsync(self._file.fileno())
+
+    def _write_snapshot(self, cases: Dict[int, Case], seq: int) -> str:
+        """Write a snapshot of the board next to the current one
+
+        Returns:
+            (str): Path of the new snapshot, synced but not in place yet
+
+        """
+        directory = os.path.dirname(self._snapshot_path) or "."
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, delete=False, encoding="UTF-8"
+        ) as tmpfile:
+            json.dump(
+                {
+                    "seq": seq,
+                    "cases": [case_to_record(case) for case in cases.values()],
+                },
+                tmpfile,
+                default=str,
+            )
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        return tmpfile.name
+
+    def _start_log(self, carried: List[str]):
+        """Put the new snapshot's log in place of the old one"""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        self._file.close()
+        self._file = open(self._path, "w", encoding="UTF-8")
+        self._file.writelines(carried)
+        self._file.flush()
+        self._records = len(carried)
+        if carried:
+            self._schedule_sync()
+
+    def _start_compaction(self, cases: Dict[int, Case]):
+        """Snapshot the board off the event loop, or right away without one"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.compact(cases)
+        self._carried = []
+        self._compaction = loop.create_task(self._compact(cases, self._seq))
+        self._compaction.add_done_callback(self._compaction_done)
+
+    async def _compact(self, cases: Dict[int, Case], seq: int):
+        """Snapshot the board in a worker thread, then start a new log"""
+        tmpname = await asyncio.to_thread(self._write_snapshot, cases, seq)
+        if self._file is None or self._file.closed:
+            os.unlink(tmpname)
+            return
+        replace_durably(tmpname, self._snapshot_path)
+        self._start_log(self._carried)
+
+    def _compaction_done(self, task: asyncio.Task):
+        """Pick up after a background compaction"""
+        self._compaction = None
+        self._carried = []
+        if not task.cancelled() and task.exception() is not None:
+            # The old log still holds everything, so the next record tries again
+            logger.opt(exception=task.exception()).error(
+                "Unable to compact the board journal"
+            )
+
+    async def drain(self):
+        """Wait for a background compaction to finish"""
+        if self._compaction is not None:
+            await asyncio.gather(self._compaction, return_exceptions=True)
+
+    def compact(self, cases: Dict[int, Case]):
+        """Snapshot the board and start a new log
+
+        The snapshot replaces the old one in one go, and the log is only
+        emptied once the snapshot is on disk.
+
+        Args:
+            cases (dict): Cases by board ID
+
+        """
+        replace_durably(self._write_snapshot(cases, self._seq), self._snapshot_path)
+        self._start_log([])
+
+    def close(self):
+        """Flush the log to disk and close it"""
+        if self._file is None or self._file.closed:
+            return
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+        self._sync()
+        self._file.close()
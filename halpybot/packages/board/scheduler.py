@@ -0,0 +1,171 @@
+"""
+scheduler.py - Deadline scheduler for Case Board timers
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+import pendulum
+from loguru import logger
+
+Callback = Callable[[], Awaitable]
+
+
+class _Entry:
+    """A single scheduled deadline"""
+
+    __slots__ = ("when", "seq", "key", "callback", "cancelled")
+
+    def __init__(self, when: float, seq: int, key: Hashable, callback: Callback):
+        self.when = when
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other: _Entry) -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class DeadlineScheduler:
+    """Run callbacks at their deadlines, off a heap of pending timers
+
+    Only the earliest deadline is handed to the event loop, so a timer fires
+    on time without anything polling for it, and the cost of scheduling and
+    firing grows with the number of pending timers rather than with the board.
+    Every timer has a key, and scheduling a key again replaces its deadline.
+    Cancelled timers are only marked as such, and are dropped from the heap
+    when they come up or once they make up most of it.
+
+    """
+
+    def __init__(self):
+        self._heap: List[_Entry] = []
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._counter = itertools.count()
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """Event loop time a timer is due at, or None if it isn't scheduled"""
+        entry = self._entries.get(key)
+        return entry.when if entry is not None else None
+
+    def schedule(self, key: Hashable, when: pendulum.DateTime, callback: Callback):
+        """Run a callback at a given time, replacing the timer under the same key
+
+        Args:
+            key (Hashable): Identifies the timer, for replacing or cancelling it
+            when (pendulum.DateTime): Time the callback is due. Deadlines that
+                have already passed fire right away.
+            callback (Callable): Coroutine function to run
+
+        """
+        loop = asyncio.get_running_loop()
+        delay = (when - pendulum.now(tz="UTC")).total_seconds()
+        self.schedule_in(key, max(delay, 0), callback, loop)
+
+    def schedule_in(
+        self,
+        key: Hashable,
+        delay: float,
+        callback: Callback,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        """Run a callback after a given number of seconds
+
+        Args:
+            key (Hashable): Identifies the timer, for replacing or cancelling it
+            delay (float): Seconds until the callback is due
+            callback (Callable): Coroutine function to run
+            loop (asyncio.AbstractEventLoop): Event loop, the running one if None
+
+        """
+        loop = loop or asyncio.get_running_loop()
+        self.cancel(key)
+        entry = _Entry(loop.time() + delay, next(self._counter), key, callback)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._arm(loop)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel a pending timer
+
+        Args:
+            key (Hashable): Key the timer was scheduled under
+
+        Returns:
+            (bool): True if a timer was cancelled, False if none was pending
+
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+        return True
+
+    def clear(self):
+        """Cancel every pending timer"""
+        for entry in self._heap:
+            entry.cancelled = True
+        self._heap.clear()
+        self._entries.clear()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        """Wake up at the earliest deadline"""
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = loop.call_at(self._heap[0].when, self._fire, loop)
+
+    def _fire(self, loop: asyncio.AbstractEventLoop):
+        """Run every callback that is due, and wait for the next deadline"""
+        self._handle = None
+        now = loop.time()
+        while self._heap and (self._heap[0].cancelled or self._heap[0].when <= now):
+            entry = heapq.heappop(self._heap)
+            if entry.cancelled:
+                continue
+            del self._entries[entry.key]
+            task = loop.create_task(self._run(entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._heap:
+            self._arm(loop)
+
+    @staticmethod
+    async def _run(entry: _Entry):
+        """Run a single callback"""
+        # noinspection PyBroadException
+        # A failing reminder must never take the other timers down with it
+        try:
+            await entry.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Unhandled exception in timer {key}", key=entry.key)
+
+    async def drain(self):
+        """Wait until the callbacks that already fired have finished"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
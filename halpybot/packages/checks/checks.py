@@ -14,7 +14,7 @@ from loguru import logger
 from attrs import define
 from halpybot import config
 from ..models import User
-from ..database import test_database_connection, NoDatabaseConnection
+from ..database import health, DatabaseState
 
 
 @define(frozen=True)
@@ -189,15 +189,12 @@ def needs_database(function):
 
     @functools.wraps(function)
     async def guarded(ctx, args: List[str]):
-        if config.offline_mode.enabled:
-            logger.critical(config.offline_mode.enabled)
+        if not health.available:
+            if health.state is DatabaseState.OFFLINE:
+                return await ctx.reply(
+                    "Cannot comply: Database Error Detected. Bot is in OFFLINE mode."
+                )
             return await ctx.reply("Cannot comply: Bot is in OFFLINE mode.")
-        try:
-            await test_database_connection(ctx.bot.engine)
-        except NoDatabaseConnection:
-            return await ctx.reply(
-                "Cannot comply: Database Error Detected. Entering OFFLINE mode."
-            )
         return await function(ctx, args)
 
     return guarded
@@ -8,6 +8,25 @@ Licensed under the GNU General Public License
 See license.md
 """
 
-from .commandhandler import Commands, CommandGroup, get_help_text
+from .commandhandler import (
+    Commands,
+    CommandGroup,
+    Dispatch,
+    get_help_text,
+    index_help,
+)
+from .executor import CommandExecutor
+from .ratelimit import BucketSet, RateLimiter
+from .trigram import TrigramIndex
 
-__all__ = ["Commands", "CommandGroup", "get_help_text"]
+__all__ = [
+    "Commands",
+    "CommandGroup",
+    "Dispatch",
+    "get_help_text",
+    "index_help",
+    "CommandExecutor",
+    "BucketSet",
+    "RateLimiter",
+    "TrigramIndex",
+]
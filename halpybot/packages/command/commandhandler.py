@@ -9,16 +9,39 @@ See license.md
 """
 
 from __future__ import annotations
-from typing import List, TYPE_CHECKING, Dict, Optional, Tuple, Callable
+import math
+import time
+from types import MappingProxyType
+from typing import List, TYPE_CHECKING, Dict, Optional, Tuple, Callable, Mapping
+from attrs import define
 from loguru import logger
 from halpybot import config
 from ..exceptions import CommandHandlerError, CommandAlreadyExists
+from ..metrics import COMMAND_LATENCY, COMMANDS_THROTTLED
+from .ratelimit import BucketSet, RateLimiter
+from .trigram import TrigramIndex
 from ..models import Context, HelpArguments
 
 if TYPE_CHECKING:
     from ..ircclient import HalpyBOT
 
 
+@define(frozen=True)
+class Dispatch:
+    """A resolved entry of the dispatch table
+
+    `handler` is the command coroutine, or None if the entry points to a command
+    group. In that case, `subcommands` holds the precomputed list of its main
+    subcommand names.
+
+    """
+
+    name: str
+    handler: Optional[Callable]
+    group: Optional[CommandGroup] = None
+    subcommands: str = ""
+
+
 class CommandGroup:
     """Group of commands
 
@@ -27,6 +50,7 @@ class CommandGroup:
     """
 
     _grouplist: List[CommandGroup] = []
+    _groupindex: Dict[str, CommandGroup] = {}
     _root: Optional[CommandGroup] = None
 
     def __init__(self, is_root: bool = False):
@@ -43,6 +67,11 @@ class CommandGroup:
         self._group_name = ""
         self._command_list: Dict[str, Tuple[Callable, bool]] = {}
         self._fact_handler = None
+        self._rate_limiter: Optional[RateLimiter] = None
+        self._dispatch: Optional[Mapping[str, Dispatch]] = None
+        self._name_index: Optional[TrigramIndex] = None
+        # A single "did you mean" reply per user per interval, built on first use
+        self._suggestion_limiter: Optional[BucketSet] = None
         # Don't allow registration of multiple root groups
         if CommandGroup._root and is_root:
             raise CommandHandlerError("Can only have one root group")
@@ -60,6 +89,15 @@ class CommandGroup:
     def facthandler(self, handler):
         self._fact_handler = handler
 
+    @property
+    def ratelimiter(self) -> Optional[RateLimiter]:
+        """Rate limiter applied to invocations, None if unlimited"""
+        return self._rate_limiter
+
+    @ratelimiter.setter
+    def ratelimiter(self, limiter: Optional[RateLimiter]):
+        self._rate_limiter = limiter
+
     @classmethod
     def get_group(cls, name: str):
         """Get a command group by name
@@ -71,10 +109,7 @@ class CommandGroup:
             (`CommandGroup` or None): Command group object if found, else None
 
         """
-        for group in cls._grouplist:
-            if name.casefold() == group.name:
-                return group
-        return None
+        return cls._groupindex.get(name.casefold())
 
     @property
     def command_list(self):
@@ -86,6 +121,64 @@ class CommandGroup:
         """str: name of the command group"""
         return self._group_name
 
+    @property
+    def dispatch(self) -> Mapping[str, Dispatch]:
+        """Read-only dispatch table of this group
+
+        Maps every command name and alias to its resolved entry. For groups
+        attached to this one, "<group> <subcommand>" is resolved as well, so a
+        subcommand can be found without walking the group first.
+        The table is built on first use, and rebuilt after a new command is registered.
+
+        """
+        return self.compile()
+
+    def compile(self) -> Mapping[str, Dispatch]:
+        """Build the dispatch table of this group, unless it is still current
+
+        Returns:
+            (Mapping): Read-only map of command names to dispatch entries
+
+        """
+        if self._dispatch is None:
+            self._dispatch = self._build_dispatch()
+        return self._dispatch
+
+    def _build_dispatch(self) -> Mapping[str, Dispatch]:
+        """Compile the command list of this group into a frozen dispatch table"""
+        mains = {
+            id(function): name
+            for name, (function, main) in self._command_list.items()
+            if main
+        }
+        table: Dict[str, Dispatch] = {}
+        for name, (function, _) in self._command_list.items():
+            if not isinstance(function, CommandGroup):
+                table[name] = Dispatch(mains.get(id(function), name), function)
+                continue
+            table[name] = Dispatch(
+                function.name,
+                None,
+                group=function,
+                subcommands=", ".join(function.get_commands(True)),
+            )
+            for subname, entry in function.dispatch.items():
+                if " " not in subname:
+                    table[f"{name} {subname}"] = Dispatch(
+                        f"{function.name} {entry.name}",
+                        entry.handler,
+                        group=entry.group,
+                        subcommands=entry.subcommands,
+                    )
+        return MappingProxyType(table)
+
+    @classmethod
+    def _invalidate(cls):
+        """Drop all compiled dispatch tables after the registry changed"""
+        for group in cls._grouplist:
+            group._dispatch = None
+            group._name_index = None
+
     async def invoke_from_message(
         self, bot: HalpyBOT, channel: str, sender: str, message: str
     ):
@@ -110,11 +203,12 @@ class CommandGroup:
         args = [arg for arg in parts[1:] if arg]
         in_channel = bot.is_channel(channel)
         ctx = Context(bot, channel, sender, in_channel, " ".join(args[0:]), command)
-        # Determines the language of an eventual fact
-        lang = command.split("-")[1] if "-" in command else "en"
 
         # See if it's a command, and execute
-        if command in bot.commandhandler.command_list:
+        entry = bot.commandhandler.dispatch.get(command)
+        if entry is not None:
+            if not await self._within_rate_limit(ctx, entry.name):
+                return
             return await self.invoke_command(
                 command=command, command_context=ctx, arguments=args
             )
@@ -124,16 +218,80 @@ class CommandGroup:
         if not self._fact_handler:
             return
 
-        fact_name = command.split("-")[0]
-        if fact_name in await self._fact_handler.get_fact_names():
-            # Check for Language
-            if lang not in await self._fact_handler.lang_by_fact(fact_name):
-                lang = "en"
+        fact = self._fact_handler.resolve(command)
+        if fact is not None:
+            if not await self._within_rate_limit(ctx, fact[0]):
+                return
             return await ctx.reply(
-                await self._fact_handler.fact_formatted(
-                    fact=(fact_name, lang), arguments=args
-                )
+                await self._fact_handler.fact_formatted(fact=fact, arguments=args)
+            )
+
+        # Neither, so let's see if it was a typo
+        suggestions = self.suggest(command)
+        if suggestions and self._may_suggest(sender):
+            names = ", ".join(
+                f"{config.irc.command_prefix}{name}" for name in suggestions
+            )
+            await ctx.reply(f"Unknown command. Did you mean: {names}?")
+
+    def suggest(self, command: str, limit: int = 3) -> List[str]:
+        """Find the commands, aliases and facts closest to an unknown command
+
+        Args:
+            command (str): Casefolded command, without prefix
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            (list): Names of the closest commands and facts, best first
+
+        """
+        if self._name_index is None:
+            self._name_index = TrigramIndex(
+                (name, name) for name in self.dispatch if " " not in name
             )
+        scored = self._name_index.similar(command, limit)
+        if self._fact_handler:
+            scored += self._fact_handler.suggest(command.partition("-")[0], limit)
+        scored.sort(key=lambda match: -match[1])
+        return list(dict.fromkeys(name for name, _ in scored))[:limit]
+
+    def _may_suggest(self, sender: str) -> bool:
+        """Take the token for a suggestion to a user, if they have one"""
+        if self._suggestion_limiter is None:
+            self._suggestion_limiter = BucketSet(
+                1, 1 / config.rate_limit.suggestion_interval
+            )
+        bucket = self._suggestion_limiter.get(sender.casefold(), time.monotonic())
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    async def _within_rate_limit(self, ctx: Context, name: str) -> bool:
+        """Take a rate limit token for an invocation, telling the user if there is none
+
+        Args:
+            ctx (Context): Message context object
+            name (str): Main name of the command or fact
+
+        Returns:
+            (bool): True if the invocation may go ahead
+
+        """
+        if self._rate_limiter is None:
+            return True
+        wait = self._rate_limiter.acquire(
+            ctx.sender, ctx.channel if ctx.in_channel else None, name
+        )
+        if not wait:
+            return True
+        COMMANDS_THROTTLED.inc(name)
+        if self._rate_limiter.warn(ctx.sender):
+            await ctx.reply(
+                f"{ctx.sender}: You're sending commands a little too quickly. "
+                f"Please try again in {math.ceil(wait)} seconds."
+            )
+        return False
 
     def add_group(self, *names):
         """Attach group to root
@@ -152,10 +310,11 @@ class CommandGroup:
         """
         if self._is_root:
             raise CommandHandlerError("Can not add root group to any other group")
-        for name in names:
-            CommandGroup._root._register(name, self, bool(name == names[0]))
         # Set main name
         self._group_name = names[0]
+        CommandGroup._groupindex[self._group_name] = self
+        for name in names:
+            CommandGroup._root._register(name, self, bool(name == names[0]))
 
     def command(self, *names):
         """An IRC command
@@ -204,6 +363,7 @@ class CommandGroup:
         if name in self._command_list:
             raise CommandAlreadyExists
         self._command_list[name] = (function, main)
+        CommandGroup._invalidate()
 
     async def invoke_command(
         self, command: str, command_context: Context, arguments: List[str]
@@ -225,29 +385,38 @@ class CommandGroup:
                 in the command execution itself.
 
         """
-        cmd = self.command_list.get(command.casefold())
-        if cmd is None:
+        command = command.casefold()
+        entry = self.dispatch.get(command)
+        if entry is None:
             raise CommandHandlerError(f"Command not found: {command}")
-        cmd = cmd[0]
-        if isinstance(cmd, CommandGroup):  # Command group
-            subgroup = CommandGroup.get_group(name=cmd.name)
+        if entry.group is not None:  # Command group
             # If no subcommand is provided, send a provisional help response
             if not arguments:
                 return await command_context.reply(
                     f"Subcommands of {config.irc.command_prefix}"
-                    f"{cmd.name}: "
-                    f"{', '.join(sub for sub in subgroup.get_commands(True))}"
+                    f"{entry.name}: {entry.subcommands}"
+                )
+            # Subcommands of attached groups are in our own table
+            subcommand = f"{command} {arguments[0].casefold()}"
+            if subcommand in self.dispatch:
+                return await self.invoke_command(
+                    command=subcommand,
+                    command_context=command_context,
+                    arguments=arguments[1:],
                 )
             # Recursion, yay!
-            await cmd.invoke_command(
+            await entry.group.invoke_command(
                 command=arguments[0],
                 command_context=command_context,
                 arguments=arguments[1:],
             )
         else:
+            start = time.perf_counter()
+            outcome = "ok"
             try:
-                await cmd(command_context, arguments)
+                await entry.handler(command_context, arguments)
             except Exception as cmd_ex:
+                outcome = "error"
                 error_type: dict = {
                     AttributeError: "Walrus",
                     IndexError: "Leopard",
@@ -264,6 +433,10 @@ class CommandGroup:
                 return await command_context.reply(
                     f"Unable to execute command. Error code: {set_error}"
                 )
+            finally:
+                COMMAND_LATENCY.observe(
+                    time.perf_counter() - start, entry.name, outcome
+                )
 
     def get_commands(self, mains: bool = False):
         """Get a list of registered commands in a group
@@ -280,6 +453,56 @@ class CommandGroup:
         return [str(cmd) for cmd, func in self._command_list.items() if func[1]]
 
 
+# The commands file the help index was last built for, and that index. The file
+# itself is held on to, so it is compared by identity and never by a reused id()
+_help_index: List[Tuple[Dict, Mapping[str, str]]] = []
+
+
+def _build_help_index(
+    commandsfile: Dict[str, Dict[str, HelpArguments]]
+) -> Mapping[str, str]:
+    """Precompute the help text of every command name and alias
+
+    The command prefix can be changed at runtime, so it is not part of the
+    stored text. When a name occurs more than once, the first occurrence wins.
+
+    Args:
+        commandsfile (json object): The commandsfile from Context
+
+    Returns:
+        (Mapping): Read-only map of names and aliases to help text
+
+    """
+    index: Dict[str, str] = {}
+    for command_dict in commandsfile.values():
+        for command, details in command_dict.items():
+            command = command.casefold()
+            aliases = details.get("aliases")
+            alias_text = f"\nAliases: {', '.join(aliases)}" if aliases else ""
+            help_text = (
+                f"{command} {details['arguments']} {alias_text}\n{details['use']}"
+            )
+            index.setdefault(command, help_text)
+            for alias in aliases or ():
+                index.setdefault(alias, help_text)
+    return MappingProxyType(index)
+
+
+def index_help(commandsfile: Dict[str, Dict[str, HelpArguments]]) -> Mapping[str, str]:
+    """Get the help index of a commands file, building it if necessary
+
+    Args:
+        commandsfile (json object): The commandsfile from Context
+
+    Returns:
+        (Mapping): Read-only map of names and aliases to help text
+
+    """
+    if not _help_index or _help_index[0][0] is not commandsfile:
+        _help_index[:] = [(commandsfile, _build_help_index(commandsfile))]
+    return _help_index[0][1]
+
+
 def get_help_text(
     commandsfile: Dict[str, Dict[str, HelpArguments]], search_command: str
 ):
@@ -293,22 +516,10 @@ def get_help_text(
     Returns:
         (str or None): Help instructions for a given command, None if unsuccessful.
     """
-    search_command = search_command.casefold()
-    for command_dict in commandsfile.values():
-        for command, details in command_dict.items():
-            command = command.casefold()
-            if command == search_command or (
-                "aliases" in details and search_command in details["aliases"]
-            ):
-                arguments = details["arguments"]
-                aliases = details.get("aliases")
-                aliases = f"\nAliases: {', '.join(aliases)}" if aliases else ""
-                usage = details["use"]
-                return (
-                    f"Use: {config.irc.command_prefix}{command} {arguments} {aliases}\n"
-                    f"{usage}"
-                )
-    return None
+    help_text = index_help(commandsfile).get(search_command.casefold())
+    if help_text is None:
+        return None
+    return f"Use: {config.irc.command_prefix}{help_text}"
 
 
 Commands = CommandGroup(is_root=True)
@@ -0,0 +1,120 @@
+"""
+executor.py - Run commands concurrently, fairly and in order
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Set
+from loguru import logger
+from ..metrics import COMMANDS_DROPPED
+
+Job = Callable[[], Awaitable]
+
+
+class CommandExecutor:
+    """Dispatch command invocations as supervised tasks
+
+    Every user gets their own FIFO queue, which is worked off one invocation
+    at a time, so replies to a user always arrive in the order the commands were
+    sent. Users with pending work take turns in a round-robin, and no more than
+    `max_concurrent` invocations run at the same time.
+
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_pending: int = 5):
+        """Create a new command executor
+
+        Args:
+            max_concurrent (int): Maximum number of invocations running at once
+            max_pending (int): Maximum number of invocations a single user can
+                have waiting in their queue
+
+        """
+        self._max_concurrent = max_concurrent
+        self._max_pending = max_pending
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._ready: Deque[str] = deque()
+        self._active: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of invocations waiting for a free slot"""
+        return self._depth
+
+    @property
+    def running(self) -> int:
+        """Number of invocations currently being executed"""
+        return len(self._active)
+
+    def submit(self, sender: str, job: Job) -> bool:
+        """Queue a command invocation for a user
+
+        Args:
+            sender (str): Nickname of the user who invoked the command
+            job (Callable): Coroutine function executing the invocation
+
+        Returns:
+            (bool): True if the invocation was queued, False if the user already
+                has too many pending invocations and it was dropped
+
+        """
+        key = sender.casefold()
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self._max_pending:
+            logger.warning(
+                "Dropping command from {sender}: {pending} invocations already pending",
+                sender=sender,
+                pending=len(queue),
+            )
+            COMMANDS_DROPPED.inc()
+            return False
+        queue.append(job)
+        self._depth += 1
+        # A user is either running, waiting for their turn, or idle
+        if len(queue) == 1 and key not in self._active:
+            self._ready.append(key)
+        self._dispatch()
+        return True
+
+    def _dispatch(self):
+        """Start queued invocations until all slots are taken"""
+        while self._ready and len(self._active) < self._max_concurrent:
+            key = self._ready.popleft()
+            job = self._queues[key].popleft()
+            self._depth -= 1
+            self._active.add(key)
+            task = asyncio.create_task(self._supervise(key, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _supervise(self, key: str, job: Job):
+        """Run a single invocation and hand the slot to the next user in line"""
+        # noinspection PyBroadException
+        # A failing command must never take the executor down with it
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Unhandled exception in command task")
+        finally:
+            self._active.discard(key)
+            if self._queues[key]:
+                self._ready.append(key)
+            else:
+                del self._queues[key]
+            self._dispatch()
+
+    async def drain(self):
+        """Wait until every queued and running invocation has finished"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
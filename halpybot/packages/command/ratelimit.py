@@ -0,0 +1,171 @@
+"""
+ratelimit.py - Token bucket rate limiting for commands
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class TokenBucket:
+    """Tokens available to a single user, channel or command"""
+
+    __slots__ = ("tokens", "updated", "warned")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+class BucketSet:
+    """Token buckets of one scope, such as all users
+
+    Buckets are kept in order of last use. A bucket that has been idle long
+    enough to be full again is no different from a new one, so those are
+    evicted from the front whenever a bucket is requested.
+
+    """
+
+    def __init__(self, burst: int, rate: float):
+        """Create a new set of token buckets
+
+        Args:
+            burst (int): Maximum number of tokens in a bucket
+            rate (float): Tokens added to a bucket per second
+
+        """
+        self.burst = burst
+        self.rate = rate
+        self._refill = burst / rate
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, key: str, now: float) -> TokenBucket:
+        """Get the up-to-date bucket for a key, creating it if needed
+
+        Args:
+            key (str): User, channel or command the bucket belongs to
+            now (float): Current monotonic time
+
+        Returns:
+            (TokenBucket): Bucket, refilled for the time that has passed
+
+        """
+        self._evict(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            return bucket
+        bucket.tokens = min(
+            self.burst, bucket.tokens + (now - bucket.updated) * self.rate
+        )
+        bucket.updated = now
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def wait_time(self, bucket: TokenBucket) -> float:
+        """Seconds until a bucket has a token available"""
+        return max(0.0, (1 - bucket.tokens) / self.rate)
+
+    def _evict(self, now: float):
+        """Drop buckets that have refilled completely"""
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated < self._refill:
+                break
+            self._buckets.popitem(last=False)
+
+
+class RateLimiter:
+    """Per-user, per-channel and per-command rate limiting
+
+    An invocation takes one token from the bucket of the user, the channel it was
+    sent in, and the command. It is only allowed if all of them have one to spare.
+    Invocations in exempt channels, such as the rescue channels, are never limited.
+
+    """
+
+    def __init__(
+        self,
+        user: BucketSet,
+        channel: BucketSet,
+        command: BucketSet,
+        exempt_channels: Iterable[str] = (),
+    ):
+        """Create a new rate limiter
+
+        Args:
+            user (BucketSet): Buckets per user
+            channel (BucketSet): Buckets per channel
+            command (BucketSet): Buckets per command, shared by all users
+            exempt_channels (iterable): Channels commands are never limited in
+
+        """
+        self._users = user
+        self._channels = channel
+        self._commands = command
+        self._exempt = frozenset(name.casefold() for name in exempt_channels)
+
+    def acquire(
+        self,
+        sender: str,
+        channel: Optional[str],
+        command: str,
+        now: Optional[float] = None,
+    ) -> float:
+        """Try to take a token for a command invocation
+
+        Args:
+            sender (str): User who invoked the command
+            channel (str or None): Channel the command was sent in, None in DMs
+            command (str): Main name of the command or fact
+            now (float): Current monotonic time, defaults to now
+
+        Returns:
+            (float): 0 if the invocation is allowed, else seconds to wait until it is
+
+        """
+        if channel is not None and channel.casefold() in self._exempt:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        scopes = [(self._users, sender.casefold()), (self._commands, command)]
+        if channel is not None:
+            scopes.append((self._channels, channel.casefold()))
+        buckets = [(scope, scope.get(key, now)) for scope, key in scopes]
+        wait = max(scope.wait_time(bucket) for scope, bucket in buckets)
+        if wait:
+            return wait
+        for _, bucket in buckets:
+            bucket.tokens -= 1
+        buckets[0][1].warned = False
+        return 0.0
+
+    def warn(self, sender: str) -> bool:
+        """Check if a throttled user should be told so
+
+        Users are only told once until they are allowed to run a command again,
+        so flooding the bot does not make it flood the channel in return.
+
+        Args:
+            sender (str): The throttled user
+
+        Returns:
+            (bool): True if the user has not been told yet
+
+        """
+        bucket = self._users.get(sender.casefold(), time.monotonic())
+        if bucket.warned:
+            return False
+        bucket.warned = True
+        return True
@@ -0,0 +1,114 @@
+"""
+trigram.py - Fuzzy matching of names and text with a trigram index
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+def trigrams(text: str) -> Set[str]:
+    """Get the set of trigrams of a text
+
+    Every word is padded, so the start and end of words weigh in as well.
+
+    Args:
+        text (str): Text to be split up
+
+    Returns:
+        (set): All trigrams in the casefolded text
+
+    """
+    grams = set()
+    for word in text.casefold().split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the documents containing them
+
+    Documents are identified by a key, and are only compared with a query
+    through the trigrams they share, so lookups only touch documents that
+    have at least one trigram in common with the query.
+
+    """
+
+    def __init__(self, documents: Iterable[Tuple[Hashable, str]]):
+        """Build a new index
+
+        Args:
+            documents (iterable): (key, text) pairs to be indexed
+
+        """
+        self._sizes: Dict[Hashable, int] = {}
+        self._postings: Dict[str, List[Hashable]] = {}
+        for key, text in documents:
+            grams = trigrams(text)
+            self._sizes[key] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(key)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _shared(self, query: str) -> Tuple[int, Counter]:
+        """Count the trigrams each document shares with a query"""
+        grams = trigrams(query)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        return len(grams), shared
+
+    def similar(
+        self, query: str, limit: int = 3, threshold: float = 0.3
+    ) -> List[Tuple[Hashable, float]]:
+        """Find the documents most similar to a query, such as a misspelled name
+
+        Args:
+            query (str): Text to be matched
+            limit (int): Maximum number of results
+            threshold (float): Minimum Jaccard similarity of a result, 0 to 1
+
+        Returns:
+            (list): (key, similarity) of the best matches, best first
+
+        """
+        size, shared = self._shared(query)
+        scored = []
+        for key, count in shared.items():
+            score = count / (size + self._sizes[key] - count)
+            if score >= threshold:
+                scored.append((-score, str(key), key))
+        return [(key, -score) for score, _, key in sorted(scored)[:limit]]
+
+    def containing(
+        self, query: str, limit: int = 10, threshold: float = 0.8
+    ) -> List[Hashable]:
+        """Find the documents that contain (most of) a query, such as a phrase
+
+        Args:
+            query (str): Text to be searched for
+            limit (int): Maximum number of results
+            threshold (float): Minimum share of the query trigrams found in a result
+
+        Returns:
+            (list): Keys of the best matches, best first
+
+        """
+        size, shared = self._shared(query)
+        if not size:
+            return []
+        scored = [
+            (-count / size, str(key), key)
+            for key, count in shared.items()
+            if count / size >= threshold
+        ]
+        return [key for _, _, key in sorted(scored)[:limit]]
@@ -12,8 +12,15 @@ from .connection import (
     NoDatabaseConnection,
     test_database_connection,
 )
+from .query import execute, run_query
+from .health import DatabaseState, DatabaseHealth, health
 
 __all__ = [
     "NoDatabaseConnection",
     "test_database_connection",
+    "execute",
+    "run_query",
+    "DatabaseState",
+    "DatabaseHealth",
+    "health",
 ]
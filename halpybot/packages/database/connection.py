@@ -10,8 +10,9 @@ See license.md
 
 import time
 from loguru import logger
-from sqlalchemy import text, exc, engine
+from sqlalchemy import exc, engine
 from halpybot import config
+from .query import execute
 
 
 class NoDatabaseConnection(ConnectionError):
@@ -22,7 +23,8 @@ class NoDatabaseConnection(ConnectionError):
 
 async def test_database_connection(db_engine: engine.Engine) -> float:
     """
-    Test the database connection. Set offline mode if an error occurs.
+    Test the database connection. Offline mode is set by the database health
+    state if every attempt fails.
     A.K.A. The artist formerly known as "Box of Angry Bees"
     """
     if config.offline_mode.enabled:
@@ -31,12 +33,10 @@ async def test_database_connection(db_engine: engine.Engine) -> float:
     for attempt in range(1, 4):
         logger.info("Attempting DB Connection")
         try:
-            with db_engine.connect() as conn:
-                conn.execute(text("SELECT '1'"))
-                logger.info(f"Succeeded on attempt {attempt}")
-                return time.time()
+            await execute(db_engine, "connection_test", "SELECT '1'")
+            logger.info(f"Succeeded on attempt {attempt}")
+            return time.time()
         except exc.OperationalError:
             pass
-    config.offline_mode.enabled = True
     logger.info(f"Failed on attempt {attempt}")
     raise NoDatabaseConnection
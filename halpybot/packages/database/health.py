@@ -0,0 +1,100 @@
+"""
+health.py - Shared state of the database connection
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import time
+from enum import Enum
+from typing import Optional
+from loguru import logger
+from halpybot import config
+
+
+class DatabaseState(Enum):
+    """Health of the database connection"""
+
+    UNKNOWN = 0
+    ONLINE = 1
+    DEGRADED = 2
+    OFFLINE = 3
+
+
+class DatabaseHealth:
+    """Track the health of the database connection
+
+    Every query reports its result here, as does the background heartbeat.
+    A success brings the state to ONLINE, failures make it DEGRADED, and
+    `failure_threshold` consecutive failures make it OFFLINE and enable offline
+    mode. Offline mode entered this way is disabled again as soon as a query
+    succeeds; offline mode enabled by hand is left alone.
+
+    """
+
+    def __init__(self, failure_threshold: int = 3):
+        """Create a new health tracker
+
+        Args:
+            failure_threshold (int): Consecutive failures before going offline
+
+        """
+        self._failure_threshold = failure_threshold
+        self._state = DatabaseState.UNKNOWN
+        self._failures = 0
+        self._auto_offline = False
+        self._last_success: Optional[float] = None
+
+    @property
+    def state(self) -> DatabaseState:
+        """Current state of the database connection"""
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """True if database commands may be run
+
+        Going OFFLINE enables offline mode, but a cyber can still disable it by
+        hand, so offline mode has the final say.
+
+        """
+        return not config.offline_mode.enabled
+
+    @property
+    def last_success(self) -> Optional[float]:
+        """Time of the last successful query, None if there was none yet"""
+        return self._last_success
+
+    def record_success(self):
+        """Register a successful query"""
+        self._failures = 0
+        self._last_success = time.time()
+        if self._state is DatabaseState.ONLINE:
+            return
+        logger.info("Database connection is {state}", state="ONLINE")
+        self._state = DatabaseState.ONLINE
+        if self._auto_offline:
+            self._auto_offline = False
+            if config.offline_mode.enabled:
+                logger.info("Database connection restored, leaving offline mode")
+                config.offline_mode.enabled = False
+
+    def record_failure(self):
+        """Register a query that failed because of the connection"""
+        self._failures += 1
+        if self._failures < self._failure_threshold:
+            self._state = DatabaseState.DEGRADED
+            return
+        if self._state is not DatabaseState.OFFLINE:
+            logger.warning("Database connection is {state}", state="OFFLINE")
+            self._state = DatabaseState.OFFLINE
+        if not config.offline_mode.enabled:
+            config.offline_mode.enabled = True
+            self._auto_offline = True
+
+
+health = DatabaseHealth()
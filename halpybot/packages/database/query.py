@@ -0,0 +1,103 @@
+"""
+query.py - Run database queries without blocking the event loop
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from sqlalchemy import text, engine, exc, Row
+from halpybot import config
+from ..metrics import DATABASE_LATENCY
+from .health import health
+
+T = TypeVar("T")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the thread pool database calls run in, creating it on first use"""
+    return ThreadPoolExecutor(
+        max_workers=config.database.workers if config.database else 4,
+        thread_name_prefix="database",
+    )
+
+
+async def run_query(
+    db_engine: engine.Engine, name: str, query: Callable[[engine.Connection], T]
+) -> T:
+    """Run a function on a database connection in the database thread pool
+
+    The pool is bounded, so a slow database queues up queries instead of
+    piling up threads. The time from submitting the query to its result is
+    recorded in the database latency histogram under `name`, and the outcome
+    is reported to the shared database health state.
+
+    Args:
+        db_engine (engine.Engine): DBAPI Engine
+        name (str): Name of the query, used as metric label
+        query (Callable): Function receiving an open connection
+
+    Returns:
+        The return value of `query`
+
+    """
+
+    def connect_and_run():
+        with db_engine.connect() as conn:
+            return query(conn)
+
+    loop = asyncio.get_running_loop()
+    try:
+        with DATABASE_LATENCY.time(name):
+            result = await loop.run_in_executor(_get_executor(), connect_and_run)
+    except exc.OperationalError:
+        health.record_failure()
+        raise
+    health.record_success()
+    return result
+
+
+def _execute(
+    statement: str, params: Dict[str, Any], commit: bool, conn: engine.Connection
+) -> List[Row]:
+    """Execute a single statement on a connection"""
+    result = conn.execute(text(statement), params)
+    rows = result.fetchall() if result.returns_rows else []
+    if commit:
+        conn.commit()
+    return rows
+
+
+async def execute(
+    db_engine: engine.Engine,
+    name: str,
+    statement: str,
+    params: Optional[Dict[str, Any]] = None,
+    commit: bool = False,
+) -> List[Row]:
+    """Execute a single SQL statement in the database thread pool
+
+    Args:
+        db_engine (engine.Engine): DBAPI Engine
+        name (str): Name of the query, used as metric label
+        statement (str): SQL statement, with :named parameters
+        params (dict): Values of the statement parameters
+        commit (bool): Commit the transaction after executing the statement
+
+    Returns:
+        (list): All rows returned by the statement, empty if it returns none
+
+    """
+    return await run_query(
+        db_engine,
+        name,
+        functools.partial(_execute, statement, params or {}, commit),
+    )
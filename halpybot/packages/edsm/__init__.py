@@ -11,6 +11,9 @@ See license.md
 from .edsm import (
     GalaxySystem,
     Commander,
+    Bearing,
+    Surroundings,
+    surroundings,
     checkdistance,
     checkdssa,
     checklandmarks,
@@ -23,6 +26,9 @@ from .edsm import (
 __all__ = [
     "GalaxySystem",
     "Commander",
+    "Bearing",
+    "Surroundings",
+    "surroundings",
     "checklandmarks",
     "checkdssa",
     "checkdistance",
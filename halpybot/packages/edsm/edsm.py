@@ -495,18 +495,9 @@ async def checklandmarks(
     # Set default values
     coords = await get_coordinates(system, cache_override)
     if coords:
-        maxdist = config.edsm.maximum_landmark_distance
-        distances = {
-            calc_distance(coords, item.coords): item for item in calculators.landmarks
-        }
-        minimum_key = min(distances)
-        minimum = distances[minimum_key]
-
-        if minimum_key < float(maxdist):
-            direction = await calc_direction(
-                coords.x, minimum.coords.x, coords.z, minimum.coords.z
-            )
-            return minimum.name, f"{minimum_key:,}", direction
+        landmark = await _nearest(coords, calculators.landmarks)
+        if landmark.within(config.edsm.maximum_landmark_distance):
+            return landmark.name, landmark.distance, landmark.direction
         raise NoNearbyEDSM(f"No major landmark systems within 10,000 ly of {system}.")
     raise NoResultsEDSM(
         f"No system and/or commander named {system} was found in the EDSM" f" database."
@@ -539,23 +530,93 @@ async def checkdssa(
     system: str = await sys_cleaner(edsm_sys_name)
     coords = await get_coordinates(system, cache_override)
     if coords:
-        distances = {
-            calc_distance(coords, item.coords): item for item in calculators.carriers
-        }
-
-        minimum_key = min(distances)
-        minimum = distances[minimum_key]
-
-        direction = await calc_direction(
-            coords.x, minimum.coords.x, coords.z, minimum.coords.z
-        )
-        return minimum.name, f"{minimum_key:,}", direction
+        carrier = await _nearest(coords, calculators.carriers)
+        return carrier.name, carrier.distance, carrier.direction
 
     raise NoResultsEDSM(
         f"No system and/or commander named {system} was found in the EDSM" f" database."
     )
 
 
+@define(frozen=True)
+class Bearing:
+    """The nearest of a set of reference systems, as seen from a point"""
+
+    name: str
+    distance_ly: float
+    direction: str
+
+    @property
+    def distance(self) -> str:
+        """Distance to the reference system, formatted as xx,yyy.zz"""
+        return f"{self.distance_ly:,}"
+
+    def within(self, maximum: float) -> bool:
+        """Check if the reference system is closer than a given distance"""
+        return self.distance_ly < float(maximum)
+
+
+@define(frozen=True)
+class Surroundings:
+    """A system, with its nearest landmark, or DSSA carrier if no landmark is near"""
+
+    name: str
+    coords: Coordinates
+    landmark: Bearing
+    carrier: typing.Optional[Bearing] = None
+
+
+async def _nearest(coords: Coordinates, systems: typing.List[GalaxySystem]) -> Bearing:
+    """Find the reference system closest to a point"""
+    distance, nearest = min(
+        ((calc_distance(coords, item.coords), item) for item in systems),
+        key=lambda pair: pair[0],
+    )
+    direction = await calc_direction(
+        coords.x, nearest.coords.x, coords.z, nearest.coords.z
+    )
+    return Bearing(nearest.name, distance, direction)
+
+
+async def surroundings(
+    edsm_sys_name: str, cache_override: bool = False
+) -> typing.Optional[Surroundings]:
+    """Locate a system, and find its nearest landmark or DSSA carrier
+
+    The system is looked up once, and the reference sets are searched with the
+    coordinates that lookup returned. The nearest DSSA carrier is only searched
+    for if no landmark is within `edsm.maximum_landmark_distance`. Unlike
+    `checklandmarks`, commanders are not looked up, so a cold cache costs a
+    single EDSM request.
+
+    Args:
+        edsm_sys_name (str): System name
+        cache_override (bool): Disregard caching rules and get directly from EDSM, if true.
+
+    Returns:
+        (`Surroundings` or None): The system and its nearest reference systems,
+            None if EDSM doesn't know the system
+
+    Raises:
+        EDSMConnectionError: Connection could not be established. Timeout is 10 seconds
+                by default.
+        EDSMReturnError: The DSSA carriers could not be loaded
+
+    """
+    system = await GalaxySystem.get_info(edsm_sys_name, cache_override)
+    if system is None:
+        return None
+    landmark = await _nearest(system.coords, calculators.landmarks)
+    if landmark.within(config.edsm.maximum_landmark_distance):
+        return Surroundings(system.name, system.coords, landmark)
+    try:
+        carriers = calculators.carriers
+    except (OSError, ValueError, ClassValidationError) as err:
+        raise EDSMReturnError("Unable to load the DSSA carriers") from err
+    carrier = await _nearest(system.coords, carriers)
+    return Surroundings(system.name, system.coords, landmark, carrier)
+
+
 @define(frozen=True)
 class Diversion:
     """Format for finding Diversion systems"""
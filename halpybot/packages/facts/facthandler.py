@@ -9,15 +9,35 @@ See license.md
 """
 
 from __future__ import annotations
-from typing import List, Optional, Dict, Tuple
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Dict, Tuple, Set
+import functools
+import gzip
 import json
+import os
 import re
+import tempfile
 from loguru import logger
 from sqlalchemy import text, engine
 from halpybot import config
 from ..exceptions import FactUpdateError, InvalidFactException, FactHandlerError
-from ..database import NoDatabaseConnection, test_database_connection
-from ..command import Commands
+from ..database import (
+    NoDatabaseConnection,
+    test_database_connection,
+    execute,
+    run_query,
+)
+from ..command import Commands, TrigramIndex
+from ..models import collapse_newlines
+
+_DEFAULT_ARGUMENT = re.compile(r"({{(?P<defarg>.+)}})(?P<fact>.+)")
+_FORMATTING = {
+    "<<BOLD>>": "\u0002",
+    "<<ITALICS>>": "\u001D",
+    "<<UNDERLINE>>": "\u001f",
+    " %n% ": "\n",
+}
 
 
 class Fact:
@@ -43,6 +63,7 @@ class Fact:
         self._text = self._parse_fact(fact_text)
         self._raw_text = fact_text
         self._author = author
+        self._render()
 
     @property
     def fact_id(self):
@@ -79,17 +100,6 @@ class Fact:
         """Fact author"""
         return self._author
 
-    @name.setter
-    def name(self, db_engine: engine.Engine, newname: str):
-        self._name = newname
-        self._write(db_engine)
-
-    @text.setter
-    def text(self, db_engine: engine.Engine, newtext: str):
-        self._text = self._parse_fact(newtext)
-        self._raw_text = newtext
-        self._write(db_engine)
-
     def _parse_fact(self, fact_text: str) -> str:
         """Parse a fact
 
@@ -102,23 +112,41 @@ class Fact:
             (str): Parsed fact text
 
         """
-        re_defarg = re.compile(r"({{(?P<defarg>.+)}})(?P<fact>.+)")
-        groups = re_defarg.search(fact_text)
-        if re.match(re_defarg, fact_text):
+        groups = _DEFAULT_ARGUMENT.match(fact_text)
+        if groups:
             self._default_argument = groups.group("defarg")
-        repltable = {
-            "<<BOLD>>": "\u0002",
-            "<<ITALICS>>": "\u001D",
-            "<<UNDERLINE>>": "\u001f",
-            " %n% ": "\n",
-        }
         if self._default_argument:
             fact_text = groups.group("fact")
-        for token, new in repltable.items():
+        for token, new in _FORMATTING.items():
             fact_text = fact_text.replace(token, new)
         return fact_text
 
-    def _write(self, db_engine: engine.Engine):
+    def _render(self):
+        """Prepare the replies to a fact, exactly as they will be sent"""
+        # Text that follows the arguments a user passed along
+        self._addressed = collapse_newlines(self._text).rstrip()
+        # Reply to the fact without arguments, with the default one if there is one
+        self._unaddressed = collapse_newlines(
+            f"{self._default_argument or ''}{self._text}"
+        ).strip()
+
+    def render(self, arguments: List[str]) -> str:
+        """Get the reply to a fact
+
+        If no arguments are supplied, we include the default one
+
+        Args:
+            arguments (list): List of arguments
+
+        Returns:
+            (str): Ready-to-be-sent fact text
+
+        """
+        if arguments:
+            return f"{' '.join(arguments).strip()}: {self._addressed}"
+        return self._unaddressed
+
+    async def _write(self, db_engine: engine.Engine, editor: str):
         """Write changes to a fact to the database
 
         Raises:
@@ -133,20 +161,22 @@ class Fact:
         if self._offline:
             raise FactUpdateError
         try:
-            with db_engine.connect() as database_connection:
-                database_connection.execute(
-                    text(
-                        f"UPDATE {config.facts.table}"
-                        f"SET factName = :fact_name, factLang = :fact_lang, factText = :fact_text, "
-                        f"factEditedBy = :fact_by "
-                        f"WHERE factID = :fact_id"
-                    ),
-                    fact_name=self._name,
-                    fact_lang=self._lang.casefold(),
-                    fact_text=self._raw_text,
-                    fact_author=self._author,
-                    fact_id=self._fact_id,
-                )
+            await execute(
+                db_engine,
+                "update_fact",
+                f"UPDATE {config.facts.table} "
+                f"SET factName = :fact_name, factLang = :fact_lang, factText = :fact_text, "
+                f"factEditedBy = :fact_by, factEdited = CURRENT_TIMESTAMP "
+                f"WHERE factID = :fact_id",
+                {
+                    "fact_name": self._name,
+                    "fact_lang": self._lang.casefold(),
+                    "fact_text": self._raw_text,
+                    "fact_by": editor,
+                    "fact_id": self._fact_id,
+                },
+                commit=True,
+            )
         except NoDatabaseConnection:
             logger.exception("No database connection. Unable to update fact.")
             raise FactUpdateError(
@@ -155,6 +185,70 @@ class Fact:
             ) from NoDatabaseConnection
 
 
+def _fetch_fact_changes(
+    high_water: Optional[Tuple[int, Optional[datetime]]],
+    database_connection: engine.Connection,
+) -> Tuple[List, Optional[Set[int]]]:
+    """Fetch facts changed since a high-water mark, and all current fact IDs
+
+    Without a high-water mark, every fact is fetched and no IDs are returned.
+
+    """
+    query = (
+        f"SELECT factID, factName, factLang, factText, factAuthor, factEdited "
+        f"FROM {config.facts.table}"
+    )
+    if high_water is None:
+        return database_connection.execute(text(query)).fetchall(), None
+    last_id, last_edit = high_water
+    rows = database_connection.execute(
+        text(f"{query} WHERE factID > :last_id OR factEdited >= :last_edit"),
+        {"last_id": last_id, "last_edit": last_edit},
+    ).fetchall()
+    fact_ids = {
+        int(row[0])
+        for row in database_connection.execute(
+            text(f"SELECT factID FROM {config.facts.table}")
+        )
+    }
+    return rows, fact_ids
+
+
+def _write_snapshot(path: str, snapshot: dict):
+    """Replace a snapshot file in one go
+
+    The snapshot is written to a temporary file next to it first, and then
+    renamed over the old one, so a crash never leaves a half-written snapshot.
+
+    """
+    data = json.dumps(snapshot, separators=(",", ":")).encode("UTF-8")
+    if path.endswith(".gz"):
+        data = gzip.compress(data)
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmpfile:
+        try:
+            tmpfile.write(data)
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        except BaseException:
+            tmpfile.close()
+            os.unlink(tmpfile.name)
+            raise
+    os.replace(tmpfile.name, path)
+
+
+def _read_snapshot(path: str) -> Optional[dict]:
+    """Read a snapshot file, None if there is none"""
+    try:
+        with open(path, "rb") as snapshot:
+            data = snapshot.read()
+    except FileNotFoundError:
+        return None
+    if path.endswith(".gz"):
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
 class FactHandler:
     def __init__(self):
         """Create a new fact handler
@@ -165,6 +259,16 @@ class FactHandler:
 
         """
         self._fact_cache: Dict[Tuple[str, str], Fact] = {}
+        # Languages per fact name. Dicts are used as ordered sets,
+        # so languages keep the order they were loaded in
+        self._langs_by_name: Dict[str, Dict[str, None]] = {}
+        # Highest fact ID and edit time seen in the database, None if the
+        # cache was not loaded from the database
+        self._high_water: Optional[Tuple[int, Optional[datetime]]] = None
+        # Search indexes, built on first use after the cache changed
+        self._name_index: Optional[TrigramIndex] = None
+        self._text_index: Optional[TrigramIndex] = None
+        self._reconciler: Optional[asyncio.Task] = None
 
     async def get(self, name: str, lang: str = "en") -> Optional[Fact]:
         """Get a fact object by name
@@ -189,7 +293,8 @@ class FactHandler:
         """Refresh fact cache.
 
         If a database connection is available, we will get the facts from there.
-        Else, we get it from the backup files.
+        Else, we get it from the backup files. Once loaded from the database,
+        later refreshes only fetch the changes.
 
         Args:
             db_engine (engine.Engine): DBAPI Engine
@@ -204,23 +309,148 @@ class FactHandler:
             logger.exception(
                 "Could not fetch facts from DB, backup file loaded and entering OM"
             )
-            if not preserve_current:
+            if not preserve_current and not await self._from_snapshot():
                 await self._from_local()
 
+    async def load_facts(self, db_engine: engine.Engine):
+        """Fill the fact cache on startup
+
+        If the cache is empty and a snapshot of an earlier database load exists,
+        that is loaded right away, and the database is checked for changes in
+        the background. Else, this is the same as `fetch_facts`.
+
+        Args:
+            db_engine (engine.Engine): DBAPI Engine
+
+        """
+        if self._fact_cache or not await self._from_snapshot():
+            return await self.fetch_facts(db_engine)
+        if self._reconciler is None or self._reconciler.done():
+            self._reconciler = asyncio.create_task(
+                self.fetch_facts(db_engine, preserve_current=True)
+            )
+            self._reconciler.add_done_callback(self._reconciled)
+
+    @staticmethod
+    def _reconciled(task: asyncio.Task):
+        """Log a background fact reconciliation that failed"""
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.opt(exception=task.exception()).error(
+            "Unable to reconcile the fact snapshot with the database"
+        )
+
     async def _from_database(self, db_engine: engine.Engine):
-        """Get facts from database and update the cache"""
-        with db_engine.connect() as database_connection:
-            result = database_connection.execute(
-                text(
-                    f"SELECT factID, factName, factLang, factText, factAuthor "
-                    f"FROM {config.facts.table}"
-                )
+        """Get facts from database and update the cache
+
+        The first load fetches every fact. After that, only facts added or edited
+        since the high-water mark are fetched and parsed, along with the list of
+        fact IDs to find deleted facts. The new cache is built on the side and
+        swapped in at once, so lookups never see a partial cache.
+
+        """
+        full = self._high_water is None
+        old_size = len(self._fact_cache)
+        rows, fact_ids = await run_query(
+            db_engine,
+            "fetch_facts",
+            functools.partial(_fetch_fact_changes, self._high_water),
+        )
+        cache: Dict[Tuple[str, str], Fact] = {}
+        keys_by_id: Dict[int, Tuple[str, str]] = {}
+        last_id, last_edit = self._high_water or (0, None)
+        if not full:
+            cache = dict(self._fact_cache)
+            keys_by_id = {
+                fact.fact_id: key
+                for key, fact in cache.items()
+                if fact.fact_id is not None
+            }
+            for fact_id in keys_by_id.keys() - fact_ids:
+                del cache[keys_by_id[fact_id]]
+        changed = False
+        for fact_id, fact_name, fact_lang, fact_text, fact_author, edited in rows:
+            fact_id = int(fact_id)
+            last_id = max(last_id, fact_id)
+            if edited is not None and (last_edit is None or edited > last_edit):
+                last_edit = edited
+            # The last edited fact comes back every time, skip it if nothing changed
+            old_key = keys_by_id.get(fact_id)
+            cached = cache.get(old_key) if old_key is not None else None
+            if (
+                cached is not None
+                and cached.fact_id == fact_id
+                and old_key == (fact_name, fact_lang)
+                and (cached.raw_text, cached.author) == (fact_text, fact_author)
+            ):
+                continue
+            changed = True
+            # The fact may have been renamed
+            if cached is not None and cached.fact_id == fact_id:
+                del cache[old_key]
+            cache[fact_name, fact_lang] = Fact(
+                fact_id, fact_name, fact_lang, fact_text, fact_author
+            )
+        high_water = (last_id, last_edit)
+        if not (full or changed or len(cache) != old_size):
+            self._high_water = high_water
+            return
+        self._swap_cache(cache)
+        self._high_water = high_water
+        await self._to_snapshot()
+
+    async def _to_snapshot(self):
+        """Save the fact cache and high-water mark to the snapshot file"""
+        if not config.facts.snapshot:
+            return
+        last_id, last_edit = self._high_water
+        snapshot = {
+            "high_water": [last_id, str(last_edit) if last_edit else None],
+            "facts": [
+                [fact.fact_id, name, lang, fact.raw_text, fact.author]
+                for (name, lang), fact in self._fact_cache.items()
+            ],
+        }
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, _write_snapshot, config.facts.snapshot, snapshot
             )
-            self._flush_cache()
-            for fact_id, fact_name, fact_lang, fact_text, fact_author in result:
-                self._fact_cache[fact_name, fact_lang] = Fact(
-                    int(fact_id), fact_name, fact_lang, fact_text, fact_author
-                )
+        except OSError:
+            logger.exception("Unable to write the fact snapshot")
+
+    async def _from_snapshot(self) -> bool:
+        """Get facts from the snapshot of the last database load
+
+        The high-water mark is restored as well, so the next database load only
+        fetches what changed since the snapshot was taken.
+
+        Returns:
+            (bool): True if the snapshot was loaded, False if there is none
+
+        """
+        if not config.facts.snapshot:
+            return False
+        try:
+            snapshot = await asyncio.get_running_loop().run_in_executor(
+                None, _read_snapshot, config.facts.snapshot
+            )
+        except (OSError, ValueError):
+            logger.exception("Unable to read the fact snapshot")
+            return False
+        if snapshot is None:
+            return False
+        self._swap_cache(
+            {
+                (name, lang): Fact(fact_id, name, lang, fact_text, author)
+                for fact_id, name, lang, fact_text, author in snapshot["facts"]
+            }
+        )
+        last_id, last_edit = snapshot["high_water"]
+        self._high_water = (
+            last_id,
+            datetime.fromisoformat(last_edit) if last_edit else None,
+        )
+        return True
 
     async def _from_local(self):
         """Get facts from local backup file and update the cache"""
@@ -235,13 +465,100 @@ class FactHandler:
             else:
                 factname = fact
                 lang = "en"
-            self._fact_cache[factname, lang] = Fact(
-                None, factname, lang, backupfile[f"{factname}-{lang}"], "OFFLINE"
+            self._cache_fact(
+                factname,
+                lang,
+                Fact(None, factname, lang, backupfile[f"{factname}-{lang}"], "OFFLINE"),
             )
 
     def _flush_cache(self):
         """Flush the fact cache. Use with care"""
         self._fact_cache.clear()
+        self._langs_by_name.clear()
+        self._high_water = None
+        self._invalidate_indexes()
+
+    def _swap_cache(self, cache: Dict[Tuple[str, str], Fact]):
+        """Replace the fact cache and language index in one go"""
+        langs_by_name: Dict[str, Dict[str, None]] = {}
+        for name, lang in cache:
+            langs_by_name.setdefault(name, {})[lang] = None
+        self._fact_cache, self._langs_by_name = cache, langs_by_name
+        self._invalidate_indexes()
+
+    def _cache_fact(self, name: str, lang: str, fact: Fact):
+        """Add a fact to the cache and the language index"""
+        self._fact_cache[name, lang] = fact
+        self._langs_by_name.setdefault(name, {})[lang] = None
+        self._invalidate_indexes()
+
+    def _uncache_fact(self, name: str, lang: str):
+        """Remove a fact from the cache and the language index"""
+        del self._fact_cache[name, lang]
+        langs = self._langs_by_name[name]
+        del langs[lang]
+        if not langs:
+            del self._langs_by_name[name]
+        self._invalidate_indexes()
+
+    def _invalidate_indexes(self):
+        """Drop the search indexes after the cache changed"""
+        self._name_index = None
+        self._text_index = None
+
+    def suggest(self, name: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """Find the fact names closest to a misspelled one
+
+        Args:
+            name (str): Casefolded fact name, without language suffix
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            (list): (name, similarity) of the closest fact names, best first
+
+        """
+        if self._name_index is None:
+            self._name_index = TrigramIndex(
+                (name, name) for name in self._langs_by_name
+            )
+        return self._name_index.similar(name, limit)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """Find the facts whose text contains a query
+
+        Args:
+            query (str): Text to search for
+            limit (int): Maximum number of results
+
+        Returns:
+            (list): Matching facts formatted as (name, lang), best first
+
+        """
+        if self._text_index is None:
+            self._text_index = TrigramIndex(
+                (key, fact.text) for key, fact in self._fact_cache.items()
+            )
+        return self._text_index.containing(query, limit)
+
+    def resolve(self, command: str) -> Optional[Tuple[str, str]]:
+        """Resolve a command to the fact it invokes
+
+        `name` resolves to the English fact, `name-xx` to the fact in that
+        language if it exists, and to the English fact if it does not.
+
+        Args:
+            command (str): Casefolded command, without prefix
+
+        Returns:
+            (tuple or None): Fact formatted as (name, lang), None if no such fact
+
+        """
+        name, _, suffix = command.partition("-")
+        langs = self._langs_by_name.get(name)
+        if langs is None:
+            return None
+        lang = suffix.split("-", 1)[0] if suffix else "en"
+        return name, lang if lang in langs else "en"
 
     async def add_fact(
         self,
@@ -280,20 +597,55 @@ class FactHandler:
             )
         if (name, lang) in self._fact_cache:
             raise InvalidFactException("This fact already exists.")
-        with db_engine.connect() as database_connection:
-            database_connection.execute(
+
+        def insert(database_connection: engine.Connection) -> int:
+            result = database_connection.execute(
                 text(
                     f"INSERT INTO {config.facts.table} "
-                    f"(factName, factLang, factText, factAuthor) "
-                    f"VALUES (:name, :lang, :fact_text, :author);"
+                    f"(factName, factLang, factText, factAuthor, factEdited) "
+                    f"VALUES (:name, :lang, :fact_text, :author, CURRENT_TIMESTAMP);"
                 ),
-                name=name,
-                lang=lang,
-                fact_text=fact_text,
-                author=author,
+                {"name": name, "lang": lang, "fact_text": fact_text, "author": author},
             )
-        # Reset the fact handler
-        await self.fetch_facts(db_engine, preserve_current=True)
+            database_connection.commit()
+            return int(result.lastrowid)
+
+        fact_id = await run_query(db_engine, "add_fact", insert)
+        # Add the new fact to the cache, no need to reload all of them
+        self._cache_fact(name, lang, Fact(fact_id, name, lang, fact_text, author))
+
+    async def edit_fact(
+        self,
+        db_engine: engine.Engine,
+        name: str,
+        lang: str,
+        fact_text: str,
+        editor: str,
+    ):
+        """Change the text of a fact
+
+        The fact is written to the database first, and then replaces the cached
+        one in a single step, so it is never missing from the cache.
+
+        Args:
+            db_engine (engine.Engine): DBAPI Engine
+            name (str): Name of the fact
+            lang (str): Fact language ISO-639-1 code
+            fact_text (str): New text of the fact, including formatting
+            editor (str): User editing the fact
+
+        Raises:
+            InvalidFactException: The fact does not exist
+            FactUpdateError: The fact only exists in local storage, or could not
+                be written to the database
+
+        """
+        fact = self._fact_cache.get((name, lang))
+        if fact is None:
+            raise InvalidFactException("That fact does not exist.")
+        edited = Fact(fact.fact_id, name, lang, fact_text, fact.author)
+        await edited._write(db_engine, editor)
+        self._cache_fact(name, lang, edited)
 
     async def lang_by_fact(self, name: str) -> List[str]:
         """Get a list of languages a fact exists in
@@ -307,11 +659,7 @@ class FactHandler:
             (list): List of all languages a fact exists in.
 
         """
-        langlist = []
-        for fact in self._fact_cache:
-            if fact[0] == name:
-                langlist.append(fact[1])
-        return langlist
+        return list(self._langs_by_name.get(name, ()))
 
     async def get_fact_names(self) -> List[str]:
         """Get a list of unique facts
@@ -323,13 +671,7 @@ class FactHandler:
             (list): a list of all unique facts
 
         """
-        namelist = []
-        for fact in self._fact_cache:
-            if fact[0] in namelist:
-                pass
-            else:
-                namelist.append(fact[0])
-        return namelist
+        return list(self._langs_by_name)
 
     async def delete_fact(self, db_engine: engine.Engine, name: str, lang: str = "en"):
         """Delete a fact
@@ -351,12 +693,14 @@ class FactHandler:
                 "Cannot delete English fact if other languages "
                 "are registered for that fact name."
             )
-        with db_engine.connect() as database_connection:
-            database_connection.execute(
-                text(f"DELETE FROM {config.facts.table} WHERE factID = :fact_id"),
-                fact_id=self._fact_cache[name, lang].fact_id,
-            )
-            del self._fact_cache[name, lang]
+        await execute(
+            db_engine,
+            "delete_fact",
+            f"DELETE FROM {config.facts.table} WHERE factID = :fact_id",
+            {"fact_id": self._fact_cache[name, lang].fact_id},
+            commit=True,
+        )
+        self._uncache_fact(name, lang)
 
     def list(self, lang: Optional[str] = None) -> list[tuple[str, str]] | list[str]:
         """Get a list of facts
@@ -394,20 +738,10 @@ class FactHandler:
             FactHandlerError: Fact was not found
 
         """
-        reqfact: Fact = self._fact_cache[fact]
+        reqfact: Optional[Fact] = self._fact_cache.get(fact)
         # Sanity check
         if not reqfact:
             raise FactHandlerError(
                 "Fact could not be found, even though it should exist"
             )
-
-        # If we have no args but a default one, send it
-        if not arguments and reqfact.default_argument:
-            return str(reqfact.default_argument) + str(reqfact.text)
-
-        # If we have arguments add them
-        if arguments:
-            return str(" ".join(arguments).strip() + ": " + reqfact.text)
-
-        # Else (no args, no default arg)
-        return str(reqfact.text)
+        return reqfact.render(arguments)
@@ -9,6 +9,7 @@ See license.md
 """
 
 import json
+import functools
 import os
 import signal
 from typing import Optional, Dict, Union, List
@@ -21,10 +22,18 @@ from .. import utils
 from .. import notify
 from ..exceptions import NotificationFailure
 from ..announcer import Announcer
-from ..board import Board
+from ..board import Board, BoardJournal
 from ._listsupport import ListHandler
-from ..command import Commands, CommandGroup
+from ..command import (
+    Commands,
+    CommandGroup,
+    CommandExecutor,
+    RateLimiter,
+    BucketSet,
+    index_help,
+)
 from ..facts import FactHandler
+from ..metrics import IRC_SEND_LATENCY, WHOIS_LATENCY
 from ..models import HelpArguments
 from ...halpyconfig import SaslExternal, SaslPlain
 
@@ -38,6 +47,23 @@ class HalpyBOT(pydle.Client, ListHandler):
         self.facts = FactHandler()
         self._commandhandler: Optional[CommandGroup] = Commands
         self._commandhandler.facthandler = self.facts
+        self._commandhandler.ratelimiter = None
+        if config.rate_limit.enabled:
+            limits = config.rate_limit
+            self._commandhandler.ratelimiter = RateLimiter(
+                user=BucketSet(limits.user_burst, limits.user_rate),
+                channel=BucketSet(limits.channel_burst, limits.channel_rate),
+                command=BucketSet(limits.command_burst, limits.command_rate),
+                exempt_channels=(
+                    config.channels.rescue_channels
+                    if limits.exempt_rescue_channels
+                    else ()
+                ),
+            )
+        self._executor = CommandExecutor(
+            max_concurrent=config.command_execution.max_concurrent,
+            max_pending=config.command_execution.max_pending,
+        )
         self._dbconfig = (
             f"{config.database.connection_string}/{config.database.database}"
         )
@@ -50,7 +76,18 @@ class HalpyBOT(pydle.Client, ListHandler):
         self._langcodes: Dict[str, str] = utils.language_codes()
         with open("data/help/commands.json", "r", encoding="UTF-8") as jsonfile:
             self._commandsfile = json.load(jsonfile)
-        self._board: Board = Board(id_range=10)
+        # Compile the dispatch table and help index before the first command arrives
+        self._commandhandler.compile()
+        index_help(self._commandsfile)
+        journal = None
+        if config.board.journal:
+            journal = BoardJournal(
+                config.board.journal,
+                compact_after=config.board.compact_after,
+                sync_interval=config.board.sync_interval,
+            )
+        self._board: Board = Board(id_range=10, journal=journal)
+        self._reminders = utils.CaseReminders(self)
         self._announcer: Announcer = Announcer()
 
     @property
@@ -58,6 +95,11 @@ class HalpyBOT(pydle.Client, ListHandler):
         """Command/fact handler object that messages are passed to"""
         return self._commandhandler
 
+    @property
+    def executor(self) -> CommandExecutor:
+        """Executor running command invocations"""
+        return self._executor
+
     @property
     def engine(self) -> engine.Engine:
         """Database Connection Engine"""
@@ -78,6 +120,11 @@ class HalpyBOT(pydle.Client, ListHandler):
         """Return the Case Board"""
         return self._board
 
+    @property
+    def reminders(self) -> utils.CaseReminders:
+        """Return the reminders of the Case Board"""
+        return self._reminders
+
     @property
     def announcer(self) -> Announcer:
         """Return the Announcer"""
@@ -87,6 +134,29 @@ class HalpyBOT(pydle.Client, ListHandler):
     def commandhandler(self, handler: CommandGroup):
         self._commandhandler = handler
 
+    async def shutdown(
+        self, message: str = "HalpyBOT shutting down.", timeout: float = 10.0
+    ):
+        """Leave IRC, let running commands finish and close the Case Board
+
+        Args:
+            message (str): Quit message, if the bot is still connected
+            timeout (float): Seconds to wait for running commands
+
+        """
+        if self.connected:
+            try:
+                await self.quit(message)
+            except (ConnectionError, OSError):
+                logger.exception("Unable to quit IRC cleanly")
+        try:
+            await asyncio.wait_for(self._executor.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Commands still running at shutdown were abandoned")
+        self._reminders.scheduler.clear()
+        await self._reminders.scheduler.drain()
+        await self._board.close()
+
     # Pydle has a problem where ConnectionResetErrors zombify the bot, and it won't attempt to recover.
     # If this happens, the bot should promptly text a Cyber and then shutdown. Systemctl will attempt to
     # restart the bot from the top.
@@ -118,6 +188,16 @@ class HalpyBOT(pydle.Client, ListHandler):
 
     # End Crash Detection
 
+    async def message(self, target: str, message: str):
+        """Send a message, recording how long it took"""
+        with IRC_SEND_LATENCY.time():
+            return await super().message(target, message)
+
+    async def whois(self, nickname: str):
+        """WHOIS a user, recording how long the reply took"""
+        with WHOIS_LATENCY.time():
+            return await super().whois(nickname)
+
     # Join the Server and Channels and OperLine
     async def on_connect(self):
         """Execute login script
@@ -131,9 +211,11 @@ class HalpyBOT(pydle.Client, ListHandler):
             await self.operserv_login()
         if config.system_monitoring.get_failure_button():
             config.system_monitoring.set_failure_button(False)
-        await self.facts.fetch_facts(self.engine)
+        await self.facts.load_facts(self.engine)
         for channel in config.channels.channel_list:
             await self.join(channel, force=True)
+        # Deliver the announcements that came in while we were away
+        self.announcer.start(self)
         await utils.task_starter(self)
 
     async def on_message(self, target: str, by: str, message: str):
@@ -157,9 +239,18 @@ class HalpyBOT(pydle.Client, ListHandler):
         if message == f"{self.nickname} prefix":
             return await self.message(target, f"Prefix: {config.irc.command_prefix}")
 
-        # Pass message to command handler
-        if self._commandhandler:
-            await self._commandhandler.invoke_from_message(self, target, by, message)
+        # Pass message to command handler, without holding up the messages behind it
+        if self._commandhandler and message.startswith(config.irc.command_prefix):
+            self._executor.submit(
+                by,
+                functools.partial(
+                    self._commandhandler.invoke_from_message,
+                    self,
+                    target,
+                    by,
+                    message,
+                ),
+            )
 
     async def reply(self, channel: str, sender: str, in_channel: bool, message: str):
         """Reply to a message sent by a user
@@ -229,38 +320,49 @@ class HalpyBOT(pydle.Client, ListHandler):
     async def on_join(self, channel: str, user: str):
         """Greet Case Users"""
         await super().on_join(channel, user)
-        for board_id, case in self.board.by_id.items():
-            if user in (case.irc_nick, case.client_name):
-                if case.welcomed:
-                    return await self.message(
-                        channel,
-                        f"Client {user} reconnected. Welcome back! (Case {board_id})",
-                    )
-                return await self.message(
-                    channel,
-                    f"Client {user} connected successfully. Welcome! Please "
-                    f"wait for a dispatcher to respond to your case. "
-                    f"(Case {board_id})",
-                )
+        case = self.board.find_client(user)
+        if case is None:
+            return
+        if case.welcomed:
+            return await self.message(
+                channel,
+                f"Client {user} reconnected. Welcome back! (Case {case.board_id})",
+            )
+        return await self.message(
+            channel,
+            f"Client {user} connected successfully. Welcome! Please "
+            f"wait for a dispatcher to respond to your case. "
+            f"(Case {case.board_id})",
+        )
 
     async def on_part(self, channel: str, user: str, message: Optional[str] = None):
         """Notify of Departing Case Users"""
         await super().on_part(channel, user, message)
-        for board_id, case in self.board.by_id.items():
-            if user in (case.irc_nick, case.client_name):
-                return await self.message(
-                    channel, f"Client {user} left the channel. (Case {board_id})"
-                )
+        case = self.board.find_client(user)
+        if case is not None:
+            return await self.message(
+                channel, f"Client {user} left the channel. (Case {case.board_id})"
+            )
 
     async def on_quit(self, user: str, message=None):
         """Notify of Departing Case Users"""
         await super().on_quit(user, message)
-        for board_id, case in self.board.by_id.items():
-            if user in (case.irc_nick, case.client_name):
-                for channel in config.channels.channel_list:
-                    return await self.message(
-                        channel, f"Client {user} left the server. (Case {board_id})"
-                    )
+        case = self.board.find_client(user)
+        if case is not None:
+            for channel in config.channels.channel_list:
+                return await self.message(
+                    channel, f"Client {user} left the server. (Case {case.board_id})"
+                )
+
+    async def on_nick_change(self, old: str, new: str):
+        """Keep following Case Users when they change their nickname"""
+        await super().on_nick_change(old, new)
+        case = self.board.find_client(old)
+        if case is None or new.casefold() == (case.irc_nick or "").casefold():
+            return
+        await self.board.mod_case(
+            case.board_id, "IRC Name", self.nickname, irc_nick=new
+        )
 
 
 async def crash_notif(
@@ -0,0 +1,41 @@
+"""
+__init__.py - Initilization for the Metrics module
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from .metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    render_metrics,
+    COMMAND_LATENCY,
+    HTTP_LATENCY,
+    DATABASE_LATENCY,
+    WHOIS_LATENCY,
+    IRC_SEND_LATENCY,
+    COMMAND_QUEUE_DEPTH,
+    COMMANDS_RUNNING,
+    COMMANDS_THROTTLED,
+    COMMANDS_DROPPED,
+)
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "render_metrics",
+    "COMMAND_LATENCY",
+    "HTTP_LATENCY",
+    "DATABASE_LATENCY",
+    "WHOIS_LATENCY",
+    "IRC_SEND_LATENCY",
+    "COMMAND_QUEUE_DEPTH",
+    "COMMANDS_RUNNING",
+    "COMMANDS_THROTTLED",
+    "COMMANDS_DROPPED",
+]
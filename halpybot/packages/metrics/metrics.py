@@ -0,0 +1,220 @@
+"""
+metrics.py - Latency histograms and counters for monitoring
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Sequence, Iterator
+
+Labels = Tuple[str, ...]
+
+# Upper bounds of the latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List[Metric] = []
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """A named metric with a fixed set of label names
+
+    Every metric registers itself on creation, and is included in the
+    output of `render_metrics`.
+
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        """Create and register a new metric
+
+        Args:
+            name (str): Metric name, as exposed to Prometheus
+            description (str): Help text of the metric
+            labels (sequence of str): Names of the labels of this metric
+
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def _format_labels(self, values: Labels, extra: str = "") -> str:
+        """Render a set of label values as {name="value",...}"""
+        pairs = [
+            f'{label}="{_escape(str(value))}"'
+            for label, value in zip(self.labels, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return f"{{{','.join(pairs)}}}" if pairs else ""
+
+    def samples(self) -> Iterator[str]:
+        """Sample lines of this metric"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render this metric in the Prometheus text format"""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        """Increase the counter for a set of label values"""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        """Current value of the counter for a set of label values"""
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{self._format_labels(labels)} {value}"
+
+
+class Gauge(Counter):
+    """A value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        """Set the gauge for a set of label values"""
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets
+
+    Only the count of each bucket is stored, so observing a value is a
+    binary search over the bucket bounds regardless of traffic.
+
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (last one is +Inf), then the sum of observations
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        """Record an observation for a set of label values"""
+        counts, total = self._values.setdefault(
+            labels, ([0] * (len(self.buckets) + 1), [0.0])
+        )
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, *labels: str) -> int:
+        """Number of observations for a set of label values"""
+        values = self._values.get(labels)
+        return sum(values[0]) if values else 0
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Time a block, labelling the observation with its outcome
+
+        The outcome is appended to the given labels: "ok" if the block
+        completed, "error" if it raised.
+
+        """
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, *labels, outcome)
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket = self._format_labels(labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(labels)} {total[0]}"
+            yield f"{self.name}_count{self._format_labels(labels)} {cumulative}"
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+COMMAND_LATENCY = Histogram(
+    "halpybot_command_duration_seconds",
+    "Time spent executing a command",
+    ("command", "outcome"),
+)
+HTTP_LATENCY = Histogram(
+    "halpybot_http_request_duration_seconds",
+    "Time spent on outgoing HTTP GET requests",
+    ("host", "outcome"),
+)
+DATABASE_LATENCY = Histogram(
+    "halpybot_database_query_duration_seconds",
+    "Time spent on database queries",
+    ("query", "outcome"),
+)
+WHOIS_LATENCY = Histogram(
+    "halpybot_irc_whois_duration_seconds",
+    "Time spent waiting for IRC WHOIS replies",
+    ("outcome",),
+)
+IRC_SEND_LATENCY = Histogram(
+    "halpybot_irc_send_duration_seconds",
+    "Time spent sending IRC messages",
+    ("outcome",),
+)
+COMMAND_QUEUE_DEPTH = Gauge(
+    "halpybot_command_queue_depth",
+    "Command invocations waiting for a free execution slot",
+)
+COMMANDS_RUNNING = Gauge(
+    "halpybot_commands_running",
+    "Command invocations currently being executed",
+)
+COMMANDS_THROTTLED = Counter(
+    "halpybot_commands_throttled_total",
+    "Command invocations refused by the rate limiter",
+    ("command",),
+)
+COMMANDS_DROPPED = Counter(
+    "halpybot_commands_dropped_total",
+    "Command invocations dropped because a user had too many pending",
+)
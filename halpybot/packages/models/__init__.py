@@ -10,18 +10,32 @@ See license.md
 
 from .edsm_classes import Coordinates, Location, SystemInfo, Point, Points
 from .user import User
-from .context import Context, HelpArguments
-from .case import Case, Platform, KFCoords, Status, CaseType, KFType
+from .context import Context, HelpArguments, collapse_newlines
+from .case import (
+    Case,
+    CaseEvent,
+    CaseHistory,
+    NOTES,
+    Platform,
+    KFCoords,
+    Status,
+    CaseType,
+    KFType,
+)
 from .seal import Seal
 
 __all__ = [
     "Context",
     "HelpArguments",
+    "collapse_newlines",
     "User",
     "Coordinates",
     "Location",
     "SystemInfo",
     "Case",
+    "CaseEvent",
+    "CaseHistory",
+    "NOTES",
     "Platform",
     "KFCoords",
     "Status",
@@ -9,8 +9,19 @@ See license.md
 """
 
 from __future__ import annotations
-from typing import Optional, List, TYPE_CHECKING
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    List,
+    Tuple,
+    TYPE_CHECKING,
+)
 from enum import Enum
+from itertools import islice
 from attrs import define, field
 from pendulum import now, DateTime
 
@@ -64,6 +75,142 @@ class KFType(Enum):
     PICK = 3
 
 
+# Field of the events that change the case notes
+NOTES = "notes"
+
+
+@define(frozen=True)
+class CaseEvent:
+    """A single change to a Case
+
+    Changes to the notes use `NOTES` as field. A new note has no index, an
+    edited one has the index of the note and its previous text as old value,
+    and a deleted one has the index and old value but no new value.
+
+    """
+
+    time: DateTime
+    actor: Optional[str]
+    field: str
+    old: Any = None
+    new: Any = None
+    # Human name of the field. Changes with a label are added to the notes.
+    label: Optional[str] = None
+    # Position of an edited or deleted note
+    index: Optional[int] = None
+
+
+def describe(value: Any) -> Any:
+    """Format a case value the way it is shown in notes"""
+    if isinstance(value, Enum):
+        return value.name.replace("_", " ")
+    return value
+
+
+class CaseHistory:
+    """Append-only log of the changes to a Case
+
+    A history is never changed once a Case holds it. Adding events makes a new
+    version, so every version of a Case keeps seeing the history it was made
+    with. Versions share their events for as long as they don't branch off,
+    and the notes of a case are derived from its history, applying only the
+    events added since they were last read. The notes are shared the same way,
+    and only copied when a note is edited or deleted, or when versions branch.
+
+    """
+
+    __slots__ = ("_events", "_length", "_notes", "_notes_length", "_applied")
+
+    def __init__(self, events: Iterable[CaseEvent] = ()):
+        """Create a new case history
+
+        Args:
+            events (iterable): Events the history starts with, oldest first
+
+        """
+        self._events: List[CaseEvent] = list(events)
+        self._length = len(self._events)
+        self._notes: List[str] = []
+        self._notes_length = 0
+        self._applied = 0
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self) -> Iterator[CaseEvent]:
+        return islice(self._events, self._length)
+
+    def extend(self, events: Iterable[CaseEvent]) -> CaseHistory:
+        """Get a new version of the history, with events added to its end
+
+        Args:
+            events (iterable): Events to add, oldest first
+
+        Returns:
+            (CaseHistory): The new version. This one is left as it is.
+
+        """
+        if self._length == len(self._events):
+            shared = self._events
+        else:
+            # A later version was already made from this one, branch off
+            shared = self._events[: self._length]
+        shared.extend(events)
+        new = CaseHistory.__new__(CaseHistory)
+        new._events = shared
+        new._length = len(shared)
+        new._notes = self._notes
+        new._notes_length = self._notes_length
+        new._applied = self._applied
+        return new
+
+    def _locate(self, event: CaseEvent) -> int:
+        """Find the note an event changes, by its text if its index moved"""
+        notes = self._notes
+        if event.old is None or (
+            event.index < self._notes_length and notes[event.index] == event.old
+        ):
+            return event.index
+        try:
+            return notes.index(event.old, 0, self._notes_length)
+        except ValueError:
+            return event.index
+
+    @property
+    def notes(self) -> Tuple[str, ...]:
+        """Case notes as they are after the last event"""
+        owned = False
+        for event in islice(self._events, self._applied, self._length):
+            if event.field == NOTES and event.index is not None:
+                if not owned:
+                    # Other versions may see these notes, change a copy
+                    self._notes = self._notes[: self._notes_length]
+                    owned = True
+                if event.new is None:
+                    del self._notes[self._locate(event)]
+                    self._notes_length -= 1
+                else:
+                    self._notes[self._locate(event)] = event.new
+                continue
+            if event.field == NOTES:
+                note = event.new
+            elif event.label:
+                note = (
+                    f"{event.label} set to {describe(event.new)} from {describe(event.old)} "
+                    f"by {event.actor} at {event.time.to_time_string()}"
+                )
+            else:
+                continue
+            if len(self._notes) != self._notes_length:
+                # A later version already added notes after ours, branch off
+                self._notes = self._notes[: self._notes_length]
+                owned = True
+            self._notes.append(note)
+            self._notes_length += 1
+        self._applied = self._length
+        return tuple(islice(self._notes, self._notes_length))
+
+
 @define(frozen=True, str=False)
 class Case:
     """The Case Object - Tracking All The Things!"""
@@ -82,7 +229,7 @@ class Case:
     # Filled As Case Continues
     dispatchers: List[Seal] = field(factory=list)
     responders: List[Seal] = field(factory=list)
-    case_notes: list = field(factory=list)
+    history: CaseHistory = field(factory=CaseHistory, eq=False, repr=False)
     closed_to: Optional[Seal] = None
 
     # Da Optionalz
@@ -99,6 +246,28 @@ class Case:
     pcoords: Optional[KFCoords] = None
     kftype: Optional[KFType] = None
 
+    # Rendered listings of this version of the case
+    _rendered: Dict[str, Tuple[int, Any]] = field(
+        factory=dict, init=False, eq=False, repr=False
+    )
+
+    @property
+    def case_notes(self) -> Tuple[str, ...]:
+        """Notes of the case, derived from its history"""
+        return self.history.notes
+
+    def _cached(self, name: str, version: int, render: Callable[[], Any]) -> Any:
+        """Get a rendered part of the case, rendering it again if it is outdated
+
+        Cases are frozen, so a new Case object is a new version of the case. The
+        version passed along covers changes within the Case, such as new notes.
+
+        """
+        cached = self._rendered.get(name)
+        if cached is None or cached[0] != version:
+            cached = self._rendered[name] = (version, render())
+        return cached[1]
+
     def __str__(self) -> str:
         """Format case information in a ready-to-be-sent format
 
@@ -108,17 +277,27 @@ class Case:
         Returns:
             (str): Fully formatted announcement
         """
+        head, middle, tail = self._cached(
+            "listing", len(self.history), self._render_listing
+        )
         updated = now(tz="utc").diff(self.updated_time).in_words()
         created = now(tz="utc").diff(self.creation_time).in_words()
+        return f"{head}{created}{middle}{updated}{tail}"
+
+    def _render_listing(self) -> Tuple[str, str, str]:
+        """Render the case listing, split around its creation and update times"""
         plt = self.platform.name.replace("_", " ")
-        message = (
+        head = (
             f"Here's the self listing for Case ID {self.board_id}:\n "
             f"General Details: \n"
             f"   Client: {self.client_name}\n"
             f"   System: {self.system}\n"
             f"   Platform: {plt}\n"
-            f"   Case Created: {created} ago\n"
-            f"   Case Updated: {updated} ago\n"
+            f"   Case Created: "
+        )
+        middle = " ago\n   Case Updated: "
+        message = (
+            f" ago\n"
             f"   Case Status: {self.status.name}\n"
             f"   Client Welcomed: {'Yes' if self.welcomed else 'No'}\n"
         )
@@ -163,4 +342,24 @@ class Case:
             f"   Responders: {responding_seals if self.responders else 'None Yet!'}\n"
             f"   Notes: \n      {case_notes}"
         )
-        return message
+        return head, middle, message
+
+    def summary(self) -> str:
+        """Format a single line summary of the case, as used in board listings
+
+        Returns:
+            (str): Key details of the case
+        """
+        head, tail = self._cached("summary", 0, self._render_summary)
+        long_ago = now(tz="utc").diff(self.updated_time).in_words()
+        return f"{head}{long_ago}{tail}"
+
+    def _render_summary(self) -> Tuple[str, str]:
+        """Render the case summary, split around its update time"""
+        hskf = "Fisher" if self.case_type == CaseType.FISH else "Seal"
+        plt = self.platform.name.replace("_", " ")
+        return (
+            f"Case {self.board_id}: Client: {self.client_name}, Platform: {plt}, "
+            f"Type: {hskf}, Status: {self.status.name}, Updated: ",
+            " ago.",
+        )
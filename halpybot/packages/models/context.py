@@ -16,6 +16,23 @@ from attrs import define
 if TYPE_CHECKING:
     from ..ircclient import HalpyBOT
 
+_NEWLINES = re.compile(r"\n+")
+
+
+def collapse_newlines(message: str) -> str:
+    """Collapse blank lines in a message, as IRC can't send empty lines
+
+    Args:
+        message (str): The message to be cleaned up
+
+    Returns:
+        (str): The message without consecutive newlines
+
+    """
+    if "\n\n" not in message:
+        return message
+    return _NEWLINES.sub("\n", message)
+
 
 class HelpArguments(TypedDict):
     """Format of the Help command output""" ""
@@ -56,8 +73,7 @@ class Context:
         """
         if not message:
             raise TypeError("Empty message passed to reply")
-        message = re.sub(r"\n+", "\n", message)
-        message = message.strip()
+        message = collapse_newlines(message).strip()
         if message:
             await self.bot.reply(self.channel, self.sender, self.in_channel, message)
 
@@ -74,7 +90,6 @@ class Context:
             await self.bot.reply(
                 self.channel, self.sender, self.in_channel, "Responding in DMs!"
             )
-        message = re.sub(r"\n+", "\n", message)
-        message = message.strip()
+        message = collapse_newlines(message).strip()
         if message:
             await self.bot.reply(self.channel, self.sender, False, message)
@@ -8,6 +8,6 @@ Licensed under the GNU General Public License
 See license.md
 """
 
-from .userinfo import whois
+from .userinfo import whois, whois_many, SealCache, seal_cache
 
-__all__ = ["whois"]
+__all__ = ["whois", "whois_many", "SealCache", "seal_cache"]
@@ -8,30 +8,81 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Tuple
 from sqlalchemy.engine import Engine
-from sqlalchemy import text
+from halpybot import config
 from ..models import Seal, Platform
+from ..database import execute
 
 
-async def whois(engine: Engine, subject: str) -> Seal:
-    """Get a Seal's historical information from the Database.
-
-    Args:
-        engine (Engine): The database connection engine
-        subject (str): The Seal's name being searched
+class SealCache:
+    """Seals looked up recently, kept for a limited time
 
-    Returns:
-        (Seal): The Seal object
+    Seals are stored by their casefolded name, so lookups for the same Seal
+    are shared no matter how the name was typed.
 
     """
-    with engine.connect() as conn:
-        result = conn.execute(
-            text(
-                "CALL spWhoIs(:subject, @sealID, @casecnt, @sealnms, @ircnms, @joined, @dw2, @message)"
-            ),
-            {"subject": subject},
-        )
-        results = result.fetchall()
+
+    def __init__(self, ttl: Optional[float] = None):
+        """Create a new Seal cache
+
+        Args:
+            ttl (float): Seconds a lookup stays valid, defaults to `database.seal_ttl`
+
+        """
+        self._ttl = ttl
+        self._seals: Dict[str, Tuple[float, Seal]] = {}
+        self._next_sweep = 0.0
+
+    def __len__(self):
+        return len(self._seals)
+
+    @property
+    def ttl(self) -> float:
+        """Seconds a lookup stays valid"""
+        return self._ttl if self._ttl is not None else config.database.seal_ttl
+
+    def get(self, name: str) -> Optional[Seal]:
+        """Get a Seal by name, None if it is not cached or has expired"""
+        entry = self._seals.get(name.casefold())
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._seals[name.casefold()]
+            return None
+        return entry[1]
+
+    def put(self, name: str, seal: Seal):
+        """Cache a Seal by the name it was looked up with
+
+        Expired Seals are swept out at most once per TTL, so caching stays cheap.
+
+        """
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            for key in [key for key, entry in self._seals.items() if entry[0] <= now]:
+                del self._seals[key]
+            self._next_sweep = now + self.ttl
+        self._seals[name.casefold()] = (now + self.ttl, seal)
+
+    def clear(self):
+        """Forget all cached Seals"""
+        self._seals.clear()
+
+
+seal_cache = SealCache()
+
+
+async def _fetch_seal(engine: Engine, subject: str) -> Seal:
+    """Get a Seal's historical information from the Database, bypassing the cache"""
+    results = await execute(
+        engine,
+        "whois",
+        "CALL spWhoIs(:subject, @sealID, @casecnt, @sealnms, @ircnms, @joined, @dw2, @message)",
+        {"subject": subject},
+    )
     if not results:
         raise KeyError("No Results Given")
     u_id, u_cases, u_cmdrs, u_aliases, u_regdate, u_dw2 = results[0]
@@ -52,3 +103,65 @@ async def whois(engine: Engine, subject: str) -> Seal:
         irc_aliases=u_aliases,
         case_num=u_cases,
     )
+
+
+async def whois(engine: Engine, subject: str) -> Seal:
+    """Get a Seal's historical information from the Database.
+
+    Seals looked up in the last `database.seal_ttl` seconds are served from the cache.
+
+    Args:
+        engine (Engine): The database connection engine
+        subject (str): The Seal's name being searched
+
+    Returns:
+        (Seal): The Seal object
+
+    """
+    seal = seal_cache.get(subject)
+    if seal is None:
+        seal = await _fetch_seal(engine, subject)
+        seal_cache.put(subject, seal)
+    return seal
+
+
+async def whois_many(
+    engine: Engine, subjects: Iterable[str]
+) -> Dict[str, Optional[Seal]]:
+    """Get the historical information of several Seals at once
+
+    Seals that are not cached are all looked up at the same time, and each name
+    is only looked up once.
+
+    Args:
+        engine (Engine): The database connection engine
+        subjects (iterable): The Seals' names being searched
+
+    Returns:
+        (dict): Seal object per name, None if no Seal goes by that name
+
+    """
+    subjects = list(dict.fromkeys(subjects))
+    results: Dict[str, Optional[Seal]] = {}
+    lookups: Dict[str, str] = {}
+    for subject in subjects:
+        results[subject] = seal_cache.get(subject)
+        if results[subject] is None:
+            lookups.setdefault(subject.casefold(), subject)
+    fetched = await asyncio.gather(
+        *(_fetch_seal(engine, subject) for subject in lookups.values()),
+        return_exceptions=True,
+    )
+    seals: Dict[str, Optional[Seal]] = {}
+    for (key, subject), seal in zip(lookups.items(), fetched):
+        if isinstance(seal, (KeyError, ValueError)):
+            seal = None
+        elif isinstance(seal, BaseException):
+            raise seal
+        else:
+            seal_cache.put(subject, seal)
+        seals[key] = seal
+    for subject in subjects:
+        if results[subject] is None:
+            results[subject] = seals[subject.casefold()]
+    return results
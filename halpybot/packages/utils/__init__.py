@@ -17,6 +17,7 @@ from .utils import (
     sys_cleaner,
 )
 from .shorten import shorten
+from .reminders import CaseReminders, o2_seconds
 from .spansh import spansh
 from .decorators import (
     sys_exceptions,
@@ -24,6 +25,7 @@ from .decorators import (
     coords_exceptions,
     dist_exceptions,
     gather_case,
+    cache_response,
 )
 
 __all__ = [
@@ -40,4 +42,7 @@ __all__ = [
     "coords_exceptions",
     "dist_exceptions",
     "gather_case",
+    "cache_response",
+    "CaseReminders",
+    "o2_seconds",
 ]
@@ -8,12 +8,17 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
 import functools
-from typing import List
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Callable, Hashable, Dict
+from attrs import evolve
 from loguru import logger
+from halpybot import config
 from halpybot.packages.case import get_case
 from halpybot.packages.command import get_help_text
-from halpybot.packages.models import Case
+from halpybot.packages.models import Case, Context
 from ..exceptions import (
     EDSMReturnError,
     NoResultsEDSM,
@@ -156,3 +161,110 @@ def gather_case(len_args_expected: int):
         return guarded
 
     return decorator
+
+
+# A recorded reply: whether it went to the same place as the invocation, and its text
+Reply = Tuple[bool, str]
+
+
+class _ReplyRecorder:
+    """Stand-in for the bot that records replies instead of sending them"""
+
+    def __init__(self, bot, in_channel: bool):
+        self._bot = bot
+        self._in_channel = in_channel
+        self.replies: List[Reply] = []
+
+    def __getattr__(self, name):
+        return getattr(self._bot, name)
+
+    async def reply(self, channel: str, sender: str, in_channel: bool, message: str):
+        """Record a reply"""
+        self.replies.append((in_channel == self._in_channel, message))
+
+
+def _normalize(argument) -> str:
+    """Normalize a command argument for use in a cache key"""
+    if isinstance(argument, list):
+        argument = " ".join(arg.strip() for arg in argument if arg.strip())
+    return " ".join(str(argument).split()).casefold()
+
+
+def _board_state(ctx: Context) -> Tuple:
+    """The board details that case references in arguments can resolve to"""
+    return tuple(
+        (case.board_id, case.client_name, case.system)
+        for case in ctx.bot.board.by_id.values()
+    )
+
+
+def cache_response(
+    ttl: Optional[int] = None, max_entries: int = 256, board_sensitive: bool = False
+):
+    """Cache the replies of an idempotent lookup command
+
+    Use below `sys_exceptions` or `dist_exceptions`, so the command receives
+    its normalized argument and the cache override flag. Replies are cached by
+    command and normalized argument, and replayed to later invocations until they
+    expire. `--new` skips the cache, but still refreshes it. Identical invocations
+    that arrive while one is being computed wait for it and share its replies.
+    Exceptions are not cached, and are raised in every waiting invocation.
+
+    Args:
+        ttl (int): Seconds a response stays cached, defaults to the EDSM cache time
+        max_entries (int): Maximum number of cached responses for the command
+        board_sensitive (bool): True if arguments can refer to cases on the board,
+            so the response is only reused while those cases are unchanged
+
+    """
+
+    def decorator(function: Callable):
+        cache: OrderedDict[Hashable, Tuple[float, List[Reply]]] = OrderedDict()
+        pending: Dict[Hashable, asyncio.Future] = {}
+
+        async def compute(ctx: Context, key: Hashable, argument, cache_override):
+            """Run the command with a recorder, and cache its replies"""
+            recorder = _ReplyRecorder(ctx.bot, ctx.in_channel)
+            future = asyncio.get_running_loop().create_future()
+            pending[key] = future
+            try:
+                await function(evolve(ctx, bot=recorder), argument, cache_override)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as ex:
+                future.set_exception(ex)
+                # Mark the exception as retrieved, we raise it ourselves
+                future.exception()
+                raise
+            finally:
+                del pending[key]
+            lifetime = config.edsm.time_cached if ttl is None else ttl
+            cache[key] = (time.monotonic() + lifetime, recorder.replies)
+            cache.move_to_end(key)
+            while len(cache) > max_entries:
+                cache.popitem(last=False)
+            future.set_result(recorder.replies)
+            return recorder.replies
+
+        @functools.wraps(function)
+        async def cached(ctx: Context, argument, cache_override: bool):
+            key: Hashable = _normalize(argument)
+            if board_sensitive:
+                key = (key, _board_state(ctx))
+            if key in pending:
+                replies = await asyncio.shield(pending[key])
+            else:
+                entry = cache.get(key)
+                if entry and not cache_override and entry[0] > time.monotonic():
+                    replies = entry[1]
+                else:
+                    replies = await compute(ctx, key, argument, cache_override)
+            for same_place, message in replies:
+                await ctx.bot.reply(
+                    ctx.channel, ctx.sender, ctx.in_channel and same_place, message
+                )
+
+        return cached
+
+    return decorator
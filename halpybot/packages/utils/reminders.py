@@ -0,0 +1,229 @@
+"""
+reminders.py - Per-case reminders for the Case Board
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+from __future__ import annotations
+import re
+import asyncio
+from typing import List, Optional, TYPE_CHECKING
+from pendulum import DateTime, now
+from halpybot import config
+from halpybot.packages.board.scheduler import DeadlineScheduler
+from halpybot.packages.models import Case, CaseEvent, CaseType, Status
+
+if TYPE_CHECKING:
+    from halpybot.packages.ircclient import HalpyBOT
+
+_O2_TIMER = re.compile(r"^(\d{1,3}):(\d{2})$")
+_KINDS = ("welcome", "o2_warning", "o2_expired", "stale")
+
+
+def o2_seconds(o2_timer: Optional[str]) -> Optional[int]:
+    """Get the seconds of oxygen left from an O2 timer
+
+    Args:
+        o2_timer (str): O2 timer as reported by the client, MM:SS
+
+    Returns:
+        (int): Seconds of oxygen left, or None if the timer can't be read
+
+    """
+    match = _O2_TIMER.match((o2_timer or "").strip())
+    if match is None:
+        return None
+    return int(match[1]) * 60 + int(match[2])
+
+
+class CaseReminders:
+    """Deadlines of the cases on the board, kept in step with its changes
+
+    Unwelcomed cases are brought up every `board.welcome_reminder` seconds,
+    the rescue channels are warned when a code black is about to run out of
+    oxygen, and active cases that haven't changed in `board.stale_after` seconds
+    are nudged. Every case gets its own timers, which are moved or cancelled
+    as soon as the case changes, so nothing has to sweep the board.
+
+    """
+
+    def __init__(self, botclient: HalpyBOT):
+        """Create the reminders of a bot
+
+        Args:
+            botclient (HalpyBOT): The bot, whose board is followed
+
+        """
+        self._bot = botclient
+        self._scheduler = DeadlineScheduler()
+        self._started = False
+
+    @property
+    def scheduler(self) -> DeadlineScheduler:
+        """Scheduler holding the pending reminders"""
+        return self._scheduler
+
+    def start(self):
+        """Arm the reminders of the cases already on the board, and follow it"""
+        if self._started:
+            return
+        self._started = True
+        for case in self._bot.board.by_id.values():
+            self.update("add_case", case)
+        self._bot.board.watch(self.update)
+
+    def update(
+        self, operation: str, case: Case, events: Optional[List[CaseEvent]] = None
+    ):
+        """Move the reminders of a case after it changed
+
+        Args:
+            operation (str): Board method that changed the case
+            case (Case): The case as it is after the change
+            events (list): Events added to the history of the case, None for
+                a case that was just added to the board
+
+        """
+        board_id = case.board_id
+        if operation == "del_case" or case.status is not Status.ACTIVE:
+            for kind in _KINDS:
+                self._scheduler.cancel((kind, board_id))
+            return
+        changed = None if events is None else {event.field for event in events}
+        changed_at = None if events is None else events[-1].time
+
+        if case.welcomed:
+            self._scheduler.cancel(("welcome", board_id))
+        elif config.board.welcome_reminder and (
+            changed is None or changed & {"welcomed", "status"}
+        ):
+            self._schedule(
+                "welcome",
+                board_id,
+                (changed_at or case.creation_time).add(
+                    seconds=config.board.welcome_reminder
+                ),
+            )
+
+        if changed is None or changed & {"o2_timer", "case_type", "status"}:
+            self._arm_o2(case)
+
+        # The bot's own notes, such as welcome reminders, don't make a case any less stale
+        touched = (
+            None
+            if events is None
+            else [event for event in events if event.actor != self._bot.nickname]
+        )
+        if config.board.stale_after and (touched is None or touched):
+            self._schedule(
+                "stale",
+                board_id,
+                (touched[-1].time if touched else case.updated_time).add(
+                    seconds=config.board.stale_after
+                ),
+            )
+
+    def _schedule(self, kind: str, board_id: int, when: DateTime):
+        """Schedule a reminder of a case"""
+        callback = getattr(self, f"_{kind}")
+        self._scheduler.schedule((kind, board_id), when, lambda: callback(board_id))
+
+    def _arm_o2(self, case: Case):
+        """Time the O2 warnings of a case from when its O2 timer was reported"""
+        for kind in ("o2_warning", "o2_expired"):
+            self._scheduler.cancel((kind, case.board_id))
+        seconds = o2_seconds(case.o2_timer)
+        if case.case_type not in (CaseType.BLACK, CaseType.BLUE) or seconds is None:
+            return
+        reported = next(
+            (
+                event.time
+                for event in reversed(list(case.history))
+                if event.field == "o2_timer"
+            ),
+            case.creation_time,
+        )
+        expiry = reported.add(seconds=seconds)
+        current = now(tz="UTC")
+        if expiry <= current:
+            return
+        warning = expiry.subtract(seconds=config.board.o2_warning)
+        if warning > current:
+            self._schedule("o2_warning", case.board_id, warning)
+        self._schedule("o2_expired", case.board_id, expiry)
+
+    def _active_case(self, board_id: int) -> Optional[Case]:
+        """The case a reminder is for, if it is still active"""
+        case = self._bot.board.by_id.get(board_id)
+        if case is None or case.status is not Status.ACTIVE:
+            return None
+        return case
+
+    async def _announce(self, channels: List[str], message: str):
+        """Send a reminder to a list of channels"""
+        await asyncio.gather(
+            *[self._bot.message(channel, message) for channel in channels]
+        )
+
+    async def _welcome(self, board_id: int):
+        """Remind the Seals of a case nobody has welcomed yet"""
+        case = self._active_case(board_id)
+        if case is None or case.welcomed:
+            return
+        await self._announce(
+            config.channels.rescue_channels,
+            f"Hey there, {case.irc_nick or case.client_name}! It seems we're a little short on Seals right now.\n"
+            f"Just hold tight and someone should be with you shortly!",
+        )
+        await self._announce(
+            config.channels.channel_list,
+            f"NEWCASE has not been welcomed. Seals, Please respond! Case ID: {board_id}",
+        )
+        self._schedule(
+            "welcome",
+            board_id,
+            now(tz="UTC").add(seconds=config.board.welcome_reminder),
+        )
+        new_notes = f"NEWCASE not welcomed. Reminder sent. - {self._bot.nickname} ({now(tz='UTC').to_time_string()})"
+        await self._bot.board.add_note(board_id, self._bot.nickname, new_notes)
+
+    async def _o2_warning(self, board_id: int):
+        """Warn the Seals a code black is about to run out of oxygen"""
+        case = self._active_case(board_id)
+        if case is None:
+            return
+        await self._announce(
+            config.channels.rescue_channels,
+            f"Attention Seals: {case.client_name}'s O2 runs out in "
+            f"{int(config.board.o2_warning)} seconds! (Case {board_id})",
+        )
+
+    async def _o2_expired(self, board_id: int):
+        """Tell the Seals a code black ran out of oxygen"""
+        case = self._active_case(board_id)
+        if case is None:
+            return
+        await self._announce(
+            config.channels.rescue_channels,
+            f"Attention Seals: {case.client_name}'s reported O2 timer has run out! "
+            f"(Case {board_id})",
+        )
+
+    async def _stale(self, board_id: int):
+        """Nudge the Seals about a case nobody has touched in a while"""
+        case = self._active_case(board_id)
+        if case is None:
+            return
+        minutes = int(config.board.stale_after // 60)
+        await self._announce(
+            config.channels.rescue_channels,
+            f"Case {board_id} ({case.client_name}) hasn't been updated in "
+            f"{minutes} minutes. Is it still active?",
+        )
+        self._schedule(
+            "stale", board_id, now(tz="UTC").add(seconds=config.board.stale_after)
+        )
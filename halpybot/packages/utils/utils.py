@@ -13,16 +13,23 @@ import re
 import json
 import asyncio
 from typing import Dict, Optional, Union, TYPE_CHECKING, Any, List
+from urllib.parse import urlparse
 import aiohttp
 from attr import evolve
 from loguru import logger
-from pendulum import now
 from pydantic import SecretStr
+from sqlalchemy import exc
 from halpybot import DEFAULT_USER_AGENT
 from halpybot.commands.notify import format_notification, notify
 from halpybot.packages.exceptions import NotificationFailure
 from halpybot.packages.command import get_help_text
-from halpybot.packages.database import NoDatabaseConnection, test_database_connection
+from halpybot.packages.database import (
+    NoDatabaseConnection,
+    DatabaseState,
+    execute,
+    health,
+)
+from halpybot.packages.metrics import HTTP_LATENCY
 from halpybot import config
 from halpybot.packages.models import User, Context
 
@@ -84,59 +91,30 @@ async def web_get(
     params: Any additional HTTP parameters to send
     timeout: Time in seconds before the server is deemed to have timed out
     """
-    async with aiohttp.ClientSession(
-        headers={"User-Agent": DEFAULT_USER_AGENT}
-    ) as session:
-        async with await session.get(
-            uri,
-            params=params,
-            timeout=timeout,
-        ) as response:
-            responses = await response.json()
-        return responses
-
-
-async def new_case_check(botclient: HalpyBOT):
-    """
-    Check if a new case has not been welcomed yet.
-    """
-    board = botclient.board.by_id
-    for case in board.values():
-        if case.welcomed:
-            continue
-        await asyncio.gather(
-            *[
-                botclient.message(
-                    channel,
-                    f"Hey there, {case.irc_nick}! It seems we're a little short on Seals right now.\n"
-                    f"Just hold tight and someone should be with you shortly!",
-                )
-                for channel in config.channels.rescue_channels
-            ]
-        )
-        await asyncio.gather(
-            *[
-                botclient.message(
-                    channel,
-                    f"NEWCASE has not been welcomed. Seals, Please respond! Case ID: {case.board_id}",
-                )
-                for channel in config.channels.channel_list
-            ]
-        )
-        new_notes = f"NEWCASE not welcomed. Reminder sent. - {botclient.nickname} ({now(tz='UTC').to_time_string()})"
-        case.case_notes.append(new_notes)
+    with HTTP_LATENCY.time(urlparse(uri).netloc):
+        async with aiohttp.ClientSession(
+            headers={"User-Agent": DEFAULT_USER_AGENT}
+        ) as session:
+            async with await session.get(
+                uri,
+                params=params,
+                timeout=timeout,
+            ) as response:
+                responses = await response.json()
+    return responses
 
 
 async def task_starter(botclient: HalpyBOT):
     """
-    Start the looping background tasks
+    Start the looping background tasks, and the reminders of the Case Board
     """
+    botclient.reminders.start()
     [
         asyncio.create_task(task)
         for task in (
             _five_minute_task(botclient),
             # _ten_minute_task(),
-            _one_hour_task(botclient),
+            _database_heartbeat(botclient),
             # _one_day_task(),
             _one_week_task(botclient),
         )
@@ -160,7 +138,6 @@ async def _five_minute_task(botclient: HalpyBOT):
                     for channel in config.offline_mode.announce_channels
                 ]
             )
-        await new_case_check(botclient)
 
 
 # Reserved for Future Content
@@ -170,16 +147,48 @@ async def _five_minute_task(botclient: HalpyBOT):
 #
 
 
-async def _one_hour_task(botclient: HalpyBOT):
+async def _database_heartbeat(botclient: HalpyBOT):
+    """Probe the database, and announce when it goes offline or comes back"""
+    interval = config.database.heartbeat if config.database else 60
+    last_state = health.state
     while True:
-        await asyncio.sleep(3600)
+        await asyncio.sleep(interval)
+        # noinspection PyBroadException
+        # A failing probe or announcement must never stop the heartbeat
         try:
-            await test_database_connection(botclient.engine)
-        except NoDatabaseConnection:
-            await botclient.message(
-                config.offline_mode.announce_channels,
-                "WARNING: Offline Mode Enabled. DB Ping Failure.",
-            )
+            last_state = await _database_probe(botclient, last_state)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Database heartbeat failed")
+
+
+async def _database_probe(
+    botclient: HalpyBOT, last_state: DatabaseState
+) -> DatabaseState:
+    """Probe the database once, announcing a change from the last state"""
+    try:
+        await execute(botclient.engine, "heartbeat", "SELECT '1'")
+    except exc.OperationalError:
+        pass
+    state = health.state
+    if state is last_state:
+        return state
+    if state is DatabaseState.OFFLINE:
+        message = "WARNING: Offline Mode Enabled. DB Ping Failure."
+    elif last_state is DatabaseState.OFFLINE:
+        message = "Database connection restored."
+        if not config.offline_mode.enabled:
+            message += " Offline Mode Disabled."
+    else:
+        return state
+    await asyncio.gather(
+        *[
+            botclient.message(channel, message)
+            for channel in config.offline_mode.announce_channels
+        ]
+    )
+    return state
 
 
 # Reserved for Future Content
@@ -8,8 +8,9 @@ Licensed under the GNU General Public License
 See license.md
 """
 
-from .server import APIConnector
+from .server import APIConnector, create_app
 from .server_announcer import announce
 from .rank_change import tail
+from .server_metrics import metrics
 
-__all__ = ["APIConnector", "announce", "tail"]
+__all__ = ["APIConnector", "create_app", "announce", "tail", "metrics"]
@@ -11,10 +11,9 @@ See license.md
 
 from aiohttp import web, web_request
 from loguru import logger
-from sqlalchemy import text
-from .server import APIConnector
+from .server import register_routes
 from .auth import authenticate
-from ..packages.database import NoDatabaseConnection
+from ..packages.database import NoDatabaseConnection, execute
 from ..packages.ircclient import HalpyBOT
 
 routes = web.RouteTableDef()
@@ -43,20 +42,19 @@ async def tail(request: web_request.Request):
     subject = request["subject"]
     try:
         vhost = f"{subject}.{rank}.hullseals.space"
-        with botclient.engine.connect() as database_connection:
-            result = database_connection.execute(
-                text(
-                    "SELECT nick FROM ircDB.anope_db_NickAlias WHERE nc = :subject_name;"
-                ),
-                subject_name=subject,
-            )
-            for i in result:
-                logger.info(i)
-                await botclient.rawmsg("hs", "SETALL", i[0], vhost)
-            raise web.HTTPOk
+        result = await execute(
+            botclient.engine,
+            "tail",
+            "SELECT nick FROM ircDB.anope_db_NickAlias WHERE nc = :subject_name;",
+            {"subject_name": subject},
+        )
+        for i in result:
+            logger.info(i)
+            await botclient.rawmsg("hs", "SETALL", i[0], vhost)
+        raise web.HTTPOk
     except NoDatabaseConnection:
         logger.exception("No database connection, unable to TAIL.")
         raise web.HTTPServiceUnavailable from NoDatabaseConnection
 
 
-APIConnector.add_routes(routes)
+register_routes(routes)
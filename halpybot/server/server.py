@@ -9,7 +9,7 @@ See license.md
 
 """
 
-from typing import Type, Union
+from typing import List, Type, Union
 from loguru import logger
 import pendulum
 import git
@@ -121,5 +121,33 @@ async def server_root(request: Request) -> Response:
     return web.json_response(response)
 
 
+# Route tables of every API module, so a fresh server can serve them all
+_route_tables: List[web.RouteTableDef] = []
+
+
+def create_app() -> HalpyServer:
+    """Create a new API server, with the routes of every API module loaded so far
+
+    Returns:
+        (HalpyServer): The server, ready to be handed to an AppRunner
+
+    """
+    app = HalpyServer(middlewares=[compression_middleware])
+    for table in _route_tables:
+        app.add_routes(table)
+    return app
+
+
+def register_routes(table: web.RouteTableDef):
+    """Add the routes of an API module to the bot's API server
+
+    Args:
+        table (web.RouteTableDef): Routes of the module
+
+    """
+    _route_tables.append(table)
+    APIConnector.add_routes(table)
+
+
 APIConnector = HalpyServer(middlewares=[compression_middleware])
-APIConnector.add_routes(routes)
+register_routes(routes)
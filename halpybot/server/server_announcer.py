@@ -13,7 +13,7 @@ from typing import Dict
 from aiohttp import web, web_request
 from ..packages.exceptions import AnnouncementError, KFCoordsError, CaseAlreadyExists
 from ..packages.ircclient import HalpyBOT
-from .server import APIConnector
+from .server import register_routes
 from .auth import authenticate
 
 routes = web.RouteTableDef()
@@ -25,6 +25,10 @@ async def announce(request: web_request.Request):
     """
     Collect and format a new announcer system message from a POST request.
 
+    The announcement is queued for IRC rather than sent while the request waits.
+    A request repeating the Idempotency-Key header of an earlier one is
+    acknowledged without announcing it again.
+
     Args:
         request (class): An object containing the content of the HTTP request.
 
@@ -35,6 +39,7 @@ async def announce(request: web_request.Request):
         HTTPOk or HTTPInternalServerError
     """
     botclient: HalpyBOT = request.app["botclient"]
+    key = request.headers.get("Idempotency-Key")
     if request.body_exists:
         request = await request.json()
     # Parse arguments
@@ -42,7 +47,7 @@ async def announce(request: web_request.Request):
     args: Dict = request["parameters"]
     try:
         await botclient.announcer.announce(
-            announcement=announcement, args=args, client=botclient
+            announcement=announcement, args=args, client=botclient, key=key
         )
         raise web.HTTPOk
     except CaseAlreadyExists:
@@ -53,4 +58,4 @@ async def announce(request: web_request.Request):
         raise web.HTTPInternalServerError from AnnouncementError
 
 
-APIConnector.add_routes(routes)
+register_routes(routes)
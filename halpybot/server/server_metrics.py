@@ -0,0 +1,43 @@
+"""
+server_metrics.py - Expose bot metrics to Prometheus
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+
+"""
+
+from aiohttp import web
+from aiohttp.web import Request, Response
+from .server import register_routes
+from ..packages.ircclient import HalpyBOT
+from ..packages.metrics import (
+    render_metrics,
+    COMMAND_QUEUE_DEPTH,
+    COMMANDS_RUNNING,
+)
+
+routes = web.RouteTableDef()
+
+
+@routes.get("/metrics")
+async def metrics(request: Request) -> Response:
+    """
+    Get latency histograms and counters of the bot
+
+    Args:
+        request (class): An object containing the content of the HTTP request.
+
+    Returns:
+        All metrics in the Prometheus text exposition format
+
+    """
+    botclient: HalpyBOT = request.app["botclient"]
+    COMMAND_QUEUE_DEPTH.set(value=botclient.executor.queue_depth)
+    COMMANDS_RUNNING.set(value=botclient.executor.running)
+    return Response(text=render_metrics(), content_type="text/plain")
+
+
+register_routes(routes)
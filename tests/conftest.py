@@ -18,6 +18,11 @@ if os.getcwd().endswith("tests"):
 from halpybot import commands, config
 from .fixtures.mock_halpy import TestBot
 
+# Tests must not overwrite the fact snapshot, case board or outbox of a local instance
+config.facts.snapshot = None
+config.board.journal = None
+config.announcer.outbox = None
+
 
 @pytest.fixture()
 async def bot_fx() -> TestBot:
@@ -10,11 +10,15 @@ See license.md
 """
 
 from halpybot.packages.models import Platform, Case, CaseType
+from halpybot.packages.board.board import _INDEXED
 
 
 async def mock_empty_board(bot_fx):
     bot_fx.board._cases_by_id = {}
     bot_fx.board._case_alias_name = {}
+    bot_fx.board._case_irc_nick = {}
+    bot_fx.board._attribute_index = {attribute: {} for attribute in _INDEXED}
+    bot_fx.board._indexed_under = {}
 
 
 async def mock_full_board_fx(bot_fx):
@@ -94,3 +98,6 @@ async def mock_full_board_fx(bot_fx):
         "eight": 8,
         "nine": 9,
     }
+    bot_fx.board._case_irc_nick = {}
+    for case in bot_fx.board._cases_by_id.values():
+        bot_fx.board._index_case(case)
@@ -154,6 +154,11 @@ class TestBot(HalpyBOT):
         """Mock the response channel"""
         return channel[0] in "#&+."
 
+    @property
+    def connected(self):
+        """Mock the connection to the server"""
+        return True
+
     async def connect(self, **kwargs):
         """Pydle connect override to prevent the mock accidently connecting to a server"""
         raise RuntimeWarning(
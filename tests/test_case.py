@@ -8,10 +8,21 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
+import json
 import pytest
 
 from halpybot import config
+from halpybot.packages.board import (
+    Board,
+    BoardJournal,
+    DeadlineScheduler,
+    case_to_record,
+)
 from halpybot.packages.command import Commands
+from halpybot.packages.exceptions import CaseAlreadyExists
+from halpybot.packages.models import Platform, CaseType, Seal, KFCoords, KFType
+from halpybot.packages.utils import CaseReminders
 from tests.fixtures.mock_board import mock_full_board_fx
 
 
@@ -49,3 +60,291 @@ async def test_case_list(bot_fx):
             "   Notes: \n      None Yet!"
         )
     )
+
+
+@pytest.mark.asyncio
+async def test_board_client_index():
+    """Test that the client index follows renames, IRC name changes and deletions"""
+    board = Board(id_range=10)
+    case = await board.add_case(
+        client="Some_CMDR",
+        platform=Platform.ODYSSEY,
+        system="Delkar",
+        case_type=CaseType.SEAL,
+    )
+    await board.mod_case(case.board_id, irc_nick="SomeCMDR")
+    assert board.find_client("somecmdr").board_id == case.board_id
+    assert board.find_client("SOME_CMDR").board_id == case.board_id
+    await board.rename_case("Other_CMDR", board.return_rescue(case.board_id), "Rixxan")
+    assert board.find_client("Some_CMDR") is None
+    assert board.find_client("other_cmdr").board_id == case.board_id
+    await board.mod_case(case.board_id, "IRC Name", "Rixxan", irc_nick="OtherCMDR")
+    assert board.find_client("SomeCMDR") is None
+    assert board.find_client("OtherCMDR").board_id == case.board_id
+    await board.del_case(board.return_rescue(case.board_id))
+    assert board.find_client("OtherCMDR") is None
+    assert board.find_client("Other_CMDR") is None
+
+
+@pytest.mark.asyncio
+async def test_board_journal(tmp_path):
+    """Test the board is restored from its journal and snapshots"""
+    path = str(tmp_path / "board.journal")
+    journal = BoardJournal(path, compact_after=4)
+    board = Board(id_range=10, journal=journal)
+    seal = Seal("Rixxan", 1, 3, [("Rixxan", Platform.ODYSSEY)], [], "2019-01-01", True)
+    one = await board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    two = await board.add_case("two", Platform.XBOX, "Sol", CaseType.FISH)
+    three = await board.add_case("three", Platform.XBOX, "Sol", CaseType.SEAL)
+    await board.mod_case(one.board_id, responders=[seal], hull_percent=50)
+    await board.mod_case(
+        two.board_id, pcoords=KFCoords(1.5, -2), kftype=KFType.PUCK, planet="A 1"
+    )
+    await board.rename_case("Three_CMDR", board.return_rescue(three.board_id), "Rik")
+    await board.add_note(three.board_id, "Rik", "Client is in an open")
+    await board.del_case(board.return_rescue(one.board_id))
+    await board.close()
+    assert journal._file.closed
+    # Records the snapshot already covers and changes to a case the journal
+    # doesn't know of are skipped, and a record cut off halfway is ignored
+    with open(path, "a", encoding="UTF-8") as log:
+        log.write(
+            json.dumps({"op": "add_case", "case": case_to_record(one), "seq": 1}) + "\n"
+        )
+        log.write('{"op": "mod_case", "board_id": 9, "events": []}\n')
+        log.write('{"op": "del_case", "boa')
+    restored = Board(id_range=10, journal=BoardJournal(path))
+    assert restored.by_id == board.by_id
+    assert restored.find_client("three_cmdr").board_id == three.board_id
+    for board_id in (two.board_id, three.board_id):
+        assert (
+            restored.return_rescue(board_id).case_notes
+            == board.return_rescue(board_id).case_notes
+        )
+        assert restored.timeline(board_id) == board.timeline(board_id)
+    assert len(restored.return_rescue(three.board_id).case_notes) == 2
+    assert restored.time_last_case is not None
+
+
+@pytest.mark.asyncio
+async def test_board_query():
+    """Test cases can be found by their indexed attributes"""
+    board = Board(id_range=10)
+    seal = Seal("Rixxan", 1, 3, [], [], "2019-01-01", True)
+    one = await board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    two = await board.add_case("two", Platform.XBOX, "Sol", CaseType.FISH)
+    three = await board.add_case("three", Platform.ODYSSEY, "Sol", CaseType.BLACK)
+    await board.mod_case(two.board_id, welcomed=True, responders=[seal])
+    assert board.query(platform=Platform.ODYSSEY) == [
+        board.return_rescue(one.board_id),
+        board.return_rescue(three.board_id),
+    ]
+    assert board.query(platform=Platform.ODYSSEY, case_type=CaseType.BLACK) == [
+        board.return_rescue(three.board_id)
+    ]
+    assert [case.board_id for case in board.query(welcomed=False)] == [1, 3]
+    assert board.query(seal="RIXXAN") == [board.return_rescue(two.board_id)]
+    # Lists changed in place don't leave stale entries behind
+    case = board.return_rescue(two.board_id)
+    case.responders.remove(seal)
+    await board.mod_case(two.board_id, responders=case.responders)
+    assert board.query(seal="rixxan") == []
+    await board.del_case(board.return_rescue(one.board_id))
+    assert board.query(platform=Platform.ODYSSEY, welcomed=False) == [
+        board.return_rescue(three.board_id)
+    ]
+    assert len(board.query()) == 2
+
+
+@pytest.mark.asyncio
+async def test_case_history():
+    """Test case notes are derived from the case history"""
+    board = Board(id_range=10)
+    case = await board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    await board.mod_case(case.board_id, "Platform", "Rixxan", platform=Platform.XBOX)
+    await board.mod_case(case.board_id, system="Sol")
+    await board.add_note(case.board_id, "Rixxan", "First note")
+    await board.add_note(case.board_id, "Rixxan", "Second note")
+    await board.edit_note(case.board_id, "Rik", 1, "First note, edited")
+    await board.delete_note(case.board_id, "Rik", -1)
+    notes = board.return_rescue(case.board_id).case_notes
+    assert len(notes) == 2
+    assert notes[0].startswith("Platform set to XBOX from ODYSSEY by Rixxan at ")
+    assert notes[1] == "First note, edited"
+    with pytest.raises(IndexError):
+        await board.delete_note(case.board_id, "Rik", 2)
+    timeline = board.timeline(case.board_id)
+    assert [event["field"] for event in timeline] == [
+        "platform",
+        "system",
+        "notes",
+        "notes",
+        "notes",
+        "notes",
+    ]
+    assert timeline[0]["old"] == "ODYSSEY" and timeline[0]["actor"] == "Rixxan"
+    assert timeline[-1]["old"] == "Second note" and timeline[-1]["new"] is None
+    assert timeline[-1]["index"] == 2 and timeline[-2]["old"] == "First note"
+    # Earlier versions of the case keep the notes they were made with
+    await board.add_note(case.board_id, "Rik", "Third note")
+    before = board.return_rescue(case.board_id)
+    await board.add_note(case.board_id, "Rik", "Fourth note")
+    after = board.return_rescue(case.board_id)
+    await board.edit_note(case.board_id, "Rik", 1, "Edited again")
+    assert after.case_notes[-2:] == ("Third note", "Fourth note")
+    assert after.case_notes[1] == "First note, edited"
+    assert before.case_notes[-1] == "Third note" and len(before.case_notes) == 3
+    await board.delete_note(case.board_id, "Rik", 1)
+    assert board.return_rescue(case.board_id).case_notes[1:] == (
+        "Third note",
+        "Fourth note",
+    )
+    assert len(after.case_notes) == 4
+
+
+@pytest.mark.asyncio
+async def test_case_render_cache():
+    """Test case listings are only rendered again after the case changed"""
+    board = Board(id_range=10)
+    case = await board.add_case("one", Platform.LIVE_HORIZONS, "Delkar", CaseType.FISH)
+    await board.mod_case(case.board_id, kftype=KFType.LIFT)
+    case = board.return_rescue(case.board_id)
+    assert case.summary().startswith(
+        "Case 1: Client: one, Platform: LIVE HORIZONS, Type: Fisher, "
+        "Status: ACTIVE, Updated: "
+    )
+    assert case.summary().endswith(" ago.")
+    listing = str(case)
+    assert "   Case Updated: " in listing and "KF Details:" in listing
+    rendered = case._rendered["listing"]
+    str(case)
+    assert case._rendered["listing"] is rendered
+    await board.add_note(case.board_id, "Rixxan", "Client is on a planet")
+    assert "Client is on a planet" not in str(case)
+    assert case._rendered["listing"] is rendered
+    assert str(board.return_rescue(case.board_id)).endswith(
+        "Notes: \n      Client is on a planet"
+    )
+    await board.mod_case(case.board_id, system="Sol")
+    assert "System: Sol" in str(board.return_rescue(case.board_id))
+
+
+@pytest.mark.asyncio
+async def test_board_case_locks():
+    """Test concurrent changes to a case are serialized, and snapshots never change"""
+    board = Board(id_range=10)
+    case = await board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    snapshot = board.by_id
+    seals = [Seal(f"seal_{i}", i, 0, None, None, "", False) for i in range(5)]
+
+    async def respond(seal):
+        async with board.lock(case.board_id):
+            responders = list(board.return_rescue(case.board_id).responders)
+            await asyncio.sleep(0)
+            await board.mod_case(case.board_id, responders=[*responders, seal])
+
+    await asyncio.gather(
+        *(respond(seal) for seal in seals),
+        *(board.add_note(case.board_id, "Rixxan", f"Note {i}") for i in range(5)),
+    )
+    current = board.return_rescue(case.board_id)
+    assert sorted(seal.name for seal in current.responders) == [
+        seal.name for seal in seals
+    ]
+    assert len(current.case_notes) == 5
+    assert snapshot[case.board_id] is case and not case.responders
+    assert not case.case_notes and not list(case.history)
+    with pytest.raises(TypeError):
+        board.by_id[case.board_id] = current
+    await board.del_case(current)
+    assert case.board_id in snapshot and case.board_id not in board.by_id
+    assert case.board_id not in board._case_locks
+    # Only one of two cases can be renamed to the same name
+    one = await board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    two = await board.add_case("two", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    results = await asyncio.gather(
+        board.rename_case("Same_CMDR", one, "Rixxan"),
+        board.rename_case("Same_CMDR", two, "Rixxan"),
+        return_exceptions=True,
+    )
+    assert sum(isinstance(result, CaseAlreadyExists) for result in results) == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_scheduler():
+    """Test timers fire in order, and can be moved and cancelled"""
+    scheduler = DeadlineScheduler()
+    fired = []
+
+    def record(name):
+        async def callback():
+            fired.append(name)
+
+        return callback
+
+    scheduler.schedule_in("late", 0.03, record("late"))
+    scheduler.schedule_in("early", 0.01, record("early"))
+    scheduler.schedule_in("moved", 0.01, record("moved"))
+    scheduler.schedule_in("moved", 0.02, record("moved"))
+    scheduler.schedule_in("cancelled", 0.01, record("cancelled"))
+    assert scheduler.cancel("cancelled") and not scheduler.cancel("cancelled")
+    assert len(scheduler) == 3 and "moved" in scheduler
+    await asyncio.sleep(0.06)
+    await scheduler.drain()
+    assert fired == ["early", "moved", "late"]
+    assert not scheduler
+
+
+@pytest.mark.asyncio
+async def test_case_reminders(bot_fx, monkeypatch):
+    """Test cases get their reminders on time, and lose them once handled"""
+    monkeypatch.setattr(config.board, "welcome_reminder", 0.05)
+    monkeypatch.setattr(config.board, "o2_warning", 0.9)
+    monkeypatch.setattr(config.board, "stale_after", 0)
+    reminders = CaseReminders(bot_fx)
+    reminders.start()
+    case = await bot_fx.board.add_case(
+        "one", Platform.ODYSSEY, "Delkar", CaseType.BLACK
+    )
+    await bot_fx.board.mod_case(case.board_id, o2_timer="00:01")
+    assert ("welcome", case.board_id) in reminders.scheduler
+    assert ("o2_expired", case.board_id) in reminders.scheduler
+    await asyncio.sleep(0.2)
+    await reminders.scheduler.drain()
+    messages = [message["message"] for message in bot_fx.sent_messages]
+    assert any(
+        message.startswith("NEWCASE has not been welcomed") for message in messages
+    )
+    assert any("O2 runs out in" in message for message in messages)
+    assert bot_fx.board.return_rescue(case.board_id).case_notes
+    await bot_fx.board.mod_case(case.board_id, welcomed=True)
+    assert ("welcome", case.board_id) not in reminders.scheduler
+    await bot_fx.board.del_case(bot_fx.board.return_rescue(case.board_id))
+    assert not reminders.scheduler
+
+
+@pytest.mark.asyncio
+async def test_stale_unwelcomed_case(monkeypatch):
+    """Test welcome reminders don't keep an unwelcomed case from going stale"""
+    monkeypatch.setattr(config.board, "welcome_reminder", 0.05)
+    monkeypatch.setattr(config.board, "stale_after", 0.2)
+    sent = []
+
+    class Bot:
+        """Just enough of a bot for the reminders"""
+
+        nickname = "HalpyBOT"
+        board = Board(id_range=10)
+
+        @staticmethod
+        async def message(target, message):
+            sent.append(message)
+
+    reminders = CaseReminders(Bot)
+    reminders.start()
+    await Bot.board.add_case("one", Platform.ODYSSEY, "Delkar", CaseType.SEAL)
+    await asyncio.sleep(0.35)
+    reminders.scheduler.clear()
+    await reminders.scheduler.drain()
+    assert any(message.startswith("NEWCASE has not been welcomed") for message in sent)
+    assert any("hasn't been updated in" in message for message in sent)
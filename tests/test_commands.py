@@ -8,6 +8,7 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
 import pytest
 from halpybot.packages.command import Commands
 from halpybot import config
@@ -34,6 +35,22 @@ async def test_ping(bot_fx):
     assert bot_fx.sent_messages[0] == {"message": "Pong!", "target": "#bot-test"}
 
 
+@pytest.mark.asyncio
+async def test_did_you_mean(bot_fx):
+    """Check unknown commands get a suggestion, but only once in a while"""
+    for _ in range(2):
+        await Commands.invoke_from_message(
+            bot=bot_fx,
+            channel="#bot-test",
+            sender="typo_seal",
+            message=f"{config.irc.command_prefix}pinng",
+        )
+    assert len(bot_fx.sent_messages) == 1
+    assert bot_fx.sent_messages[0]["message"].startswith(
+        f"Unknown command. Did you mean: {config.irc.command_prefix}ping"
+    )
+
+
 @pytest.mark.asyncio
 async def test_serverping(bot_fx):
     """Check the serverstatus command"""
@@ -121,6 +138,32 @@ async def test_lookup_4(bot_fx):
     }
 
 
+@pytest.mark.asyncio
+async def test_lookup_shared(bot_fx):
+    """Test concurrent identical lookups share one response"""
+    await asyncio.gather(
+        *[
+            Commands.invoke_from_message(
+                bot=bot_fx,
+                channel="#bot-test",
+                sender=sender,
+                message=f"{config.irc.command_prefix}lookup  sol",
+            )
+            for sender in ("generic_seal", "guest_user")
+        ]
+    )
+    assert (
+        bot_fx.sent_messages
+        == [
+            {
+                "message": "System SOL exists in EDSM",
+                "target": "#bot-test",
+            }
+        ]
+        * 2
+    )
+
+
 @pytest.mark.asyncio
 async def test_drillcase(bot_fx):
     """Test the drillcase command"""
@@ -10,7 +10,14 @@ See license.md
 
 import time
 import pytest
-from halpybot.packages.database import test_database_connection
+from sqlalchemy import create_engine
+from halpybot.packages.database import (
+    test_database_connection,
+    execute,
+    DatabaseHealth,
+    DatabaseState,
+)
+from halpybot.packages.metrics import DATABASE_LATENCY
 from halpybot import config
 
 
@@ -24,3 +31,42 @@ async def test_db(bot_fx):
     connection = await test_database_connection(bot_fx.engine)
     final = round(connection - start, 2)
     assert final < 15
+
+
+@pytest.mark.asyncio
+async def test_execute(tmp_path):
+    """Test statements run in the database thread pool, and are timed"""
+    sqlite = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    await execute(sqlite, "create", "CREATE TABLE seals (name TEXT)", commit=True)
+    await execute(
+        sqlite, "insert", "INSERT INTO seals VALUES (:name)", {"name": "Rixxan"}, True
+    )
+    rows = await execute(sqlite, "select", "SELECT name FROM seals")
+    assert [tuple(row) for row in rows] == [("Rixxan",)]
+    assert DATABASE_LATENCY.count("select", "ok") >= 1
+
+
+def test_health_offline_and_back():
+    """Test repeated failures enter offline mode, and a success leaves it"""
+    config.offline_mode.enabled = False
+    db_health = DatabaseHealth(failure_threshold=2)
+    db_health.record_failure()
+    assert db_health.state is DatabaseState.DEGRADED
+    assert db_health.available
+    db_health.record_failure()
+    assert db_health.state is DatabaseState.OFFLINE
+    assert config.offline_mode.enabled
+    assert not db_health.available
+    db_health.record_success()
+    assert db_health.state is DatabaseState.ONLINE
+    assert not config.offline_mode.enabled
+
+
+def test_health_manual_offline():
+    """Test offline mode enabled by hand is not disabled by a success"""
+    config.offline_mode.enabled = True
+    db_health = DatabaseHealth(failure_threshold=1)
+    db_health.record_failure()
+    db_health.record_success()
+    assert config.offline_mode.enabled
+    config.offline_mode.enabled = False
@@ -28,6 +28,7 @@ from halpybot.packages.edsm import (
     calc_distance,
     calc_direction,
     get_nearby_system,
+    surroundings,
 )
 from halpybot.packages.models import Coordinates
 from halpybot.packages.utils import sys_cleaner
@@ -158,6 +159,20 @@ async def test_dssa():
     assert dssa == ("Synuefuae CM-J d10-42 (DSSA Artemis Rest)", "6,129.55", "East")
 
 
+@pytest.mark.asyncio
+async def test_surroundings():
+    """Test a system is located once, and a carrier only sought without a landmark"""
+    located = await surroundings("Col 285 Sector AA-A a30-2", cache_override=True)
+    assert located.name == "Col 285 Sector AA-A a30-2"
+    assert (
+        located.landmark.name,
+        located.landmark.distance,
+        located.landmark.direction,
+    ) == await checklandmarks("Col 285 Sector AA-A a30-2")
+    assert located.carrier is None
+    assert await surroundings("Sagittarius B*") is None
+
+
 @pytest.mark.asyncio
 async def test_distance_bad_dssa():
     """Test that the DSSA system will return the proper exception to a bad system"""
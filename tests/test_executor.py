@@ -0,0 +1,76 @@
+"""
+test_executor.py - Command executor tests
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+import asyncio
+import pytest
+from halpybot.packages.command import CommandExecutor
+
+
+def record(results: list, name: str, delay: float = 0):
+    """Create a job appending its name to the results once done"""
+
+    async def job():
+        await asyncio.sleep(delay)
+        results.append(name)
+
+    return job
+
+
+@pytest.mark.asyncio
+async def test_in_order_per_user():
+    """Test that a user's commands finish in the order they were sent"""
+    executor = CommandExecutor(max_concurrent=4)
+    results = []
+    executor.submit("some_pup", record(results, "slow", 0.05))
+    executor.submit("some_pup", record(results, "fast"))
+    await executor.drain()
+    assert results == ["slow", "fast"]
+
+
+@pytest.mark.asyncio
+async def test_slow_command_does_not_block_others():
+    """Test that a slow command doesn't hold up other users"""
+    executor = CommandExecutor(max_concurrent=4)
+    results = []
+    executor.submit("some_pup", record(results, "slow", 0.05))
+    executor.submit("generic_seal", record(results, "fast"))
+    await executor.drain()
+    assert results == ["fast", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_fairness_and_cap():
+    """Test that users take turns when all slots are taken"""
+    executor = CommandExecutor(max_concurrent=1, max_pending=5)
+    results = []
+    for num in range(3):
+        executor.submit("some_pup", record(results, f"pup{num}"))
+    executor.submit("generic_seal", record(results, "seal"))
+    assert executor.running == 1
+    assert executor.queue_depth == 3
+    await executor.drain()
+    assert results == ["pup0", "seal", "pup1", "pup2"]
+    assert executor.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_pending_limit_and_failures():
+    """Test that floods are dropped and failing commands are contained"""
+    executor = CommandExecutor(max_concurrent=1, max_pending=1)
+
+    async def broken():
+        raise KeyError("Oops")
+
+    results = []
+    assert executor.submit("some_pup", broken)
+    assert executor.submit("some_pup", record(results, "queued"))
+    assert not executor.submit("some_pup", record(results, "dropped"))
+    await executor.drain()
+    assert results == ["queued"]
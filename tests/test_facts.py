@@ -10,8 +10,12 @@ See license.md
 Testing will always DISABLE offline mode. You must have access to a Seal-type DB for testing.
 """
 
+import sqlite3
 import pytest
+from sqlalchemy import create_engine
 from halpybot.packages.command import Commands
+from halpybot.packages.database import execute
+from halpybot.packages.facts import Fact, FactHandler
 from halpybot import config
 
 
@@ -116,3 +120,150 @@ async def test_ufi(bot_fx):
         "target": "some_cyber",
     }
     config.offline_mode.enabled = prev_value
+
+
+@pytest.mark.asyncio
+async def test_fact_resolve(bot_fx):
+    """Test fact names and language variants resolve to the right fact"""
+    await bot_fx.facts._from_local()
+    assert bot_fx.facts.resolve("pcfr") == ("pcfr", "en")
+    assert bot_fx.facts.resolve("pcfr-nl") == ("pcfr", "nl")
+    assert bot_fx.facts.resolve("pcfr-xx") == ("pcfr", "en")
+    assert bot_fx.facts.resolve("spaghetti") is None
+
+
+@pytest.mark.asyncio
+async def test_fact_index(bot_fx):
+    """Test the fact name and language views follow the cache"""
+    await bot_fx.facts._from_local()
+    names = await bot_fx.facts.get_fact_names()
+    assert len(names) == len(set(names))
+    assert await bot_fx.facts.lang_by_fact("pcfr") == ["en", "nl"]
+    assert await bot_fx.facts.lang_by_fact("spaghetti") == []
+    bot_fx.facts._uncache_fact("pcfr", "nl")
+    assert await bot_fx.facts.lang_by_fact("pcfr") == ["en"]
+    assert bot_fx.facts.resolve("pcfr-nl") == ("pcfr", "en")
+
+
+@pytest.mark.asyncio
+async def test_fact_search():
+    """Test fact names and texts can be found without exact matches"""
+    handler = FactHandler()
+    await handler._from_local()
+    assert handler.suggest("pcfrr")[0][0] == "pcfr"
+    assert handler.suggest("spaghetti") == []
+    assert ("pcfr", "en") in handler.search("add friend")
+    assert handler.search("spaghetti carbonara") == []
+    handler._uncache_fact("pcfr", "en")
+    assert ("pcfr", "en") not in handler.search("add friend")
+
+
+def test_fact_render():
+    """Test facts are rendered ahead of time, exactly as they will be sent"""
+    fact = Fact(None, "test", "en", "{{Hi!}} <<BOLD>>Fact<<BOLD>> %n%  %n% text ", "x")
+    assert fact.default_argument == "Hi!"
+    assert fact.render([]) == "Hi! \u0002Fact\u0002\ntext"
+    assert fact.render(["Rixxan", "Rik079"]) == "Rixxan Rik079:  \u0002Fact\u0002\ntext"
+    assert Fact(None, "test", "en", "Plain", "x").render([]) == "Plain"
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync(tmp_path):
+    """Test later fact loads only apply what changed in the database"""
+    sqlite = create_engine(f"sqlite:///{tmp_path / 'facts.db'}")
+    await execute(
+        sqlite,
+        "create",
+        f"CREATE TABLE {config.facts.table} (factID INTEGER PRIMARY KEY, factName, "
+        f"factLang, factText, factAuthor, factEdited datetime, factEditedBy)",
+        commit=True,
+    )
+    insert = (
+        f"INSERT INTO {config.facts.table} (factName, factLang, factText, factAuthor, "
+        f"factEdited) VALUES (:name, :lang, 'Text', 'Rixxan', :edited)"
+    )
+    for name, lang, edited in (
+        ("pcfr", "en", "2022-01-01"),
+        ("pcfr", "nl", "2022-01-02"),
+        ("test", "en", "2021-12-31"),
+    ):
+        await execute(
+            sqlite,
+            "insert",
+            insert,
+            {"name": name, "lang": lang, "edited": edited},
+            True,
+        )
+    handler = FactHandler()
+    await handler._from_database(sqlite)
+    unchanged = await handler.get("test")
+    await execute(
+        sqlite,
+        "update",
+        f"UPDATE {config.facts.table} SET factName = 'renamed', factEdited = '2022-01-03' "
+        f"WHERE factName = 'pcfr' AND factLang = 'en'",
+        commit=True,
+    )
+    await execute(
+        sqlite,
+        "delete",
+        f"DELETE FROM {config.facts.table} WHERE factLang = 'nl'",
+        commit=True,
+    )
+    await handler._from_database(sqlite)
+    assert sorted(handler.list()) == [("renamed", "en"), ("test", "en")]
+    assert await handler.lang_by_fact("pcfr") == []
+    assert await handler.get("test") is unchanged
+    # Edits made by the bot itself are picked up by the next sync
+    other = FactHandler()
+    await other._from_database(sqlite)
+    await handler.edit_fact(sqlite, "test", "en", "Edited", "Rik")
+    assert (await handler.get("test")).raw_text == "Edited"
+    await other._from_database(sqlite)
+    edited = await other.get("test")
+    assert edited.raw_text == "Edited"
+    # A sync without changes keeps the cached facts as they are
+    await other._from_database(sqlite)
+    assert await other.get("test") is edited
+
+
+@pytest.mark.asyncio
+async def test_fact_snapshot(tmp_path, monkeypatch):
+    """Test facts are loaded from the last snapshot, and reconciled later"""
+    monkeypatch.setattr(config.facts, "snapshot", str(tmp_path / "facts.json.gz"))
+    # Return edit times as datetimes, like MySQL does
+    sqlite = create_engine(
+        f"sqlite:///{tmp_path / 'facts.db'}",
+        connect_args={"detect_types": sqlite3.PARSE_DECLTYPES},
+    )
+    await execute(
+        sqlite,
+        "create",
+        f"CREATE TABLE {config.facts.table} (factID INTEGER PRIMARY KEY, factName, "
+        f"factLang, factText, factAuthor, factEdited timestamp, factEditedBy)",
+        commit=True,
+    )
+    for name in ("pcfr", "test"):
+        await execute(
+            sqlite,
+            "insert",
+            f"INSERT INTO {config.facts.table} (factName, factLang, factText, "
+            f"factAuthor, factEdited) VALUES (:name, 'en', 'Text', 'Rixxan', "
+            f"'2022-01-01 00:00:00')",
+            {"name": name},
+            True,
+        )
+    await FactHandler()._from_database(sqlite)
+    assert list(tmp_path.glob("*.gz")) == [tmp_path / "facts.json.gz"]
+    await execute(
+        sqlite,
+        "delete",
+        f"DELETE FROM {config.facts.table} WHERE factName = 'test'",
+        commit=True,
+    )
+    handler = FactHandler()
+    assert await handler._from_snapshot()
+    assert sorted(handler.list()) == [("pcfr", "en"), ("test", "en")]
+    assert (await handler.get("pcfr")).fact_id == 1
+    await handler._from_database(sqlite)
+    assert handler.list() == [("pcfr", "en")]
@@ -0,0 +1,60 @@
+"""
+test_metrics.py - Metrics module tests
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+from halpybot.packages.metrics import Histogram, Counter, render_metrics
+from halpybot.server.server_metrics import metrics
+from tests.fixtures import TestBot
+
+
+def test_histogram_buckets():
+    """Test observations land in the right cumulative buckets"""
+    histogram = Histogram("test_latency", "Test latency", ("command",), (0.1, 1.0))
+    histogram.observe(0.05, "ping")
+    histogram.observe(0.5, "ping")
+    histogram.observe(5, "ping")
+    samples = list(histogram.samples())
+    assert samples == [
+        'test_latency_bucket{command="ping",le="0.1"} 1',
+        'test_latency_bucket{command="ping",le="1.0"} 2',
+        'test_latency_bucket{command="ping",le="+Inf"} 3',
+        'test_latency_sum{command="ping"} 5.55',
+        'test_latency_count{command="ping"} 3',
+    ]
+
+
+def test_histogram_outcome():
+    """Test timed blocks are labelled with their outcome"""
+    histogram = Histogram("test_outcome", "Test outcome", ("command", "outcome"))
+    with histogram.time("ping"):
+        pass
+    with pytest.raises(KeyError):
+        with histogram.time("ping"):
+            raise KeyError
+    assert histogram.count("ping", "ok") == 1
+    assert histogram.count("ping", "error") == 1
+
+
+def test_render_escaping():
+    """Test label values are escaped in the text format"""
+    counter = Counter("test_escaping_total", "Test escaping", ("name",))
+    counter.inc('a "quoted"\nname')
+    assert 'test_escaping_total{name="a \\"quoted\\"\\nname"} 1' in render_metrics()
+
+
+@pytest.mark.asyncio
+async def test_metrics_route(bot_fx: TestBot):
+    """Test the server responds properly to a GET /metrics query"""
+    request = make_mocked_request("GET", "/metrics")
+    request.app["botclient"] = bot_fx
+    response = await metrics(request)
+    assert response.status == 200
+    assert "# TYPE halpybot_command_duration_seconds histogram" in response.text
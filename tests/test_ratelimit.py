@@ -0,0 +1,87 @@
+"""
+test_ratelimit.py - Command rate limiter tests
+
+Copyright (c) The Hull Seals,
+All rights reserved.
+
+Licensed under the GNU General Public License
+See license.md
+"""
+
+import pytest
+from pydantic import ValidationError
+from halpybot.halpyconfig import RateLimit
+from halpybot.packages.command import BucketSet, RateLimiter
+
+
+def make_limiter(user_burst: int = 2) -> RateLimiter:
+    """Create a limiter where only the user bucket is tight"""
+    return RateLimiter(
+        user=BucketSet(user_burst, 1.0),
+        channel=BucketSet(100, 100.0),
+        command=BucketSet(100, 100.0),
+    )
+
+
+def test_burst_and_refill():
+    """Test a user can burst, is throttled, and regains tokens over time"""
+    limiter = make_limiter()
+    assert limiter.acquire("some_pup", "#bot-test", "ping", now=0) == 0
+    assert limiter.acquire("Some_Pup", "#bot-test", "ping", now=0) == 0
+    assert limiter.acquire("some_pup", "#bot-test", "ping", now=0) == 1.0
+    assert limiter.acquire("some_pup", "#bot-test", "ping", now=0.5) == 0.5
+    assert limiter.acquire("some_pup", "#bot-test", "ping", now=1) == 0
+    # Other users are not affected
+    assert limiter.acquire("some_seal", "#bot-test", "ping", now=1) == 0
+
+
+def test_command_bucket():
+    """Test a command bucket is shared between users"""
+    limiter = RateLimiter(
+        user=BucketSet(100, 100.0),
+        channel=BucketSet(100, 100.0),
+        command=BucketSet(1, 0.1),
+    )
+    assert limiter.acquire("some_pup", None, "lookup", now=0) == 0
+    assert limiter.acquire("some_seal", None, "lookup", now=0) == 10.0
+    assert limiter.acquire("some_seal", None, "ping", now=0) == 0
+
+
+def test_idle_eviction():
+    """Test buckets are dropped once they have refilled"""
+    buckets = BucketSet(2, 1.0)
+    buckets.get("some_pup", 0).tokens -= 2
+    buckets.get("some_seal", 1)
+    assert len(buckets) == 2
+    buckets.get("some_cyber", 2.5)
+    assert len(buckets) == 2
+    assert buckets.get("some_pup", 2.5).tokens == 2
+
+
+def test_warn_once():
+    """Test a throttled user is only told once until they are let through"""
+    limiter = make_limiter(user_burst=1)
+    assert limiter.acquire("some_pup", None, "ping") == 0
+    assert limiter.acquire("some_pup", None, "ping") > 0
+    assert limiter.warn("some_pup")
+    assert not limiter.warn("some_pup")
+
+
+def test_exempt_channels():
+    """Test commands in exempt channels are never limited"""
+    limiter = RateLimiter(
+        user=BucketSet(1, 0.1),
+        channel=BucketSet(1, 0.1),
+        command=BucketSet(1, 0.1),
+        exempt_channels=["#Rescue"],
+    )
+    for _ in range(3):
+        assert limiter.acquire("some_pup", "#rescue", "go", now=0) == 0
+    assert limiter.acquire("some_pup", "#bot-test", "go", now=0) == 0
+    assert limiter.acquire("some_pup", "#bot-test", "go", now=0) > 0
+
+
+def test_suggestion_interval():
+    """Test a suggestion interval of zero is turned away by the config"""
+    with pytest.raises(ValidationError):
+        RateLimit(suggestion_interval=0)
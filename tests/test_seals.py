@@ -13,7 +13,7 @@ Testing will always DISABLE offline mode. You must have access to a Seal-type DB
 import pytest
 
 from halpybot.packages.models import Seal
-from halpybot.packages.seals import whois
+from halpybot.packages.seals import whois, whois_many, SealCache, seal_cache
 from halpybot import config
 
 config.offline_mode.enabled = False
@@ -41,3 +41,32 @@ async def test_offline_whois(bot_fx):
     with pytest.raises(ValueError):
         await whois(bot_fx.engine, "ThisCMDRDoesntExist")
     config.offline_mode.enabled = prev_value
+
+
+@pytest.mark.asyncio
+async def test_whois_many(bot_fx):
+    """Test several Seals can be looked up at once, and are cached after"""
+    seal_cache.clear()
+    seals = await whois_many(bot_fx.engine, ["Rik079", "blargnet", "rik079"])
+    assert isinstance(seals["Rik079"], Seal)
+    assert seals["rik079"] is seals["Rik079"]
+    assert seals["blargnet"] is None
+    assert await whois(bot_fx.engine, "RIK079") is seals["Rik079"]
+
+
+def test_seal_cache(monkeypatch):
+    """Test Seals are only cached for a limited time"""
+    seal = Seal("Rixxan", 1, 0, [], [], "2019-01-01", True)
+    clock = [100.0]
+    monkeypatch.setattr("time.monotonic", lambda: clock[0])
+    cache = SealCache(ttl=300)
+    cache.put("Rixxan", seal)
+    assert cache.get("rixxan") is seal
+    clock[0] += 300
+    assert cache.get("Rixxan") is None
+    assert len(cache) == 0
+    # Expired Seals that are never looked up again are swept out
+    cache.put("Rixxan", seal)
+    clock[0] += 300
+    cache.put("Rik079", seal)
+    assert len(cache) == 1
@@ -8,14 +8,18 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
 import json
 import aiohttp
 from aiohttp import web
 from aiohttp.test_utils import make_mocked_request
 import pytest
 from halpybot import DEFAULT_USER_AGENT, config
+from halpybot.packages.announcer import Outbox, WebhookDispatcher
+from halpybot.packages.exceptions import WebhookSendError
 from halpybot.server.auth import get_hmac
-from halpybot.server.server import server_root, APIConnector
+from halpybot.server import create_app
+from halpybot.server.server import server_root
 from tests.fixtures import TestBot
 
 
@@ -31,7 +35,7 @@ async def test_root(bot_fx: TestBot):
 @pytest.mark.asyncio
 async def test_announce(bot_fx: TestBot):
     """Test the server responds properly to a POST /announce query"""
-    runner = web.AppRunner(APIConnector)
+    runner = web.AppRunner(create_app())
     runner.app["botclient"] = bot_fx
     await runner.setup()
     site = web.TCPSite(runner, "127.0.0.1", port=config.api_connector.port)
@@ -59,10 +63,146 @@ async def test_announce(bot_fx: TestBot):
             f"http://127.0.0.1:{config.api_connector.port}/announce", json=body
         ) as response:
             assert response.status == 200
-    await site.stop()
+    await runner.cleanup()
+    await bot_fx.announcer.drain()
     assert bot_fx.sent_messages[0] == {
         "message": "xxxx PCLCASE -- NEWCASE xxxx\nCMDR: InHoomansLeftEar2 -- Platform: "
-        "LIVE HORIZONS\nSystem: SOL -- Hull: 25\nxxxx Case ID: 1 xxxx\nSystem"
-        " exists in EDSM, 0.0 LY South of Sol.",
+        "LIVE HORIZONS\nSystem: SOL -- Hull: 25\nxxxx Case ID: 1 xxxx",
         "target": "#bot-test",
     }
+    assert bot_fx.sent_messages[1] == {
+        "message": "System exists in EDSM, 0.0 LY South of Sol. (Case 1)",
+        "target": "#bot-test",
+    }
+
+
+@pytest.mark.asyncio
+async def test_announce_idempotent(bot_fx: TestBot):
+    """Test a repeated POST /announce with the same Idempotency-Key is announced once"""
+    runner = web.AppRunner(create_app())
+    runner.app["botclient"] = bot_fx
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port=config.api_connector.port)
+    await site.start()
+    body = {
+        "type": "PPWK",
+        "parameters": {"CMDR": "InHoomansLeftEar2", "Seal": "Rixxan"},
+    }
+    msg = "".join(json.dumps(body).split())
+    headers = {
+        "User-Agent": DEFAULT_USER_AGENT,
+        "hmac": get_hmac(msg).hexdigest(),
+        "keyCheck": get_hmac(
+            config.api_connector.key_check_constant.get_secret_value()
+        ).hexdigest(),
+        "Idempotency-Key": "ppwk-InHoomansLeftEar2",
+    }
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(ssl=False), headers=headers
+    ) as session:
+        for _ in range(2):
+            async with await session.post(
+                f"http://127.0.0.1:{config.api_connector.port}/announce", json=body
+            ) as response:
+                assert response.status == 200
+    await runner.cleanup()
+    await bot_fx.announcer.drain()
+    targets = [message["target"] for message in bot_fx.sent_messages]
+    assert targets and len(targets) == len(set(targets))
+
+
+@pytest.mark.asyncio
+async def test_outbox(tmp_path):
+    """Test queued announcements survive a restart and are delivered in order"""
+    path = str(tmp_path / "outbox.journal")
+    outbox = Outbox(path)
+    assert outbox.claim("one") and not outbox.claim("one")
+    outbox.put([("#a", "first"), ("#b", "first")], key="one")
+    outbox.put([("#a", "second")])
+
+    restored = Outbox(path, retry_interval=0.01, compact_after=2)
+    assert len(restored) == 3 and not restored.claim("one")
+    sent = []
+
+    class Client:
+        """A bot that only connects after a while"""
+
+        connected = False
+
+        @staticmethod
+        async def message(target, message):
+            sent.append((target, message))
+
+    restored.start(Client)
+    await asyncio.sleep(0.02)
+    assert not sent
+    Client.connected = True
+    restored.wake()
+    await restored.drain()
+    restored.close()
+    assert sent == [("#a", "first"), ("#b", "first"), ("#a", "second")]
+    # Delivered messages were compacted away, the key is still remembered
+    with open(path, encoding="UTF-8") as log:
+        assert len(log.readlines()) < 5
+    again = Outbox(path)
+    assert len(again) == 0 and not again.claim("one")
+
+
+async def test_webhook_dispatcher():
+    """Test webhooks are coalesced, retried after a 429, and cases never dropped"""
+    posts = []
+    limited = []
+
+    async def webhook(request: web.Request):
+        if not limited:
+            limited.append(True)
+            return web.json_response({"retry_after": 0.01}, status=429)
+        posts.append(await request.json())
+        return web.Response(status=204, headers={"X-RateLimit-Remaining": "4"})
+
+    async def gone(_):
+        return web.Response(status=404)
+
+    outage = []
+
+    async def down(request: web.Request):
+        if len(outage) < 3:
+            outage.append(True)
+            return web.Response(status=503)
+        posts.append(await request.json())
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/hook", webhook)
+    app.router.add_post("/gone", gone)
+    app.router.add_post("/down", down)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = aiohttp.test_utils.unused_port()
+    site = web.TCPSite(runner, "127.0.0.1", port=port)
+    await site.start()
+    url = f"http://127.0.0.1:{port}"
+    dispatcher = WebhookDispatcher(queue_size=2, max_attempts=2, retry_interval=0.01)
+    try:
+        results = await asyncio.gather(
+            dispatcher.send(f"{url}/hook", {"content": "first"}),
+            dispatcher.send(f"{url}/hook", {"content": "second"}),
+            dispatcher.send(f"{url}/hook", {"content": "third"}),
+            dispatcher.send(f"{url}/hook", {"content": "case"}, case=True),
+            return_exceptions=True,
+        )
+        assert results[:2] == [None, None] and results[3] is None
+        assert isinstance(results[2], WebhookSendError)
+        assert limited
+        assert [post["content"] for post in posts] == ["case", "first\nsecond"]
+        with pytest.raises(WebhookSendError):
+            await dispatcher.send(f"{url}/gone", {"content": "lost"})
+        # A case outlasting its attempts is reported, but still goes out later
+        with pytest.raises(WebhookSendError):
+            await dispatcher.send(f"{url}/down", {"content": "late"}, case=True)
+        await dispatcher.shutdown(timeout=5)
+        assert posts[-1]["content"] == "late"
+    finally:
+        await dispatcher.close()
+        await site.stop()
+        await runner.cleanup()
@@ -8,10 +8,15 @@ Licensed under the GNU General Public License
 See license.md
 """
 
+import asyncio
 import os.path
 import pytest
 from halpybot.packages.utils import language_codes, strip_non_ascii
+from halpybot.packages.utils import utils
 from halpybot.packages.command import get_help_text
+from halpybot.packages.announcer import Announcement
+from halpybot.packages.exceptions import AnnouncementError
+from halpybot import config
 
 
 def test_lang():
@@ -69,3 +74,62 @@ async def test_landmark_file():
 async def test_announcer_file():
     """Test the announcer file exists"""
     assert os.path.exists("data/announcer/announcer.json")
+
+
+def test_commands_alias(bot_fx):
+    """Test the help text is found by alias and for group subcommands"""
+    assert get_help_text(bot_fx.commandsfile, "SYSLOOKUP") == get_help_text(
+        bot_fx.commandsfile, "lookup"
+    )
+    assert get_help_text(bot_fx.commandsfile, "notifyinfo details").startswith(
+        f"Use: {config.irc.command_prefix}notifyinfo details"
+    )
+
+
+def test_announcement_template():
+    """Test announcements are compiled once, and checked against the arguments"""
+    ann = Announcement(
+        case_type="TEST",
+        name="Test",
+        description="A test announcement",
+        channels=["#bot-test"],
+        content=["{CMDR} -- {Platform}\n", "Hull: {Hull:>3}% {{literal}}"],
+    )
+    assert ann.template.fields == {"CMDR", "Platform", "Hull"}
+    assert (
+        ann.template.render({"CMDR": "Rik", "Platform": "XBOX", "Hull": 5, "Seal": 0})
+        == "Rik -- XBOX\nHull:   5% {literal}"
+    )
+    with pytest.raises(AnnouncementError, match="Hull"):
+        ann.template.render({"CMDR": "Rik", "Platform": "XBOX"})
+    with pytest.raises(AnnouncementError, match="Sytem"):
+        Announcement("TEST", "Test", "", [], ["System: {Sytem}"])
+    with pytest.raises(AnnouncementError):
+        Announcement("TEST", "Test", "", [], ["System: {System"])
+
+
+def test_help_index():
+    """Test a different commands file gets its own help index"""
+    first = {"Group": {"ping": {"arguments": "", "aliases": [], "use": "Pong"}}}
+    second = {"Group": {"ping": {"arguments": "", "aliases": [], "use": "Pong!"}}}
+    assert get_help_text(first, "ping").endswith("\nPong")
+    assert get_help_text(second, "ping").endswith("\nPong!")
+    assert get_help_text(first, "ping").endswith("\nPong")
+
+
+@pytest.mark.asyncio
+async def test_database_heartbeat_survives_errors(monkeypatch):
+    """Test a failing database probe doesn't stop the heartbeat"""
+    probes = []
+
+    async def probe(_, last_state):
+        probes.append(last_state)
+        raise RuntimeError("Probe failed")
+
+    monkeypatch.setattr(config.database, "heartbeat", 0.01)
+    monkeypatch.setattr(utils, "_database_probe", probe)
+    heartbeat = asyncio.create_task(utils._database_heartbeat(None))
+    await asyncio.sleep(0.05)
+    assert not heartbeat.done()
+    heartbeat.cancel()
+    assert len(probes) > 1